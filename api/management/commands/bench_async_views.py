@@ -0,0 +1,110 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.test import AsyncRequestFactory
+from rest_framework.test import APIRequestFactory
+
+from api.utility_files import async_http
+from communityapi.views_files import controller
+from communityapi.views_files.controller import AsyncCreateStreamIdView, CreateStreamIdView
+
+ROOM = json.dumps({"roomId": "abcd-efgh-ijkl", "links": {"get_room": "https://api.videosdk.live/v2/rooms/abcd"}})
+
+
+class Server(ThreadingHTTPServer):
+    # Every call of a run connects at once
+    request_queue_size = 1024
+
+
+class SlowUpstream:
+    """Local stand-in for videosdk that answers every call after `delay` seconds."""
+
+    def __init__(self, delay):
+        body = ROOM.encode('utf-8')
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                time.sleep(delay)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/v2/rooms'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the sync and async stream id views against an upstream that takes --delay seconds per call'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Concurrent calls per run')
+        parser.add_argument('--workers', type=int, default=8, help='Threads serving the sync view (as WSGI threads)')
+        parser.add_argument('--delay', type=float, default=0.5, help='Seconds the upstream takes per call')
+
+    def run_sync(self, count, workers):
+        factory = APIRequestFactory()
+        view = CreateStreamIdView.as_view({'post': 'create'})
+
+        def call(_):
+            request = factory.post('/api/create_live_room_id/', {'token': 'token'}, format='json')
+            return view(request).api_status
+
+        with ThreadPoolExecutor(workers) as pool:
+            return list(pool.map(call, range(count)))
+
+    async def run_async(self, count):
+        factory = AsyncRequestFactory()
+        view = AsyncCreateStreamIdView.as_view()
+
+        async def call():
+            request = factory.post('/api/create_live_room_id/', {'token': 'token'}, content_type='application/json')
+            return (await view(request)).api_status
+
+        try:
+            return await asyncio.gather(*(call() for _ in range(count)))
+        finally:
+            await async_http.close_session()
+
+    def measure(self, label, func, count):
+        started = time.perf_counter()
+        statuses = func()
+        elapsed = time.perf_counter() - started
+        failed = sum(1 for api_status in statuses if api_status != 200)
+        self.stdout.write(f"{label:>22} {count:>6} {elapsed:>9.2f} {count / elapsed:>9.1f} {failed:>7}")
+        return elapsed
+
+    def handle(self, *args, **options):
+        count, workers, delay = options['requests'], options['workers'], options['delay']
+        upstream = SlowUpstream(delay)
+        try:
+            # The views print the upstream reply; keep the report readable
+            with mock.patch.object(controller, 'VIDEOSDK_ROOMS_URL', upstream.url), \
+                    mock.patch('builtins.print'):
+                self.stdout.write(f"{'view':>22} {'calls':>6} {'wall s':>9} {'req/s':>9} {'failed':>7}")
+                sync_elapsed = self.measure(f"sync, {workers} threads", lambda: self.run_sync(count, workers), count)
+                async_elapsed = self.measure("async, 1 event loop", lambda: async_to_sync(self.run_async)(count),
+                                             count)
+        finally:
+            upstream.close()
+        self.stdout.write(f"async speedup: {sync_elapsed / async_elapsed:.1f}x "
+                          f"(upstream {delay * 1000:.0f} ms per call)")
@@ -0,0 +1,127 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad, unpad
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+
+from api.middleware import SecureRequestMiddleware
+from api.parsers import SecureJSONParser
+from api.utility_files import crypto
+from api.utility_files.apibase import SecureAPIResponse
+
+SIZES = (("1KB", 1024), ("100KB", 100 * 1024), ("2MB", 2 * 1024 * 1024))
+
+
+def build_payload(target_size):
+    """Product-listing shaped payload whose JSON encoding is at least target_size bytes."""
+    products = []
+    size = 0
+    while size < target_size:
+        product = {
+            "id": len(products) + 1,
+            "name": f"수분 크림 Rose Toner {len(products)}",
+            "description": "Hydrating toner with rose water. " * 4,
+            "price": 12000,
+            "variants": [{"id": 1, "name": "100ml", "price": "12000.00", "stock": 10}],
+            "main_image": "http://localhost/media/products/rose.jpg",
+        }
+        products.append(product)
+        size += len(json.dumps(product, ensure_ascii=False).encode('utf-8'))
+    return {"products": products}
+
+
+class LegacySecureRequestMiddleware(SecureRequestMiddleware):
+    """Request handling as it was before the fast path: three JSON parses and a fresh cipher per call."""
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        key = settings.ECOM_SECRET
+        request_data = json.loads(request.body)
+        cipher = AES.new(key.encode('utf-8'), AES.MODE_ECB)
+        decrypted_data = unpad(cipher.decrypt(base64.b64decode(request_data['enc_data'])), AES.block_size).decode('utf-8')
+        decoded_signature = base64.b64decode(request.headers['X-Signature']).decode('utf-8')
+        calc_signature = hmac.new(key.encode('utf-8'), decrypted_data.encode('utf-8'), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(calc_signature, decoded_signature):
+            raise ValueError("signature mismatch")
+        decrypted_body = json.loads(decrypted_data)
+        request._body = json.dumps(decrypted_body).encode('utf-8')
+        request.POST = request.POST.copy()
+        request.data = json.loads(decrypted_data)
+        return self._accept(request)
+
+
+def legacy_response_data(response_data, key):
+    plain_data = json.dumps(response_data, ensure_ascii=False)
+    cipher = AES.new(key.encode('utf-8'), AES.MODE_ECB)
+    encrypted_data = base64.b64encode(cipher.encrypt(pad(plain_data.encode('utf-8'), AES.block_size))).decode('utf-8')
+    signature = base64.b64encode(
+        hmac.new(key.encode('utf-8'), plain_data.encode('utf-8'), hashlib.sha256).hexdigest().encode("utf-8"))
+    return {"enc_data": encrypted_data, "signature": signature}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the encrypted request/response envelope (before and after the fast path)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=1.0, help='Minimum run time per measurement')
+
+    def measure(self, func, seconds):
+        func()  # warm up
+        count = 0
+        started = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < seconds:
+            func()
+            count += 1
+            elapsed = time.perf_counter() - started
+        return count / elapsed
+
+    def handle(self, *args, **options):
+        key = settings.ECOM_SECRET
+        factory = RequestFactory()
+        seconds = options['seconds']
+
+        def noop_view(request):
+            return None
+
+        self.stdout.write(f"{'size':>6} {'path':>9} {'before req/s':>14} {'after req/s':>14} {'speedup':>8}")
+        for label, target_size in SIZES:
+            payload = build_payload(target_size)
+            plain = json.dumps(payload)
+            body = json.dumps({'enc_data': crypto.encrypt_data(key, plain)})
+            signature = crypto.generate_signature(plain, key).decode('utf-8')
+
+            def decode(middleware_class, parser):
+                def run():
+                    request = factory.post('/api/get_products/', body, content_type='application/json',
+                                           HTTP_X_SIGNATURE=signature)
+                    middleware_class(noop_view).process_view(request, noop_view, (), {})
+                    return Request(request, parsers=[parser]).data
+                return run
+
+            def encode_before():
+                return legacy_response_data({"header": {"api_status": 200, "api_msg": "Success"}, "body": payload}, key)
+
+            def encode_after():
+                return SecureAPIResponse(key, 200, "Success", data=payload).get_response_data()
+
+            assert encode_before()["enc_data"] == encode_after()["enc_data"]
+            assert decode(LegacySecureRequestMiddleware, JSONParser())() == decode(SecureRequestMiddleware, SecureJSONParser())()
+
+            runs = (
+                ("request", decode(LegacySecureRequestMiddleware, JSONParser()),
+                 decode(SecureRequestMiddleware, SecureJSONParser())),
+                ("response", encode_before, encode_after),
+            )
+            for path, before, after in runs:
+                before_rate = self.measure(before, seconds)
+                after_rate = self.measure(after, seconds)
+                self.stdout.write(
+                    f"{label:>6} {path:>9} {before_rate:>14.1f} {after_rate:>14.1f} {after_rate / before_rate:>7.2f}x")
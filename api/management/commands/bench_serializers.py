@@ -0,0 +1,98 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from django.test import RequestFactory
+
+from api.models import Brand, Category, Product, ProductImage, ProductVariant, Review, ReviewImage, User
+from api.serializers_files import fast_serializers
+from api.serializers_files.serializers import ProductSerializer, ReviewSerializer
+
+
+def create_fixture(product_count):
+    """Listing-shaped catalog: every product has a brand, 3 variants, 2 images and 2 reviews with an image."""
+    user = User.objects.create_user(email='bench@serializers.local', name='Bench', user_id='U_BENCH_SERIALIZERS',
+                                    password='x')
+    category = Category.objects.create(name='Bench serializers')
+    brand = Brand.objects.create(brand_name='Bench serializers brand')
+    products = Product.objects.bulk_create([
+        Product(name=f'수분 크림 {index}', slug=f'bench-serializers-{index}', category=category, brand=brand,
+                price=12000 + index, discount_price=9900, main_image=f'products/bench-{index}.jpg',
+                description='Hydrating cream. ' * 8, ingredients='water\nglycerin', how_to_use='Apply')
+        for index in range(product_count)
+    ])
+    ProductVariant.objects.bulk_create([
+        ProductVariant(product=product, name=name, price=12000, discount_price=9900, stock=10)
+        for product in products for name in ('30ml', '50ml', '100ml')
+    ])
+    ProductImage.objects.bulk_create([
+        ProductImage(product=product, image=f'products/bench-{product.id}-{index}.jpg')
+        for product in products for index in range(2)
+    ])
+    reviews = Review.objects.bulk_create([
+        Review(product=product, user=user, rating=5, comment='좋아요 ' * 10) for product in products for _ in range(2)
+    ])
+    ReviewImage.objects.bulk_create([ReviewImage(review=review, image=f'reviews/bench-{review.id}.jpg')
+                                     for review in reviews])
+    return category
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the catalog serializers (DRF ModelSerializers against the plain-dict fast path)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200, help='Products in the benchmark listing')
+        parser.add_argument('--seconds', type=float, default=1.0, help='Minimum run time per measurement')
+
+    def measure(self, func, seconds):
+        func()  # warm up
+        count = 0
+        started = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < seconds:
+            func()
+            count += 1
+            elapsed = time.perf_counter() - started
+        return count / elapsed
+
+    def handle(self, *args, **options):
+        request = RequestFactory().post('/api/get_products/')
+        seconds = options['seconds']
+
+        # The fixture lives in a transaction that is rolled back, so any database can be used
+        with transaction.atomic():
+            category = create_fixture(options['products'])
+            products = Product.objects.filter(category=category).order_by('id')
+            reviews = Review.objects.filter(product__category=category).order_by('id')
+
+            def drf_products():
+                # Best case for DRF: every relation prefetched
+                queryset = products.select_related('brand').prefetch_related('variants', 'additional_images')
+                return ProductSerializer(queryset, many=True, context={'request': request}).data
+
+            def fast_products():
+                return fast_serializers.serialize_products(fast_serializers.product_rows(products), request)
+
+            def drf_reviews():
+                queryset = reviews.select_related('user').prefetch_related(Prefetch('images'))
+                return ReviewSerializer(queryset, many=True, context={'request': request}).data
+
+            def fast_reviews():
+                return fast_serializers.serialize_reviews(fast_serializers.review_rows(reviews), request)
+
+            assert json.dumps(drf_products()) == json.dumps(fast_products())
+            assert json.dumps(drf_reviews()) == json.dumps(fast_reviews())
+
+            self.stdout.write(f"{'payload':>9} {'rows':>6} {'DRF/s':>10} {'fast/s':>10} {'speedup':>8}")
+            runs = (
+                ("products", products.count(), drf_products, fast_products),
+                ("reviews", reviews.count(), drf_reviews, fast_reviews),
+            )
+            for label, rows, before, after in runs:
+                before_rate = self.measure(before, seconds)
+                after_rate = self.measure(after, seconds)
+                self.stdout.write(
+                    f"{label:>9} {rows:>6} {before_rate:>10.1f} {after_rate:>10.1f} {after_rate / before_rate:>7.2f}x")
+            transaction.set_rollback(True)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.utility_files.idempotency import purge_expired_records
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency records (run periodically, e.g. hourly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch_size', type=int, default=1000, help='Records deleted per statement')
+
+    def handle(self, *args, **options):
+        count = purge_expired_records(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} expired idempotency records."))
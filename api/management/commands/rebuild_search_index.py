@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from api.models import Product
+from api.utility_files.search_index import index_products
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product_id', type=int, action='append', help='Only reindex the given product (repeatable)')
+        parser.add_argument('--batch_size', type=int, default=500, help='Products handled per transaction')
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.all()
+        if options.get('product_id'):
+            queryset = queryset.filter(id__in=options['product_id'])
+
+        count = index_products(queryset, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from api.models import Product
+from api.utility_files.ratings import recompute_product_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored review aggregates (average, count, star histogram) of products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product_id', type=int, action='append', help='Only recompute the given product (repeatable)')
+        parser.add_argument('--batch_size', type=int, default=500, help='Products handled per transaction')
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.all()
+        if options.get('product_id'):
+            queryset = queryset.filter(id__in=options['product_id'])
+
+        count = recompute_product_ratings(queryset, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Recomputed ratings of {count} products."))
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from api.utility_files.payment_events import reconcile_events
+
+
+class Command(BaseCommand):
+    help = 'Apply pending payment webhook events to orders (run continuously with --loop, or from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch_size', type=int, default=200, help='Events applied per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the inbox instead of exiting')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when the inbox is empty')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            count = reconcile_events(batch_size=options['batch_size'])
+            total += count
+            if count:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Applied {total} payment events."))
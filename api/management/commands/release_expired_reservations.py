@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.utility_files.stock import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Release expired checkout stock holds (run periodically, e.g. every minute from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch_size', type=int, default=1000, help='Holds deleted per statement')
+
+    def handle(self, *args, **options):
+        count = release_expired_reservations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Released {count} expired reservations."))
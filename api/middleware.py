@@ -4,11 +4,15 @@ Date: 2025-3-10
 Description: This module includes middleware that validates and decrypts POST requests made to ECOM.
 """
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
 from django.conf import settings
+from api.utility_files import compression, db_routing, query_metrics
 from api.utility_files.api_call import api_failed
-from api.utility_files.crypto import decrypt_data, verify_signature
+from api.utility_files.crypto import decrypt_bytes, verify_signature_bytes
 import json
+import time
 import traceback
 
 SECRET_KEY = settings.ECOM_SECRET
@@ -19,9 +23,30 @@ ERROR_MISSING_X_SIGNATURE = 'Invalid signature.'
 ERROR_INVALID_REQUEST_BODY_FORMAT = 'Request body format is incorrect.'
 ERROR_INVALID_SIGNATURE = 'Invalid signature.'
 ERROR_SERVER_VERIFICATION_FAILED = 'Error occurred while processing encrypted data.'
+ERROR_UNSUPPORTED_ENCODING = 'Request body encoding is not supported.'
+
+# Query metrics are returned as X-Query-* response headers (debug builds only by default)
+QUERY_METRICS_HEADERS = getattr(settings, 'QUERY_METRICS_HEADERS', settings.DEBUG)
 
 
 class SecureRequestMiddleware(MiddlewareMixin):
+    """
+    Decrypts and verifies POST bodies before the view runs. Under ASGI process_view and process_response run on the
+    event loop (they do no I/O), so async views behind this middleware stay async without a thread hop.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if iscoroutinefunction(get_response):
+            # The handler calls a coroutine process_view on the loop instead of through sync_to_async
+            self.process_view = self._async_process_view
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    async def _async_process_view(self, request, view_func, view_args, view_kwargs):
+        return SecureRequestMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
 
     def _accept(self, request):
         request.ecom_secure_request_processing_done = True
@@ -44,6 +69,10 @@ class SecureRequestMiddleware(MiddlewareMixin):
             if len(path_list) > 1 and path_list[1] == 'web':
                 return None
 
+            # Opt-in compression of the response plaintext, read by SecureAPIResponse
+            response_encoding = compression.negotiate(request.headers.get(compression.ACCEPT_ENCODING_HEADER))
+            request.ecom_response_encoding_token = compression.set_response_encoding(response_encoding)
+
             if request.content_type != 'application/json':
                 return self._reject(ERROR_INVALID_REQUEST_BODY_FORMAT)
 
@@ -61,16 +90,26 @@ class SecureRequestMiddleware(MiddlewareMixin):
             if encrypted_data == '':
                 return self._reject(ERROR_INVALID_REQUEST_BODY_FORMAT)
 
-            decrypted_data = decrypt_data(SECRET_KEY, encrypted_data)
+            decrypted_data = decrypt_bytes(SECRET_KEY, encrypted_data)
+
+            body_encoding = request.headers.get(compression.ENCODING_HEADER)
+            if body_encoding:
+                # The client compressed the JSON before encrypting it; the signature covers the uncompressed JSON
+                try:
+                    decrypted_data = compression.decompress(body_encoding, decrypted_data)
+                except compression.CompressionError:
+                    return self._reject(ERROR_UNSUPPORTED_ENCODING)
 
-            if not verify_signature(decrypted_data, signature, SECRET_KEY):
+            if not verify_signature_bytes(decrypted_data, signature, SECRET_KEY):
                 return self._reject(ERROR_INVALID_SIGNATURE)
 
             try:
+                # Parsed once here; api.parsers.SecureJSONParser hands this same document to DRF
                 decrypted_body = json.loads(decrypted_data)
-                request._body = json.dumps(decrypted_body).encode('utf-8')
+                # The plaintext already is the JSON document, so it replaces the body as-is
+                request._body = decrypted_data
                 request.POST = request.POST.copy()
-                request.data = json.loads(decrypted_data)
+                request.data = decrypted_body
 
             except (ValueError, KeyError):
                 return self._reject(ERROR_INVALID_REQUEST_BODY_FORMAT)
@@ -80,3 +119,125 @@ class SecureRequestMiddleware(MiddlewareMixin):
             return self._reject(ERROR_SERVER_VERIFICATION_FAILED)
 
         return self._accept(request)
+
+    def process_response(self, request, response):
+        token = getattr(request, 'ecom_response_encoding_token', None)
+        if token is not None:
+            compression.reset_response_encoding(token)
+            patch_vary_headers(response, (compression.ACCEPT_ENCODING_HEADER,))
+        return response
+
+
+class QueryMetricsMiddleware:
+    """
+    Records query count, DB time, repeated statements and serialization time for every request and adds them to the
+    per-view totals served by api/web/query_metrics/. A view can declare a query_budget; requests that go over it,
+    or that repeat a statement often enough to look like an N+1, are logged.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with query_metrics.collect_queries() as stats:
+            response = self.get_response(request)
+        return self._record(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        async with query_metrics.acollect_queries() as stats:
+            response = await self.get_response(request)
+        return self._record(request, response, stats, time.perf_counter() - started)
+
+    def _record(self, request, response, stats, view_time):
+        match = request.resolver_match
+        if match is None:
+            return response
+        endpoint = match.view_name or match.route
+        query_metrics.endpoint_metrics.add(endpoint, stats, view_time)
+
+        budget = getattr(getattr(match.func, 'cls', None), 'query_budget', None)
+        if budget is not None and stats.count > budget:
+            query_metrics.logger.warning("%s ran %s queries, budget is %s", endpoint, stats.count, budget)
+        for sql, count in stats.repeated():
+            query_metrics.logger.warning("%s: possible N+1, %sx %s", endpoint, count, sql)
+
+        if QUERY_METRICS_HEADERS:
+            response['X-Query-Count'] = str(stats.count)
+            response['X-Query-Time-Ms'] = f"{stats.duration * 1000:.2f}"
+            response['X-Query-Duplicates'] = str(stats.duplicate_count)
+            response['X-Serialization-Time-Ms'] = f"{stats.serialization_time * 1000:.2f}"
+            response['X-View-Time-Ms'] = f"{view_time * 1000:.2f}"
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Scopes db_routing state to the request: views declaring read_only = True read from the replica unless the user
+    wrote recently, and a request that wrote keeps its user on the primary for the next few seconds.
+    Must come after SecureRequestMiddleware, which provides the decrypted body (user_id) to process_view.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state, token = db_routing.begin_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            db_routing.end_request(token)
+        if state.wrote:
+            db_routing.routing_metrics.count('writing_requests')
+            db_routing.mark_sticky(state.user_key)
+        return response
+
+    async def __acall__(self, request):
+        # The state object is shared with the sync_to_async threads the ORM runs on (they copy the context)
+        state, token = db_routing.begin_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_routing.end_request(token)
+        if state.wrote:
+            db_routing.routing_metrics.count('writing_requests')
+            await sync_to_async(db_routing.mark_sticky, thread_sensitive=False)(state.user_key)
+        return response
+
+    @staticmethod
+    def _user_key(request):
+        data = getattr(request, 'data', None)
+        if isinstance(data, dict) and data.get('user_id'):
+            return str(data['user_id'])
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return str(user.pk)
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = db_routing.get_state()
+        if state is None:
+            return None
+        state.user_key = self._user_key(request)
+        if getattr(getattr(view_func, 'cls', None), 'read_only', False) and db_routing.replica_configured():
+            if db_routing.is_sticky(state.user_key):
+                db_routing.routing_metrics.count('sticky_requests')
+            else:
+                state.use_replica = True
+                db_routing.routing_metrics.count('replica_requests')
+        return None
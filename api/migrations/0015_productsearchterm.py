@@ -0,0 +1,96 @@
+# Generated by Django 4.2.20 on 2026-10-19 05:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+import unicodedata
+
+# Frozen copy of api.utility_files.search_index as of this migration, so later tokenizer changes
+# do not change what this migration writes (rebuild_search_index rebuilds with the current one)
+TOKEN_RE = re.compile(r"\w+")
+MAX_TERM_LENGTH = 64
+FIELD_WEIGHTS = (
+    ("name", 8),
+    ("brand", 5),
+    ("ingredients", 3),
+    ("how_to_use", 1),
+    ("description", 1),
+)
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+    return unicodedata.normalize("NFC", stripped).casefold()
+
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(normalize(text))]
+
+
+def build_terms(product, brand_name):
+    texts = {
+        "name": product.name,
+        "brand": brand_name,
+        "ingredients": product.ingredients,
+        "how_to_use": product.how_to_use,
+        "description": product.description,
+    }
+    terms = {}
+    for field, weight in FIELD_WEIGHTS:
+        for term in set(tokenize(texts[field])):
+            terms[term] = terms.get(term, 0) + weight
+    return terms
+
+
+def build_search_index(apps, schema_editor):
+    Product = apps.get_model("api", "Product")
+    ProductSearchTerm = apps.get_model("api", "ProductSearchTerm")
+    rows = []
+    for product in Product.objects.select_related("brand").iterator():
+        brand_name = product.brand.brand_name if product.brand_id else ""
+        terms = build_terms(product, brand_name)
+        rows.extend(
+            ProductSearchTerm(product_id=product.pk, term=term, weight=weight)
+            for term, weight in terms.items()
+        )
+    ProductSearchTerm.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0014_alter_brand_main_image_alter_product_main_image_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSearchTerm",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("term", models.CharField(max_length=64)),
+                ("weight", models.PositiveIntegerField(default=1)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_terms",
+                        to="api.product",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "product_search_term",
+                "unique_together": {("term", "product")},
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
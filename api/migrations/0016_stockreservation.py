@@ -0,0 +1,57 @@
+# Generated by Django 4.2.20 on 2026-10-19 05:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0015_productsearchterm"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockReservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.PositiveIntegerField()),
+                ("expires_at", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "prepare_order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="api.prepareorder",
+                    ),
+                ),
+                (
+                    "variant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="api.productvariant",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "stock_reservation",
+                "indexes": [
+                    models.Index(
+                        fields=["variant", "expires_at"],
+                        name="stock_resv_variant_expiry",
+                    ),
+                    models.Index(fields=["expires_at"], name="stock_resv_expiry"),
+                ],
+            },
+        ),
+    ]
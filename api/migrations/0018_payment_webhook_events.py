@@ -0,0 +1,98 @@
+# Generated by Django 4.2.20 on 2026-10-19 05:35
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0017_idempotencyrecord"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="prepareorder",
+            name="paid_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="prepareorder",
+            name="payment_id",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="prepareorder",
+            name="payment_status",
+            field=models.CharField(
+                choices=[
+                    ("created", "Created"),
+                    ("failed", "Failed"),
+                    ("paid", "Paid"),
+                    ("refunded", "Refunded"),
+                ],
+                default="created",
+                max_length=16,
+            ),
+        ),
+        migrations.CreateModel(
+            name="PaymentWebhookEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "provider",
+                    models.CharField(
+                        choices=[("razorpay", "Razorpay"), ("paypal", "PayPal")],
+                        max_length=16,
+                    ),
+                ),
+                ("event_id", models.CharField(max_length=128)),
+                ("event_type", models.CharField(max_length=64)),
+                ("payload", models.JSONField()),
+                ("headers", models.JSONField(blank=True, null=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("processed", "Processed"),
+                            ("ignored", "Ignored"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=16,
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("last_error", models.CharField(blank=True, max_length=255, null=True)),
+                ("received_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "available_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("processed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "payment_webhook_event",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "available_at"], name="payment_event_pending"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="paymentwebhookevent",
+            constraint=models.UniqueConstraint(
+                fields=("provider", "event_id"), name="payment_event_provider_id"
+            ),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 4.2.20 on 2026-10-19 05:42
+
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations, models
+from django.db.models import Count
+
+# Frozen copy of api.utility_files.ratings as of this migration, so later changes there
+# do not change what this migration writes (recompute_product_ratings rebuilds with the current one)
+RATING_VALUES = (1, 2, 3, 4, 5)
+RATING_FIELDS = ("rating_avg", "rating_count") + tuple(f"rating_{value}" for value in RATING_VALUES)
+
+
+def rating_fields(histogram):
+    counts = {value: histogram.get(value, 0) for value in RATING_VALUES}
+    count = sum(counts.values())
+    average = Decimal(sum(value * counts[value] for value in RATING_VALUES)) / count if count else Decimal(0)
+    return {
+        "rating_avg": average.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
+        "rating_count": count,
+        **{f"rating_{value}": counts[value] for value in RATING_VALUES},
+    }
+
+
+def backfill_ratings(apps, schema_editor):
+    Product = apps.get_model("api", "Product")
+    Review = apps.get_model("api", "Review")
+    histograms = {}
+    rows = (
+        Review.objects.filter(rating__in=RATING_VALUES)
+        .values("product_id", "rating")
+        .annotate(reviews=Count("id"))
+        .order_by()
+    )
+    for row in rows:
+        histograms.setdefault(row["product_id"], {})[row["rating"]] = row["reviews"]
+    products = []
+    for product in Product.objects.filter(id__in=list(histograms)).only("id"):
+        for field, value in rating_fields(histograms[product.id]).items():
+            setattr(product, field, value)
+        products.append(product)
+    Product.objects.bulk_update(products, RATING_FIELDS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0018_payment_webhook_events"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_1",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_2",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_3",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_4",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_5",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_avg",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
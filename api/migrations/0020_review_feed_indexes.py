@@ -0,0 +1,25 @@
+# Generated by Django 4.2.20 on 2026-10-19 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0019_product_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["product", "helpful_count", "id"], name="review_product_helpful"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["product", "created_at", "id"], name="review_product_recent"
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.20 on 2026-10-19 05:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0020_review_feed_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "is_active", "price"],
+                name="product_category_active_price",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["brand", "is_active"], name="product_brand_active"
+            ),
+        ),
+    ]
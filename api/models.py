@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.timezone import now
 from django.utils.text import slugify
 from django.conf import settings
@@ -114,11 +114,25 @@ class Product(models.Model):
     main_image = models.ImageField(upload_to='products/')
     brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, blank=True, related_name="products")
 
+    # Review aggregates, kept up to date by the review signals (see api/utility_files/ratings.py)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     class Meta:
         db_table = 'product'
+        # Listing filters: category (or brand) listings of active products, ranged on price
+        indexes = [
+            models.Index(fields=["category", "is_active", "price"], name="product_category_active_price"),
+            models.Index(fields=["brand", "is_active"], name="product_brand_active"),
+        ]
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
@@ -128,6 +142,24 @@ class Product(models.Model):
         return self.name
 
 
+class ProductSearchTerm(models.Model):
+    """
+    Inverted index for product search: one row per (normalized term, product).
+    Rows are rebuilt from the product's name, brand, ingredients, how_to_use and description on save.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="search_terms")
+    term = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField(default=1)  # sum of the weights of the fields containing the term
+
+    class Meta:
+        db_table = 'product_search_term'
+        # Leading "term" column serves both exact and prefix lookups
+        unique_together = [["term", "product"]]
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
+
+
 class ProductVariant(models.Model):
     product = models.ForeignKey(
         Product,
@@ -172,6 +204,20 @@ class Review(models.Model):
     helpful_count = models.PositiveIntegerField(default=0)
     class Meta:
         db_table = 'review'
+        # Review feed pages: (product, sort field, id) keyset scans, see GetProductReviewsView
+        indexes = [
+            models.Index(fields=["product", "helpful_count", "id"], name="review_product_helpful"),
+            models.Index(fields=["product", "created_at", "id"], name="review_product_recent"),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        One transaction from the locked read of the old rating (pre_save) to the product aggregate update (post_save),
+        see api/signals.py, so concurrent edits of a review are counted one after the other.
+        """
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Review by {self.user.name} - {self.product.name}"
 
@@ -224,12 +270,23 @@ class Address(models.Model):
         return f"{self.user.name} - {self.house}, {self.road} ({'Default' if self.is_default else 'Secondary'})"
 
 class PrepareOrder(models.Model):
+    # Ordered by precedence: a webhook never moves an order back to an earlier payment status
+    PAYMENT_STATUS_CHOICES = [
+        ('created', 'Created'),
+        ('failed', 'Failed'),
+        ('paid', 'Paid'),
+        ('refunded', 'Refunded'),
+    ]
     user = models.ForeignKey(User, on_delete=models.CASCADE, default=None)
     id = models.CharField(max_length=255, unique=True, primary_key=True)  # Unique identifier for the order
     amount = models.DecimalField(max_digits=10, decimal_places=2)  # Amount in INR
     currency = models.CharField(max_length=10, default="INR")  # Currency, default to INR
     receipt = models.CharField(max_length=255, blank=True, null=True)  # Receipt number
     partial_payment = models.BooleanField(default=False)  # Boolean for partial payment
+    # Set from payment gateway webhooks (api.utility_files.payment_events)
+    payment_status = models.CharField(max_length=16, choices=PAYMENT_STATUS_CHOICES, default='created')
+    payment_id = models.CharField(max_length=64, blank=True, null=True)
+    paid_at = models.DateTimeField(blank=True, null=True)
 
     # Notes (storing key-value pairs as JSON)
     notes = models.JSONField(blank=True, null=True)
@@ -242,6 +299,66 @@ class PrepareOrder(models.Model):
         return f"Order {self.id} - {self.amount} {self.currency}"
 
 
+class StockReservation(models.Model):
+    """
+    Quantity of a variant held for a prepared (not yet saved) order. A hold counts against the variant's available
+    stock until expires_at; save_order turns it into a sale and release_expired_reservations deletes stale ones.
+    """
+    prepare_order = models.ForeignKey(PrepareOrder, on_delete=models.CASCADE, related_name="reservations")
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name="reservations")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'stock_reservation'
+        indexes = [
+            # live holds of a variant: variant = ? AND expires_at > now
+            models.Index(fields=["variant", "expires_at"], name="stock_resv_variant_expiry"),
+            # sweeper
+            models.Index(fields=["expires_at"], name="stock_resv_expiry"),
+        ]
+
+    def __str__(self):
+        return f"{self.prepare_order_id} holds {self.quantity} x {self.variant_id}"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    Outcome of a request sent with an Idempotency-Key header. While the first request runs the row is in progress;
+    once it succeeds the encrypted response is kept until expires_at and replayed for retries with the same key.
+    """
+    STATUS_IN_PROGRESS = 'in_progress'
+    STATUS_COMPLETED = 'completed'
+    STATUS_CHOICES = [
+        (STATUS_IN_PROGRESS, 'In progress'),
+        (STATUS_COMPLETED, 'Completed'),
+    ]
+
+    scope = models.CharField(max_length=64)  # endpoint the key was used on
+    key = models.CharField(max_length=128)
+    request_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_IN_PROGRESS)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_data = models.JSONField(null=True, blank=True)
+    response_headers = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'idempotency_record'
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "key"], name="idempotency_scope_key"),
+        ]
+        indexes = [
+            # sweeper
+            models.Index(fields=["expires_at"], name="idempotency_expiry"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key} ({self.status})"
+
+
 class Orders(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -374,4 +491,46 @@ class PaypalOrder(models.Model):
     class Meta:
         db_table = 'paypal_order'
     def __str__(self):
-        return self.order_id
\ No newline at end of file
+        return self.order_id
+
+
+class PaymentWebhookEvent(models.Model):
+    """
+    Inbox of payment gateway webhook deliveries. The webhook endpoints only verify and append; reconcile_payment_events
+    applies pending events to PrepareOrder, PaypalOrder and Orders in batches.
+    """
+    PROVIDER_CHOICES = [
+        ('razorpay', 'Razorpay'),
+        ('paypal', 'PayPal'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),  # event type or order we do not track
+        ('failed', 'Failed'),  # gave up after repeated attempts or failed verification
+    ]
+    provider = models.CharField(max_length=16, choices=PROVIDER_CHOICES)
+    event_id = models.CharField(max_length=128)
+    event_type = models.CharField(max_length=64)
+    payload = models.JSONField()
+    headers = models.JSONField(null=True, blank=True)  # delivery headers needed to verify the event later
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True, null=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=now)  # not retried before this time
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'payment_webhook_event'
+        constraints = [
+            # Providers redeliver; a redelivered event is dropped by the insert
+            models.UniqueConstraint(fields=["provider", "event_id"], name="payment_event_provider_id"),
+        ]
+        indexes = [
+            # reconciler: status = 'pending' AND available_at <= now ORDER BY available_at
+            models.Index(fields=["status", "available_at"], name="payment_event_pending"),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.event_type} {self.event_id} ({self.status})"
\ No newline at end of file
@@ -0,0 +1,21 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: DRF parsers for the api app
+"""
+from rest_framework.parsers import JSONParser
+
+
+class SecureJSONParser(JSONParser):
+    """
+    JSON parser that returns the document SecureRequestMiddleware already decrypted and parsed,
+    instead of decoding the request body a second time. Requests the middleware did not handle
+    are parsed as usual.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = (parser_context or {}).get('request')
+        django_request = getattr(request, '_request', None)
+        if getattr(django_request, 'ecom_secure_request_processing_done', False):
+            return django_request.data
+        return super().parse(stream, media_type, parser_context)
@@ -0,0 +1,180 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Plain-dict serializers for the catalog read paths (product listings, brand products, search, reviews).
+They build the same JSON as ProductSerializer, ProductVariantSerializer and ReviewSerializer from .values() rows:
+related rows are read with one query per relation for the whole list, and media URLs are joined onto a base URL
+made absolute once per request instead of calling build_absolute_uri for every image. Decimals and datetimes are
+formatted by DRF's own field classes, so the output stays byte-identical (see FastSerializerParityTest).
+"""
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
+from rest_framework import serializers
+from api.models import Product, ProductImage, ProductVariant, ReviewImage
+from api.utility_files.ratings import HISTOGRAM_FIELDS, rating_histogram
+import re
+
+PRODUCT_COLUMNS = (
+    "id", "name", "slug", "description", "description_file", "ingredients", "how_to_use", "price", "discount_price",
+    "stock", "sold_count", "main_image", "brand_id", "brand__brand_name", "rating_avg", "rating_count",
+    *HISTOGRAM_FIELDS, "is_active", "created_at", "updated_at",
+)
+REVIEW_COLUMNS = ("id", "user_id", "user__name", "product_id", "rating", "comment", "created_at", "helpful_count")
+
+# Names storage.url() may resolve differently from a plain join onto base_url
+_UNSAFE_NAME = re.compile(r"^/|\.\.|\./|[:?#\\]")
+
+_decimal_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+_datetime_field = serializers.DateTimeField()
+_review_datetime_field = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S")
+
+
+class MediaURLs:
+    """Builds media URLs for one request."""
+
+    def __init__(self, request):
+        self.request = request
+        self._prefixes = {}
+
+    def _prefix(self, storage):
+        key = id(storage)
+        if key not in self._prefixes:
+            base_url = getattr(storage, "base_url", None) if isinstance(storage, FileSystemStorage) else None
+            if base_url and base_url.startswith("/") and not base_url.startswith("//"):
+                self._prefixes[key] = (base_url, self.request.build_absolute_uri(base_url) if self.request else None)
+            else:
+                self._prefixes[key] = None
+        return self._prefixes[key]
+
+    def relative(self, field, name):
+        """:return: storage.url(name) of a file field, or None for an empty name"""
+        if not name:
+            return None
+        prefix = self._prefix(field.storage)
+        if prefix is None or _UNSAFE_NAME.search(name):
+            return field.storage.url(name)
+        return prefix[0] + filepath_to_uri(name)
+
+    def absolute(self, field, name):
+        """:return: Absolute URL of a file field as build_absolute_uri(file.url), None without a request or name"""
+        if not name or self.request is None:
+            return None
+        prefix = self._prefix(field.storage)
+        if prefix is None or _UNSAFE_NAME.search(name):
+            return self.request.build_absolute_uri(field.storage.url(name))
+        return prefix[1] + filepath_to_uri(name)
+
+
+def product_rows(queryset):
+    """:return: The queryset as .values() rows with the columns serialize_products needs"""
+    return queryset.values(*PRODUCT_COLUMNS)
+
+
+def product_rows_by_ids(ids) -> list:
+    """:return: Rows of the given products in the order of ids (missing ids are skipped), in one query"""
+    rows = {row["id"]: row for row in product_rows(Product.objects.filter(id__in=ids))}
+    return [rows[product_id] for product_id in ids if product_id in rows]
+
+
+def serialize_products(rows, request) -> list:
+    """
+    ProductSerializer(many=True) for product_rows() rows; variants and images cost one query each.
+    :param rows: Rows from product_rows / product_rows_by_ids, in output order
+    :param request: Request the media URLs are made absolute against (None gives None URLs, as ProductSerializer)
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    ids = [row["id"] for row in rows]
+    media = MediaURLs(request)
+
+    variants = {}
+    for variant in ProductVariant.objects.filter(product_id__in=ids).values(
+            "id", "product_id", "name", "price", "discount_price", "stock", "sold_count"):
+        variants.setdefault(variant["product_id"], []).append({
+            "id": variant["id"],
+            "name": variant["name"],
+            "price": _decimal_field.to_representation(variant["price"]),
+            "discount_price": (_decimal_field.to_representation(variant["discount_price"])
+                               if variant["discount_price"] is not None else None),
+            "stock": variant["stock"],
+            "sold_count": variant["sold_count"],
+        })
+
+    image_field = ProductImage._meta.get_field("image")
+    images = {}
+    for image in ProductImage.objects.filter(product_id__in=ids).order_by("id").values("id", "product_id", "image"):
+        images.setdefault(image["product_id"], []).append(
+            {"id": image["id"], "image": media.absolute(image_field, image["image"])})
+
+    description_field = Product._meta.get_field("description_file")
+    main_image_field = Product._meta.get_field("main_image")
+    serialized = []
+    for row in rows:
+        product = {
+            "id": row["id"],
+            "name": row["name"],
+            "slug": row["slug"],
+            "description": row["description"],
+            "description_file": media.absolute(description_field, row["description_file"]),
+            "ingredients": row["ingredients"],
+            "how_to_use": row["how_to_use"],
+            "variants": variants.get(row["id"], []),
+            "price": int(row["price"]),
+            "discount_price": int(row["discount_price"]) if row["discount_price"] else None,
+            "stock": row["stock"],
+            "sold_count": row["sold_count"],
+            "main_image": media.absolute(main_image_field, row["main_image"]),
+            "additional_images": images.get(row["id"], []),
+            "brand": row["brand_id"],
+        }
+        # ProductSerializer leaves brand_name out for products without a brand
+        if row["brand_id"] is not None:
+            product["brand_name"] = row["brand__brand_name"]
+        product["rating_avg"] = float(row["rating_avg"])
+        product["rating_count"] = row["rating_count"]
+        product["rating_histogram"] = rating_histogram(row)
+        product["is_active"] = row["is_active"]
+        product["created_at"] = _datetime_field.to_representation(row["created_at"])
+        product["updated_at"] = _datetime_field.to_representation(row["updated_at"])
+        serialized.append(product)
+    return serialized
+
+
+def review_rows(queryset):
+    """:return: The queryset as .values() rows with the columns serialize_reviews needs"""
+    return queryset.values(*REVIEW_COLUMNS)
+
+
+def serialize_reviews(rows, request) -> list:
+    """
+    ReviewSerializer(many=True) for review_rows() rows; images cost one query.
+    :param rows: Rows from review_rows, in output order
+    :param request: Request the image URLs are made absolute against
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    media = MediaURLs(request)
+    image_field = ReviewImage._meta.get_field("image")
+    images = {}
+    for image in ReviewImage.objects.filter(review_id__in=[row["id"] for row in rows]).order_by("id").values(
+            "id", "review_id", "image"):
+        if request is None:
+            url = media.relative(image_field, image["image"])
+        else:
+            # ReviewSerializer.to_representation passes every image through build_absolute_uri, even a missing one
+            url = media.absolute(image_field, image["image"]) or request.build_absolute_uri(None)
+        images.setdefault(image["review_id"], []).append({"id": image["id"], "image": url})
+
+    return [{
+        "id": row["id"],
+        "user": row["user_id"],
+        "user_name": row["user__name"],
+        "product": row["product_id"],
+        "rating": row["rating"],
+        "comment": row["comment"],
+        "created_at": _review_datetime_field.to_representation(row["created_at"]),
+        "images": images.get(row["id"], []),
+        "helpful_count": row["helpful_count"],
+    } for row in rows]
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from api.models import *
+from api.utility_files.ratings import rating_histogram
 
 class ProductImageSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
@@ -36,6 +37,8 @@ class ProductSerializer(serializers.ModelSerializer):
     description_file = serializers.SerializerMethodField()
     ingredients = serializers.CharField(required=False, allow_blank=True)
     how_to_use = serializers.CharField(required=False, allow_blank=True)
+    rating_avg = serializers.SerializerMethodField()
+    rating_histogram = serializers.SerializerMethodField()
     class Meta:
         model = Product
         fields = [
@@ -49,6 +52,7 @@ class ProductSerializer(serializers.ModelSerializer):
             "main_image", "additional_images",
             "brand",  # will still be the brand _id_
             "brand_name",  # now also the brand’s human-readable name
+            "rating_avg", "rating_count", "rating_histogram",  # review aggregates, see api/utility_files/ratings.py
             "is_active", "created_at", "updated_at",
         ]
 
@@ -63,6 +67,10 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def get_price(self, obj):
         return int(obj.price)
+    def get_rating_avg(self, obj):
+        return float(obj.rating_avg)
+    def get_rating_histogram(self, obj):
+        return rating_histogram(obj)
     def get_discount_price(self, obj):
         if obj.discount_price:
             return int(obj.discount_price)
@@ -125,6 +133,21 @@ class BrandSerializer(serializers.ModelSerializer):
         fields = ["id", "brand_name", "slug", "main_image", "slogan", "created_at", "products"]
 
 
+class ProductPreviewSerializer(ProductSerializer):
+    """Card-sized product used in brand previews, needs no related rows."""
+    class Meta(ProductSerializer.Meta):
+        fields = ["id", "name", "slug", "price", "discount_price", "sold_count", "main_image"]
+
+
+class BrandSummarySerializer(serializers.ModelSerializer):
+    # Both are attached by GetBrandListView, see its summary mode
+    product_count = serializers.IntegerField(read_only=True)
+    preview_products = ProductPreviewSerializer(many=True, read_only=True)
+    class Meta:
+        model = Brand
+        fields = ["id", "brand_name", "slug", "main_image", "slogan", "created_at", "product_count", "preview_products"]
+
+
 class AddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Address
@@ -0,0 +1,107 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Model signal handlers for the api app
+"""
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from api.models import Category, Brand, Product, ProductVariant, ProductImage, Review, ReviewImage
+from api.utility_files.catalog_cache import invalidate_catalog_on_commit
+from api.utility_files.category_tree import category_tree
+from api.utility_files.ratings import apply_review_change
+from api.utility_files.search_index import index_product, index_products
+from api.utility_files.suggest import suggestion_index
+
+# Every model that ends up in a serialized catalog payload
+CATALOG_MODELS = (Category, Brand, Product, ProductVariant, ProductImage, Review, ReviewImage)
+
+
+def invalidate_catalog_cache(sender, **kwargs):
+    invalidate_catalog_on_commit()
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f"catalog_cache_save_{model.__name__}")
+    post_delete.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f"catalog_cache_delete_{model.__name__}")
+
+
+@receiver(post_save, sender=Product, dispatch_uid="search_index_product")
+def reindex_product(sender, instance, raw=False, **kwargs):
+    # Index rows are removed together with the product through the FK cascade
+    if not raw:
+        transaction.on_commit(lambda: index_product(instance))
+
+
+@receiver(post_save, sender=Brand, dispatch_uid="search_index_brand")
+def reindex_brand_products(sender, instance, created=False, raw=False, **kwargs):
+    # The brand name is indexed on each of its products
+    if not raw and not created:
+        transaction.on_commit(lambda: index_products(Product.objects.filter(brand=instance)))
+
+
+@receiver(post_save, sender=Product, dispatch_uid="suggest_product_save")
+def update_product_suggestions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        name = instance.name if instance.is_active else None
+        transaction.on_commit(lambda: suggestion_index.apply("products", instance.pk, name, instance.sold_count))
+
+
+@receiver(post_save, sender=Brand, dispatch_uid="suggest_brand_save")
+def update_brand_suggestions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: suggestion_index.apply("brands", instance.pk, instance.brand_name))
+
+
+@receiver(post_save, sender=Category, dispatch_uid="suggest_category_save")
+def update_category_suggestions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: suggestion_index.apply("categories", instance.pk, instance.name))
+
+
+@receiver(post_delete, sender=Product, dispatch_uid="suggest_product_delete")
+@receiver(post_delete, sender=Brand, dispatch_uid="suggest_brand_delete")
+@receiver(post_delete, sender=Category, dispatch_uid="suggest_category_delete")
+def remove_suggestions(sender, instance, **kwargs):
+    kind = {Product: "products", Brand: "brands", Category: "categories"}[sender]
+    pk = instance.pk
+    transaction.on_commit(lambda: suggestion_index.apply(kind, pk))
+
+
+@receiver(pre_save, sender=Review, dispatch_uid="ratings_review_pre_save")
+def remember_review_rating(sender, instance, raw=False, **kwargs):
+    # (product, rating) the review is counted under now, taken out again in post_save. Review.save() runs in a
+    # transaction, so the row lock is held until the aggregates are updated: a concurrent edit of the same review
+    # waits here and then reads the rating this one wrote, instead of removing the same old star twice.
+    instance._counted_rating = None
+    if not raw and instance.pk is not None:
+        instance._counted_rating = (Review.objects.select_for_update().filter(pk=instance.pk)
+                                    .values_list("product_id", "rating").first())
+
+
+@receiver(post_save, sender=Review, dispatch_uid="ratings_review_save")
+def update_product_rating(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_counted_rating", None)
+    if previous is None:
+        apply_review_change(instance.product_id, added=instance.rating)
+    elif previous[0] != instance.product_id:
+        apply_review_change(previous[0], removed=previous[1])
+        apply_review_change(instance.product_id, added=instance.rating)
+    elif previous[1] != instance.rating:
+        apply_review_change(instance.product_id, added=instance.rating, removed=previous[1])
+
+
+@receiver(post_delete, sender=Review, dispatch_uid="ratings_review_delete")
+def remove_product_rating(sender, instance, origin=None, **kwargs):
+    # Nothing to update when the review goes away with its product
+    if isinstance(origin, Product) or getattr(origin, "model", None) is Product:
+        return
+    apply_review_change(instance.product_id, removed=instance.rating)
+
+
+@receiver(post_save, sender=Category, dispatch_uid="category_tree_save")
+@receiver(post_delete, sender=Category, dispatch_uid="category_tree_delete")
+def refresh_category_tree(sender, **kwargs):
+    transaction.on_commit(category_tree.invalidate)
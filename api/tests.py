@@ -1,3 +1,1766 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import razorpay
+import requests
+from asgiref.sync import sync_to_async
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad, unpad
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models.query import QuerySet
+from django.core import mail
+from django.core.handlers.base import BaseHandler
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from razorpay.constants.url import URL
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from api.models import Address, Brand, Category, EmailOTP, IdempotencyRecord, OrderItem, Orders, PaymentWebhookEvent, \
+    PaypalOrder, PrepareOrder, Product, ProductImage, ProductVariant, Review, ReviewImage, StockReservation, User, \
+    Wishlist
+from api.serializers_files import fast_serializers
+from api.serializers_files.serializers import ProductSerializer, ReviewSerializer
+from api.middleware import ERROR_UNSUPPORTED_ENCODING, ReplicaRoutingMiddleware
+from api.utility_files import async_http, compression, crypto, db_routing, http_client, idempotency, payment_events, \
+    paypal, ratings, resilience
+from api.utility_files.async_view import AsyncAPIView
+from api.utility_files.api_call import api_success
+from api.utility_files.category_tree import CategoryTree, category_tree
+from api.utility_files.query_metrics import QueryBudgetExceeded, QueryStats, collect_queries, endpoint_metrics, \
+    fingerprint, query_budget
+from api.utility_files.catalog_cache import get_cached_listing, get_catalog_generation, get_generation, \
+    set_cached_listing
+from api.utility_files.search_index import index_products, search_product_ids
+from api.utility_files.stock import RESERVATION_TTL, InsufficientStock, decrement_stock, get_available_stock, \
+    release_expired_reservations, reserve_stock
+from api.utility_files.suggest import SUGGEST_CHANGE_KEY, SUGGEST_GENERATION_KEY, SuggestionIndex
+from api.views_files import payment_gateway
+from api.views_files import AsyncCreateOrderView, AsyncPaypalCaptureOrderView, AsyncPaypalCreateOrderView, \
+    AsyncSendOtpView, CreateOrderView, GetBrandListView, GetBrandProductsView, GetProductDetailView, \
+    GetProductListView, GetProductReviewsView, GetUserOrderHistoryView, GetWishListView, SaveOrdersView
+from communityapi.views_files import AsyncCreateStreamIdView
+from communityapi.views_files import controller as community_controller
+from ecombackend.db_backends.mysql_pool.pool import ConnectionPool, PoolTimeout
+
+def call_view(view_class, data, **extra):
+    """Calls a POST view directly (no SecureRequestMiddleware) and returns the decrypted response."""
+    request = APIRequestFactory().post('/api/', data, format='json', **extra)
+    response = view_class.as_view({'post': 'create'})(request)
+    return json.loads(crypto.decrypt_data(settings.ECOM_SECRET, response.data['enc_data']))
+
+
+def legacy_encrypt_data(key, plain_body, mode="ECB", secondary_key=""):
+    # crypto.encrypt_data/decrypt_data/generate_signature/verify_signature as clients were built against
+    cipher = crypto.get_cypher(mode, key, secondary_key)
+    return base64.b64encode(cipher.encrypt(pad(plain_body.encode('utf-8'), AES.block_size))).decode('utf-8')
+
+
+def legacy_decrypt_data(key, encrypted_body, mode="ECB", secondary_key=""):
+    cipher = crypto.get_cypher(mode, key, secondary_key)
+    return unpad(cipher.decrypt(base64.b64decode(encrypted_body)), AES.block_size).decode('utf-8')
+
+
+def legacy_generate_signature(data, secret_key):
+    return base64.b64encode(hmac.new(secret_key.encode('utf-8'), data.encode('utf-8'), hashlib.sha256)
+                            .hexdigest().encode("utf-8"))
+
+
+class CryptoCompatibilityTest(SimpleTestCase):
+    """The bytes based helpers must stay wire compatible with the original string helpers."""
+    key = settings.ECOM_SECRET
+    messages = ('', 'a', 'x' * 15, 'x' * 16, 'x' * 17, '{"user_id": "U_1", "name": "수분 크림 🌹"}',
+                json.dumps({"items": [{"id": index, "name": f"상품 {index}"} for index in range(200)]},
+                           ensure_ascii=False))
+
+    def test_encryption_matches_the_original_helpers(self):
+        for message in self.messages:
+            encrypted = crypto.encrypt_bytes(self.key, message.encode('utf-8'))
+            self.assertEqual(encrypted, legacy_encrypt_data(self.key, message))
+            self.assertEqual(crypto.encrypt_data(self.key, message), encrypted)
+            self.assertEqual(crypto.decrypt_bytes(self.key, legacy_encrypt_data(self.key, message)),
+                             message.encode('utf-8'))
+            self.assertEqual(legacy_decrypt_data(self.key, encrypted), message)
+            self.assertEqual(crypto.decrypt_data(self.key, encrypted), message)
+
+    def test_cbc_still_uses_a_fresh_cipher_per_message(self):
+        iv = '0123456789abcdef'
+        for message in self.messages:
+            encrypted = crypto.encrypt_data(self.key, message, 'CBC', iv)
+            self.assertEqual(encrypted, legacy_encrypt_data(self.key, message, 'CBC', iv))
+            self.assertEqual(crypto.decrypt_data(self.key, encrypted, 'CBC', iv), message)
+
+    def test_signatures_match_the_original_helpers(self):
+        for message in self.messages:
+            signature = crypto.sign_bytes(message.encode('utf-8'), self.key)
+            self.assertEqual(signature, legacy_generate_signature(message, self.key))
+            self.assertEqual(crypto.generate_signature(message, self.key), signature)
+            self.assertTrue(crypto.verify_signature_bytes(message.encode('utf-8'), signature.decode(), self.key))
+            self.assertTrue(crypto.verify_signature(message, legacy_generate_signature(message, self.key), self.key))
+            self.assertFalse(crypto.verify_signature_bytes((message + ' ').encode('utf-8'), signature, self.key))
+
+
+class SecureResponseStreamTest(SimpleTestCase):
+    """SecureAPIResponse.stream() must put the same bytes on the wire as rest()."""
+
+    def listing(self, count):
+        return {"products": [{"id": index, "name": f"수분 크림 Rose Toner {index}", "price": 12000 + index,
+                              "tags": ["hydrating", "rose"]} for index in range(count)]}
+
+    def assert_parity(self, body):
+        rest = api_success("Products fetched successfully", body=body).secure().rest()
+        streamed = api_success("Products fetched successfully", body=body).secure().stream()
+        envelope = b"".join(streamed.streaming_content)
+        self.assertEqual(envelope, JSONRenderer().render(rest.data))
+        self.assertEqual(streamed['X-Signature'], rest['X-Signature'])
+        plain = crypto.decrypt_data(settings.ECOM_SECRET, json.loads(envelope)['enc_data'])
+        self.assertEqual(plain, crypto.decrypt_data(settings.ECOM_SECRET, rest.data['enc_data']))
+        self.assertEqual(json.loads(plain)['body'], body)
+        return len(plain)
+
+    def test_small_bodies(self):
+        for body in ({}, {"products": []}, self.listing(1), self.listing(3)):
+            self.assert_parity(body)
+
+    def test_body_spanning_many_cipher_chunks(self):
+        # Several STREAM_CHUNK_SIZE steps, each made of many 48 byte blocks, plus a partial last block
+        self.assertGreater(self.assert_parity(self.listing(4000)), 3 * crypto.STREAM_CHUNK_SIZE)
+
+    def test_chunked_encryption_matches_one_shot(self):
+        key = settings.ECOM_SECRET
+        for size in (0, 1, 47, 48, 49, 95, 96, 1000):
+            data = bytes(range(256)) * (size // 256 + 1)
+            data = data[:size]
+            pieces = [data[index:index + 7] for index in range(0, size, 7)]
+            self.assertEqual(''.join(crypto.iter_encrypt_bytes(key, pieces, chunk_size=crypto.STREAM_BLOCK_SIZE)),
+                             crypto.encrypt_bytes(key, data))
+
+
+class EnvelopeCompressionTest(TestCase):
+    """Compression inside the enc_data envelope, through SecureRequestMiddleware and a real endpoint."""
+    path = '/api/suggest/'
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, data, encoding=None, accept=None):
+        plain = json.dumps(data).encode('utf-8')
+        headers = {'X-Signature': crypto.sign_bytes(plain, settings.ECOM_SECRET).decode('utf-8')}
+        if encoding:
+            plain = compression.compress(encoding, plain) if encoding in compression.SUPPORTED_ENCODINGS else plain
+            headers[compression.ENCODING_HEADER] = encoding
+        if accept:
+            headers[compression.ACCEPT_ENCODING_HEADER] = accept
+        body = json.dumps({'enc_data': crypto.encrypt_bytes(settings.ECOM_SECRET, plain)})
+        return self.client.post(self.path, body, content_type='application/json', headers=headers)
+
+    def decode(self, response):
+        payload = json.loads(response.content)
+        plain = crypto.decrypt_bytes(settings.ECOM_SECRET, payload['enc_data'])
+        if response.has_header(compression.ENCODING_HEADER):
+            plain = compression.decompress(response[compression.ENCODING_HEADER], plain)
+        self.assertTrue(crypto.verify_signature_bytes(plain, payload['signature'], settings.ECOM_SECRET))
+        return json.loads(plain)
+
+    def test_response_encoding_is_negotiated(self):
+        for accept, expected in (('zstd, deflate', compression.SUPPORTED_ENCODINGS[0]), ('deflate', 'deflate'),
+                                 ('br', None), (None, None)):
+            response = self.post({'query': 'ro'}, accept=accept)
+            self.assertEqual(response.get(compression.ENCODING_HEADER), expected, accept)
+            self.assertIn(compression.ACCEPT_ENCODING_HEADER, response['Vary'])
+            self.assertEqual(self.decode(response)['header']['api_status'], 200)
+
+    def test_compressed_request_body_is_decompressed(self):
+        for encoding in compression.SUPPORTED_ENCODINGS:
+            response = self.post({'query': 'ro', 'limit': 3}, encoding=encoding)
+            self.assertEqual(self.decode(response)['header']['api_status'], 200, encoding)
+
+    def test_unsupported_request_encoding_is_rejected(self):
+        response = self.post({'query': 'ro'}, encoding='br')
+        self.assertEqual(response.json()['header']['api_msg'], ERROR_UNSUPPORTED_ENCODING)
+
+        response = self.post({'query': 'ro'}, encoding='deflate')
+        self.assertEqual(self.decode(response)['header']['api_status'], 200)
+        # A body that claims deflate but is not compressed
+        with mock.patch.object(compression, 'compress', side_effect=lambda encoding, data: data):
+            response = self.post({'query': 'ro'}, encoding='deflate')
+        self.assertEqual(response.json()['header']['api_msg'], ERROR_UNSUPPORTED_ENCODING)
+
+    def test_encoding_does_not_outlive_the_request(self):
+        self.post({'query': 'ro'}, accept='deflate')
+        self.assertIsNone(compression.get_response_encoding())
+        # A rejected request negotiated an encoding too
+        self.post({'query': 'ro'}, encoding='br', accept='deflate')
+        self.assertIsNone(compression.get_response_encoding())
+
+
+class CatalogCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Skincare')
+        cls.brand = Brand.objects.create(brand_name='Bloom')
+        cls.product = Product.objects.create(name='Rose Toner', category=cls.category, brand=cls.brand, price=1000,
+                                             main_image='products/p.jpg')
+        cls.variant = ProductVariant.objects.create(product=cls.product, name='50ml', price=1000, stock=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def listing(self):
+        """:return: (products of the listing, queries it ran)"""
+        with CaptureQueriesContext(connection) as queries:
+            result = call_view(GetProductListView, {'category': 'Skincare', 'limit': 10})
+        self.assertEqual(result['header']['api_status'], 200, result)
+        return result['body']['products'], len(queries)
+
+    def test_catalog_changes_invalidate_cached_listings_on_commit(self):
+        self.assertGreater(self.listing()[1], 0)
+        self.assertEqual(self.listing()[1], 0)
+
+        changes = (
+            ('product', lambda: setattr(self.product, 'name', 'Peony Toner') or self.product.save()),
+            ('variant', lambda: setattr(self.variant, 'price', 1200) or self.variant.save()),
+            ('brand', lambda: setattr(self.brand, 'brand_name', 'Blossom') or self.brand.save()),
+            ('category', lambda: self.category.save()),
+            ('new variant', lambda: ProductVariant.objects.create(product=self.product, name='100ml', price=1800)),
+        )
+        for label, change in changes:
+            generation = get_catalog_generation()
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                change()
+                # Not before the commit: a reader could re-cache the uncommitted rows
+                self.assertEqual(get_catalog_generation(), generation, label)
+            self.assertTrue(callbacks, label)
+            self.assertGreater(get_catalog_generation(), generation, label)
+            products, query_count = self.listing()
+            self.assertGreater(query_count, 0, label)
+            self.assertEqual(self.listing()[1], 0, label)
+
+        self.assertEqual(products[0]['name'], 'Peony Toner')
+
+    def test_uncommitted_change_keeps_the_cache(self):
+        self.listing()
+        generation = get_catalog_generation()
+        with self.captureOnCommitCallbacks(execute=False):
+            self.product.name = 'Peony Toner'
+            self.product.save()
+        self.assertEqual(get_catalog_generation(), generation)
+        products, query_count = self.listing()
+        self.assertEqual((products[0]['name'], query_count), ('Rose Toner', 0))
+
+
+class BrandListQueryCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Skincare')
+        for brand_index in range(6):
+            brand = Brand.objects.create(brand_name=f'Brand {brand_index}')
+            for product_index in range(5):
+                product = Product.objects.create(
+                    name=f'Product {brand_index}-{product_index}', category=category, brand=brand,
+                    price=1000 + product_index, sold_count=product_index, main_image='products/p.jpg',
+                )
+                ProductVariant.objects.create(product=product, name='50ml', price=1000)
+                ProductImage.objects.create(product=product, image='products/extra.jpg')
+
+    def test_summary_query_count_is_constant(self):
+        # brands with counts + preview products
+        with self.assertNumQueries(2):
+            result = call_view(GetBrandListView, {'mode': 'summary', 'preview_size': 3})
+        brands = result['body']['brands']
+        self.assertEqual(len(brands), 6)
+        self.assertEqual(brands[0]['product_count'], 5)
+        self.assertEqual([p['sold_count'] for p in brands[0]['preview_products']], [4, 3, 2])
+
+        Brand.objects.create(brand_name='Brand without products')
+        with self.assertNumQueries(2):
+            result = call_view(GetBrandListView, {'mode': 'summary'})
+        self.assertEqual(result['body']['brands'][-1]['preview_products'], [])
+
+    def test_summary_skips_inactive_products(self):
+        brand = Brand.objects.get(brand_name='Brand 0')
+        # The brand's best seller is hidden
+        Product.objects.create(name='Hidden best seller', category=Category.objects.get(), brand=brand, price=1000,
+                               sold_count=100, is_active=False, main_image='products/p.jpg')
+        result = call_view(GetBrandListView, {'mode': 'summary', 'preview_size': 2})
+        summary = result['body']['brands'][0]
+        self.assertEqual(summary['product_count'], 5)
+        self.assertEqual([p['name'] for p in summary['preview_products']], ['Product 0-4', 'Product 0-3'])
+
+    def test_full_listing_query_count_is_constant(self):
+        # brands, products (with brand), variants, additional images
+        with self.assertNumQueries(4):
+            result = call_view(GetBrandListView, {})
+        products = result['body']['brands'][0]['products']
+        self.assertEqual(len(products), 5)
+        self.assertEqual(products[0]['brand_name'], 'Brand 0')
+        self.assertEqual(len(products[0]['variants']), 1)
+        self.assertEqual(len(products[0]['additional_images']), 1)
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='budget@test.com', name='Budget', user_id='U_BUDGET', password='x')
+        category = Category.objects.create(name='Skincare')
+        brand = Brand.objects.create(brand_name='Budget Brand')
+        for index in range(5):
+            product = Product.objects.create(
+                name=f'Product {index}', category=category, brand=brand, price=1000, main_image='products/p.jpg',
+            )
+            ProductVariant.objects.create(product=product, name='50ml', price=1000)
+            Wishlist.objects.create(user=cls.user, product=product)
+
+    def test_wishlist_within_budget(self):
+        with query_budget(GetWishListView.query_budget, max_duplicates=0):
+            result = call_view(GetWishListView, {'user_id': 'U_BUDGET'})
+        self.assertEqual(len(result['body']['wishlist']), 5)
+        self.assertEqual(result['body']['wishlist'][0]['product_details']['brand_name'], 'Budget Brand')
+
+    def test_brand_list_within_budget(self):
+        for mode in ('full', 'summary'):
+            with query_budget(GetBrandListView.query_budget, max_duplicates=0):
+                call_view(GetBrandListView, {'mode': mode})
+
+    def test_repeated_queries_are_reported(self):
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with query_budget(10, max_duplicates=0):
+                for product in Product.objects.all():
+                    list(product.variants.all())
+        self.assertIn('4 repeated queries', str(raised.exception))
+
+    def test_fingerprint_ignores_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM product WHERE id IN (%s, %s, %s) AND name = 'a''b' LIMIT 21"),
+            fingerprint("SELECT * FROM product WHERE id IN (%s) AND name = 'c' LIMIT 1"),
+        )
+
+    def test_middleware_aggregates_per_view(self):
+        endpoint_metrics.reset()
+        self.client.get('/api/get_csrf/')
+        self.client.get('/api/get_csrf/')
+        metrics = endpoint_metrics.snapshot()
+        self.assertEqual(metrics['get_csrf-list']['requests'], 2)
+
+
+
+@override_settings(MONITORING_TOKEN='monitor-token')
+class MonitoringAccessTest(TestCase):
+    """The test client calls from 127.0.0.1, as every request does behind a reverse proxy."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(email='staff@test.com', name='Staff', user_id='U_STAFF', password='x')
+        cls.staff.is_staff = True
+        cls.staff.save()
+        cls.customer = User.objects.create_user(email='shopper@test.com', name='Shopper', user_id='U_SHOP',
+                                                password='x')
+
+    def setUp(self):
+        endpoint_metrics.reset()
+        endpoint_metrics.add('view', QueryStats(), 0.0)
+
+    def test_local_callers_are_refused(self):
+        for url in ('/api/web/query_metrics/', '/api/web/dependency_health/'):
+            self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get('/api/web/query_metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/api/web/query_metrics/', HTTP_X_MONITORING_TOKEN='wrong').status_code, 403)
+
+    def test_staff_and_token_callers_are_served(self):
+        self.assertEqual(self.client.get('/api/web/query_metrics/', HTTP_X_MONITORING_TOKEN='monitor-token')
+                         .status_code, 200)
+        self.client.force_login(self.staff)
+        for url in ('/api/web/query_metrics/', '/api/web/dependency_health/'):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    @override_settings(MONITORING_TOKEN=None)
+    def test_no_token_configured(self):
+        self.assertEqual(self.client.get('/api/web/query_metrics/', HTTP_X_MONITORING_TOKEN='').status_code, 403)
+
+    def test_reset_needs_post(self):
+        self.client.get('/api/web/query_metrics/?reset=1', HTTP_X_MONITORING_TOKEN='monitor-token')
+        self.assertIn('view', endpoint_metrics.snapshot())
+        self.assertEqual(self.client.post('/api/web/query_metrics/').status_code, 403)
+        self.assertIn('view', endpoint_metrics.snapshot())
+        response = self.client.post('/api/web/query_metrics/', HTTP_X_MONITORING_TOKEN='monitor-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('view', endpoint_metrics.snapshot())
+
+def create_checkout_fixture(variant_count, stock):
+    user = User.objects.create_user(email='buyer@test.com', name='Buyer', user_id='U_BUYER', password='x')
+    address = Address.objects.create(user=user, pincode='12345', house='1', road='Road', name='Buyer', phone='010')
+    category = Category.objects.create(name='Skincare')
+    product = Product.objects.create(name='Toner', category=category, price=1000, main_image='products/p.jpg')
+    variants = [ProductVariant.objects.create(product=product, name=f'{index}0ml', price=1000, stock=stock)
+                for index in range(variant_count)]
+    return user, address, product, variants
+
+
+def save_order_payload(user, address, product, variants, quantity, order_id):
+    PrepareOrder.objects.create(id=order_id, user=user, amount=1000)
+    return {
+        'user_id': user.user_id, 'address_id': address.id, 'order_id': order_id, 'total_price': 1000,
+        'items': [{'product_id': product.id, 'variant_id': variant.id, 'quantity': quantity} for variant in variants],
+    }
+
+
+class SaveOrderQueryCountTest(TestCase):
+    def test_query_count_does_not_grow_with_cart_size(self):
+        user, address, product, variants = create_checkout_fixture(variant_count=12, stock=10)
+        counts = []
+        for cart_size in (1, 12):
+            payload = save_order_payload(user, address, product, variants[:cart_size], 1, f'order_{cart_size}')
+            with CaptureQueriesContext(connection) as queries:
+                result = call_view(SaveOrdersView, payload)
+            self.assertTrue(result['header']['success'], result)
+            counts.append(len(queries))
+        self.assertLessEqual(counts[1], counts[0])
+        self.assertEqual(OrderItem.objects.count(), 13)
+        self.assertEqual(ProductVariant.objects.get(id=variants[0].id).stock, 8)
+
+    def test_insufficient_stock_rolls_back(self):
+        user, address, product, variants = create_checkout_fixture(variant_count=2, stock=3)
+        ProductVariant.objects.filter(id=variants[1].id).update(stock=1)
+        result = call_view(SaveOrdersView, save_order_payload(user, address, product, variants, 2, 'order_short'))
+        self.assertFalse(result['header']['success'])
+        self.assertIn(variants[1].name, result['header']['api_msg'])
+        self.assertEqual(list(ProductVariant.objects.order_by('id').values_list('stock', flat=True)), [3, 1])
+        self.assertFalse(Orders.objects.exists())
+
+
+class SaveOrderRaceTest(TestCase):
+    """
+    Sells stock from another checkout between this checkout's availability check and its stock UPDATE, the window
+    in which a read-modify-write decrement loses an update. The interleaving is forced with an execute_wrapper, so it
+    happens on any backend (SQLite serializes real threads). The other sale shares the checkout's transaction and is
+    rolled back with it; what matters is that the checkout sees it.
+    """
+
+    def competing_sale(self, variant, quantity):
+        """:return: execute_wrapper that runs the other sale just before the UPDATE of variant stock"""
+        table = ProductVariant._meta.db_table
+        quote = connection.ops.quote_name
+        sale = f'UPDATE {quote(table)} SET {quote("stock")} = {quote("stock")} - %s WHERE {quote("id")} = %s'
+        state = {'done': False}
+
+        def wrapper(execute, sql, params, many, context):
+            if not state['done'] and sql.lstrip().upper().startswith('UPDATE') and table in sql:
+                state['done'] = True
+                execute(sale, (quantity, variant.id), False, context)
+            return execute(sql, params, many, context)
+        return wrapper
+
+    def test_sale_between_check_and_update_is_not_oversold(self):
+        user, address, product, variants = create_checkout_fixture(variant_count=1, stock=10)
+        payload = save_order_payload(user, address, product, variants, 3, 'order_late')
+        with connection.execute_wrapper(self.competing_sale(variants[0], 9)):
+            result = call_view(SaveOrdersView, payload)
+        self.assertFalse(result['header']['success'], result)
+        self.assertIn(variants[0].name, result['header']['api_msg'])
+        self.assertFalse(Orders.objects.exists())
+
+    def test_stock_update_is_conditional(self):
+        user, address, product, variants = create_checkout_fixture(variant_count=1, stock=10)
+        with CaptureQueriesContext(connection) as queries:
+            decrement_stock(ProductVariant, {variants[0].id: 3})
+        updates = [query['sql'] for query in queries if query['sql'].upper().startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertRegex(updates[0], r'WHERE .*stock. >= 3')
+        self.assertEqual(ProductVariant.objects.get(id=variants[0].id).stock, 7)
+
+    def test_sale_invalidates_the_catalog_cache(self):
+        user, address, product, variants = create_checkout_fixture(variant_count=1, stock=10)
+        generation = get_catalog_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            result = call_view(SaveOrdersView, save_order_payload(user, address, product, variants, 2, 'order_sold'))
+        self.assertTrue(result['header']['success'], result)
+        self.assertGreater(get_catalog_generation(), generation)
+
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user, self.address, self.product, variants = create_checkout_fixture(variant_count=1, stock=5)
+        self.variant = variants[0]
+
+    def prepare(self, order_id):
+        return PrepareOrder.objects.create(id=order_id, user=self.user, amount=1000)
+
+    def test_holds_reduce_availability_until_they_expire(self):
+        first, second = self.prepare('order_a'), self.prepare('order_b')
+        reserve_stock(first, {self.variant.id: 3})
+        self.assertEqual(get_available_stock([self.variant])[self.variant.id], 2)
+        with self.assertRaises(InsufficientStock):
+            reserve_stock(second, {self.variant.id: 3})
+
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(release_expired_reservations(), 1)
+        reserve_stock(second, {self.variant.id: 3})
+        self.assertEqual(StockReservation.objects.get().prepare_order_id, 'order_b')
+
+    def test_save_order_consumes_the_hold(self):
+        held, other = self.prepare('order_held'), self.prepare('order_other')
+        reserve_stock(held, {self.variant.id: 4})
+
+        # Only one unit is free for orders without a hold
+        payload = {'user_id': self.user.user_id, 'address_id': self.address.id, 'order_id': 'order_other',
+                   'total_price': 1000,
+                   'items': [{'product_id': self.product.id, 'variant_id': self.variant.id, 'quantity': 2}]}
+        self.assertFalse(call_view(SaveOrdersView, payload)['header']['success'])
+
+        payload.update(order_id='order_held', items=[{**payload['items'][0], 'quantity': 4}])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(call_view(SaveOrdersView, payload)['header']['success'])
+        self.assertEqual(ProductVariant.objects.get(id=self.variant.id).stock, 1)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(get_available_stock([ProductVariant.objects.get(id=self.variant.id)])[self.variant.id], 1)
+
+
+class TokenCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_callers_share_one_fetch(self):
+        fetches = []
+
+        def fetch():
+            fetches.append(1)
+            return f'token-{len(fetches)}', 3600
+
+        token_cache = http_client.TokenCache('test', fetch)
+        start = threading.Barrier(8)
+        tokens = []
+
+        def get_token():
+            start.wait()
+            tokens.append(token_cache.get())
+
+        threads = [threading.Thread(target=get_token) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(tokens, ['token-1'] * 8)
+
+        # Another worker (a fresh instance) reads the shared cache instead of fetching
+        self.assertEqual(http_client.TokenCache('test', fetch).get(), 'token-1')
+        self.assertEqual(len(fetches), 1)
+
+        token_cache.invalidate()
+        self.assertEqual(token_cache.get(), 'token-2')
+
+    def test_tokens_are_refreshed_before_they_expire(self):
+        fetches = []
+
+        def fetch():
+            fetches.append(1)
+            return 'short-lived', http_client.TOKEN_EXPIRY_MARGIN
+
+        token_cache = http_client.TokenCache('short', fetch)
+        token_cache.get()
+        token_cache.get()
+        self.assertEqual(len(fetches), 2)
+
+    def test_sessions_are_shared_per_host(self):
+        session = http_client.get_session('https://api.example.com/v1/a')
+        self.assertIs(http_client.get_session('https://api.example.com/v2/b?x=1'), session)
+        self.assertIsNot(http_client.get_session('https://other.example.com/'), session)
+
+
+class StubUpstream:
+    """Local HTTP server that answers with scripted (status, delay seconds) replies, the last one repeating."""
+
+    def __init__(self, replies, body=b'{}'):
+        self.replies = list(replies)
+        self.body = body
+        self.hits = 0
+        self.received = []  # (method, path, headers, body) of every call
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self):
+                stub.received.append((self.command, self.path, self.headers,
+                                      self.rfile.read(int(self.headers.get('Content-Length') or 0))))
+                status, delay = stub.replies[min(stub.hits, len(stub.replies) - 1)]
+                stub.hits += 1
+                time.sleep(delay)
+                body = stub.body
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            do_GET = do_POST = reply
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/v1/resource'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ResilienceTest(SimpleTestCase):
+    def stub(self, replies):
+        upstream = StubUpstream(replies)
+        self.addCleanup(upstream.close)
+        return upstream
+
+    def test_slow_upstream_times_out_and_is_retried(self):
+        upstream = self.stub([(200, 0.5)])
+        dependency = resilience.Dependency('slow', timeout=(1, 0.1), retries=2, backoff=0.01)
+        started = time.monotonic()
+        with self.assertRaises(requests.Timeout):
+            dependency.request('GET', upstream.url)
+        self.assertLess(time.monotonic() - started, 1.2)
+        self.assertEqual(upstream.hits, 3)
+        self.assertEqual(dependency.snapshot()['timeouts'], 3)
+
+    def test_post_is_not_retried_after_it_was_sent(self):
+        upstream = self.stub([(503, 0), (200, 0)])
+        dependency = resilience.Dependency('payments', retries=2, backoff=0.01)
+        self.assertEqual(dependency.request('POST', upstream.url, json={}).status_code, 503)
+        self.assertEqual(upstream.hits, 1)
+
+        dependency.retry_unsafe = True
+        upstream.hits = 0
+        self.assertEqual(dependency.request('POST', upstream.url, json={}).status_code, 200)
+        self.assertEqual(upstream.hits, 2)
+
+    def test_circuit_opens_fails_fast_and_recovers(self):
+        upstream = self.stub([(503, 0)])
+        dependency = resilience.Dependency('flaky', retries=0, failure_threshold=3, reset_timeout=0.2)
+        for _ in range(3):
+            self.assertEqual(dependency.request('GET', upstream.url).status_code, 503)
+        self.assertEqual(dependency.breaker.state, resilience.OPEN)
+
+        with self.assertRaises(resilience.CircuitOpenError):
+            dependency.request('GET', upstream.url)
+        self.assertEqual(upstream.hits, 3)
+
+        # After reset_timeout one probe is let through; a failed probe re-opens the circuit
+        time.sleep(0.25)
+        self.assertEqual(dependency.request('GET', upstream.url).status_code, 503)
+        self.assertEqual(dependency.breaker.state, resilience.OPEN)
+
+        upstream.replies = [(200, 0)]
+        time.sleep(0.25)
+        self.assertEqual(dependency.request('GET', upstream.url).status_code, 200)
+        self.assertEqual(dependency.breaker.state, resilience.CLOSED)
+
+        health = dependency.snapshot()
+        self.assertEqual((health['became_open'], health['became_half_open'], health['became_closed']), (2, 2, 1))
+        self.assertEqual(health['short_circuits'], 1)
+
+    def test_half_open_lets_a_single_probe_through(self):
+        breaker = resilience.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertTrue(breaker.allow())
+
+
+class IdempotencyKeyTest(TestCase):
+    def setUp(self):
+        self.user, self.address, self.product, self.variants = create_checkout_fixture(variant_count=1, stock=5)
+        self.payload = save_order_payload(self.user, self.address, self.product, self.variants, 1, 'order_idem')
+
+    def post(self, payload, key):
+        request = APIRequestFactory().post('/api/', payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        return SaveOrdersView.as_view({'post': 'create'})(request)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.post(self.payload, 'key-1')
+        with self.assertNumQueries(1):  # the stored record
+            retry = self.post(self.payload, 'key-1')
+        self.assertEqual(retry.render().content, first.render().content)
+        self.assertEqual(retry['X-Signature'], first['X-Signature'])
+        self.assertEqual(retry[idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(Orders.objects.count(), 1)
+        self.assertEqual(ProductVariant.objects.get(id=self.variants[0].id).stock, 4)
+
+    def test_key_cannot_be_reused_for_another_request(self):
+        self.post(self.payload, 'key-2')
+        other = save_order_payload(self.user, self.address, self.product, self.variants, 2, 'order_other')
+        result = json.loads(crypto.decrypt_data(settings.ECOM_SECRET, self.post(other, 'key-2').data['enc_data']))
+        self.assertEqual(result['header']['code'], idempotency.ERROR_KEY_REUSED)
+        self.assertEqual(Orders.objects.count(), 1)
+
+    def test_failed_request_releases_the_key(self):
+        ProductVariant.objects.update(stock=0)
+        self.post(self.payload, 'key-3')
+        self.assertFalse(IdempotencyRecord.objects.exists())
+        ProductVariant.objects.update(stock=5)
+        self.post(self.payload, 'key-3')
+        self.assertEqual(Orders.objects.count(), 1)
+        self.assertEqual(IdempotencyRecord.objects.get().status, IdempotencyRecord.STATUS_COMPLETED)
+
+    def test_duplicate_waits_for_the_request_in_flight(self):
+        digest = idempotency.request_hash(self.payload)
+        record, owner = idempotency.claim('save_order', 'key-4', digest)
+        self.assertTrue(owner)
+        original_wait = idempotency.WAIT_TIMEOUT
+        idempotency.WAIT_TIMEOUT = 0.2
+        try:
+            with self.assertRaises(idempotency.IdempotencyError) as raised:
+                idempotency.claim('save_order', 'key-4', digest)
+        finally:
+            idempotency.WAIT_TIMEOUT = original_wait
+        self.assertEqual(raised.exception.code, idempotency.ERROR_IN_PROGRESS)
+
+        # A claim left behind by a dead worker is taken over
+        IdempotencyRecord.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(idempotency.claim('save_order', 'key-4', digest), (record, True))
+
+
+class PaymentWebhookTest(TestCase):
+    secret = 'webhook-secret'
+
+    def setUp(self):
+        original = payment_events.RAZORPAY_WEBHOOK_SECRET
+        payment_events.RAZORPAY_WEBHOOK_SECRET = self.secret
+        self.addCleanup(setattr, payment_events, 'RAZORPAY_WEBHOOK_SECRET', original)
+        self.user, self.address, _, _ = create_checkout_fixture(variant_count=1, stock=1)
+
+    def deliver(self, event_id, event, order_id, signature=None):
+        body = json.dumps({'event': event, 'payload': {
+            'payment': {'entity': {'id': f'pay_{event_id}', 'order_id': order_id}}}}).encode()
+        signature = signature or hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+        return self.client.post('/api/web/razorpay_webhook/', body, content_type='application/json',
+                                HTTP_X_RAZORPAY_SIGNATURE=signature, HTTP_X_RAZORPAY_EVENT_ID=event_id)
+
+    def create_orders(self, count):
+        for index in range(count):
+            prepare_order = PrepareOrder.objects.create(id=f'order_{index}', user=self.user, amount=1000)
+            Orders.objects.create(user=self.user, order_ref=prepare_order, address=self.address, total_price=1000)
+
+    def test_webhook_stores_the_event_with_one_insert(self):
+        with self.assertNumQueries(1):
+            response = self.deliver('evt_1', 'payment.captured', 'order_0')
+        self.assertEqual(response.status_code, 200)
+        # Redelivery is dropped by the unique constraint
+        self.assertEqual(self.deliver('evt_1', 'payment.captured', 'order_0').status_code, 200)
+        self.assertEqual(PaymentWebhookEvent.objects.count(), 1)
+
+        self.assertEqual(self.deliver('evt_2', 'payment.captured', 'order_0', signature='bad').status_code, 400)
+        self.assertEqual(PaymentWebhookEvent.objects.count(), 1)
+
+    def test_reconciler_applies_batches_with_constant_queries(self):
+        self.create_orders(10)
+        counts = []
+        for first, last in ((0, 1), (1, 10)):
+            for index in range(first, last):
+                self.deliver(f'captured_{index}', 'payment.captured', f'order_{index}')
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(payment_events.reconcile_events(), last - first)
+            counts.append(len(queries))
+        self.assertLessEqual(counts[1], counts[0])
+        self.assertEqual(set(PrepareOrder.objects.values_list('payment_status', flat=True)), {'paid'})
+        self.assertEqual(set(Orders.objects.values_list('status', flat=True)), {'processing'})
+        self.assertEqual(PrepareOrder.objects.get(id='order_3').payment_id, 'pay_captured_3')
+
+    def test_late_events_do_not_move_payment_status_back(self):
+        self.create_orders(1)
+        self.deliver('captured', 'payment.captured', 'order_0')
+        self.deliver('failed', 'payment.failed', 'order_0')
+        self.deliver('other', 'payment.authorized', 'order_0')
+        payment_events.reconcile_events()
+        self.assertEqual(PrepareOrder.objects.get().payment_status, 'paid')
+        self.assertEqual(
+            dict(PaymentWebhookEvent.objects.values_list('event_id', 'status')),
+            {'captured': 'processed', 'failed': 'processed', 'other': 'ignored'},
+        )
+
+    def test_events_for_unknown_orders_are_retried_later(self):
+        self.deliver('early', 'payment.captured', 'order_missing')
+        payment_events.reconcile_events()
+        event = PaymentWebhookEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+        self.assertGreater(event.available_at, timezone.now())
+        self.assertEqual(payment_events.reconcile_events(), 0)
+
+    def paypal_event(self, order_id='order_0'):
+        return PaymentWebhookEvent.objects.create(
+            provider='paypal', event_id=f'WH-{order_id}', event_type='PAYMENT.CAPTURE.COMPLETED',
+            payload={'resource': {'id': 'capture_1', 'supplementary_data': {'related_ids': {'order_id': order_id}}}},
+            headers={header: 'value' for header in payment_events.PAYPAL_VERIFICATION_HEADERS},
+        )
+
+    def paypal_reply(self, status_code, verification_status=None):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = json.dumps({'verification_status': verification_status}).encode()
+        return mock.patch('api.utility_files.paypal.post', return_value=response)
+
+    def test_paypal_outage_keeps_the_event_pending(self):
+        self.create_orders(1)
+        event = self.paypal_event()
+        with self.paypal_reply(503):
+            self.assertEqual(payment_events.reconcile_events(), 1)
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+        self.assertIn('503', event.last_error)
+
+        with self.paypal_reply(200, 'FAILURE'):
+            self.assertFalse(payment_events.verify_paypal_event(event))
+        with self.paypal_reply(200, 'SUCCESS'):
+            PaymentWebhookEvent.objects.update(available_at=timezone.now())
+            payment_events.reconcile_events()
+        self.assertEqual(PaymentWebhookEvent.objects.get().status, 'processed')
+        self.assertEqual(PrepareOrder.objects.get().payment_status, 'paid')
+
+    def test_paypal_verification_runs_outside_the_transaction(self):
+        self.create_orders(2)
+        kept, stolen = self.paypal_event('order_0'), self.paypal_event('order_1')
+        savepoints = list(connection.savepoint_ids)
+
+        def verify(event):
+            # No transaction (and so no row lock) of the reconciler is open during the PayPal call
+            self.assertEqual(connection.savepoint_ids, savepoints)
+            if event.pk == stolen.pk:
+                # The lease ran out and another reconciler claimed the event
+                PaymentWebhookEvent.objects.filter(pk=stolen.pk).update(available_at=timezone.now())
+            return True
+
+        with mock.patch.object(payment_events, 'verify_paypal_event', side_effect=verify):
+            self.assertEqual(payment_events.reconcile_events(), 2)
+        self.assertEqual(dict(PaymentWebhookEvent.objects.values_list('pk', 'status')),
+                         {kept.pk: 'processed', stolen.pk: 'pending'})
+
+
+class OrderHistoryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.address, cls.product, cls.variants = create_checkout_fixture(variant_count=3, stock=10)
+        ProductImage.objects.create(product=cls.product, image='products/extra.jpg')
+
+    def create_orders(self, count):
+        for index in range(Orders.objects.count(), Orders.objects.count() + count):
+            prepare_order = PrepareOrder.objects.create(id=f'order_{index}', user=self.user, amount=3000)
+            order = Orders.objects.create(user=self.user, order_ref=prepare_order, address=self.address,
+                                          total_price=3000)
+            OrderItem.objects.bulk_create([OrderItem(order=order, product=self.product, variant=variant, quantity=1,
+                                                     price=1000) for variant in self.variants])
+
+    def test_compact_mode_query_count_is_constant(self):
+        counts = []
+        for order_count in (1, 10):
+            self.create_orders(order_count)
+            with CaptureQueriesContext(connection) as queries:
+                result = call_view(GetUserOrderHistoryView, {'user_id': self.user.user_id, 'mode': 'compact'})
+            counts.append(len(queries))
+        self.assertEqual(counts, [3, 3])
+        order = result['body']['orders'][0]
+        self.assertEqual(set(order), {'id', 'order_id', 'total_price', 'status', 'created_at', 'items'})
+        self.assertEqual(order['items'][0], {
+            'product_id': self.product.id, 'name': 'Toner', 'thumbnail': 'http://testserver/media/products/p.jpg',
+            'variant_name': '00ml', 'price': 1000, 'quantity': 1,
+        })
+
+    def test_compact_mode_pages_by_cursor(self):
+        self.create_orders(5)
+        seen, cursor = [], None
+        while True:
+            payload = {'user_id': self.user.user_id, 'mode': 'compact', 'limit': 2}
+            if cursor:
+                payload['cursor'] = cursor
+            body = call_view(GetUserOrderHistoryView, payload)['body']
+            seen += [order['order_id'] for order in body['orders']]
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, [f'order_{index}' for index in range(4, -1, -1)])
+
+    def test_full_mode_within_budget(self):
+        self.create_orders(4)
+        with query_budget(GetUserOrderHistoryView.query_budget, max_duplicates=0):
+            result = call_view(GetUserOrderHistoryView, {'user_id': self.user.user_id})
+        item = result['body']['orders'][0]['order_items'][0]
+        self.assertEqual(len(item['product_details']['variants']), 3)
+        self.assertEqual(len(item['product_details']['additional_images']), 1)
+
+
+class FastSerializerParityTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='parity@test.com', name='리뷰어', user_id='U_PARITY', password='x')
+        cls.category = Category.objects.create(name='Skincare')
+        brand = Brand.objects.create(brand_name='Parity Brand')
+        full = Product.objects.create(
+            name='수분 크림', category=cls.category, brand=brand, price='12000.50', discount_price='9900.00',
+            main_image='products/cream 1.jpg', description_file='media/products/descriptions/cream.pdf',
+            ingredients='water\nglycerin', how_to_use='Apply', stock=3, sold_count=7,
+        )
+        ProductVariant.objects.create(product=full, name='50ml', price='12000.00', discount_price='9900.50')
+        ProductVariant.objects.create(product=full, name='100ml', price='20000.00')
+        ProductImage.objects.create(product=full, image='products/side ü.jpg')
+        ProductImage.objects.create(product=full, image='')
+        # No brand, discount, images or variants
+        Product.objects.create(name='Bare', category=cls.category, price=500, discount_price=0, main_image='')
+        review = Review.objects.create(product=full, user=cls.user, rating=4, comment='좋아요', helpful_count=2)
+        ReviewImage.objects.create(review=review, image='reviews/r 1.jpg')
+        ReviewImage.objects.create(review=review, image='')
+        Review.objects.create(product=full, user=cls.user, rating=5, comment='again')
+
+    def assertSameJSON(self, expected, actual):
+        self.assertEqual(json.dumps(expected, ensure_ascii=False), json.dumps(actual, ensure_ascii=False))
+
+    def test_products_match_product_serializer(self):
+        products = Product.objects.order_by('id')
+        for request in (APIRequestFactory().post('/api/get_products/'), None):
+            self.assertSameJSON(
+                ProductSerializer(products, many=True, context={'request': request}).data,
+                fast_serializers.serialize_products(fast_serializers.product_rows(products), request),
+            )
+
+    def test_reviews_match_review_serializer(self):
+        reviews = Review.objects.order_by('id')
+        for request in (APIRequestFactory().post('/api/get_product_reviews/'), None):
+            self.assertSameJSON(
+                ReviewSerializer(reviews, many=True, context={'request': request}).data,
+                fast_serializers.serialize_reviews(fast_serializers.review_rows(reviews), request),
+            )
+
+    def test_product_rows_by_ids_keeps_order(self):
+        ids = list(Product.objects.order_by('-id').values_list('id', flat=True))
+        self.assertEqual([row['id'] for row in fast_serializers.product_rows_by_ids(ids + [0])], ids)
+
+    def test_product_list_query_count_is_constant(self):
+        counts = []
+        for extra in (0, 10):
+            for index in range(extra):
+                product = Product.objects.create(name=f'Extra {index}', category=self.category, price=100,
+                                                 main_image='products/p.jpg')
+                ProductVariant.objects.create(product=product, name='50ml', price=100)
+                ProductImage.objects.create(product=product, image='products/extra.jpg')
+            cache.clear()
+            category_tree.current()
+            with CaptureQueriesContext(connection) as queries:
+                result = call_view(GetProductListView, {'category': 'Skincare', 'limit': 50})
+            counts.append(len(queries))
+        # products, variants, images, facets (the category comes from the in-memory tree)
+        self.assertEqual(counts, [4, 4])
+        self.assertEqual(len(result['body']['products']), 12)
+
+    def test_review_pages_by_cursor(self):
+        product_id = Product.objects.get(name='수분 크림').id
+        first = call_view(GetProductReviewsView, {'product_id': product_id, 'limit': 1})['body']
+        second = call_view(GetProductReviewsView, {'product_id': product_id, 'limit': 1,
+                                                   'cursor': first['next_cursor']})['body']
+        self.assertEqual([first['reviews'][0]['comment'], second['reviews'][0]['comment']], ['again', '좋아요'])
+        self.assertIsNone(second['next_cursor'])
+
+
+class ProductRatingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='rating@test.com', name='Rater', user_id='U_RATING', password='x')
+        category = Category.objects.create(name='Skincare')
+        cls.product, cls.other = [
+            Product.objects.create(name=name, category=category, price=1000, main_image='products/p.jpg')
+            for name in ('Rated', 'Other')
+        ]
+
+    def aggregates(self, product):
+        return Product.objects.filter(pk=product.pk).values(*ratings.RATING_FIELDS).get()
+
+    def test_reviews_update_aggregates_incrementally(self):
+        first = Review.objects.create(product=self.product, user=self.user, rating=5, comment='a')
+        with CaptureQueriesContext(connection) as queries:
+            second = Review.objects.create(product=self.product, user=self.user, rating=2, comment='b')
+        # insert, lock product, update product
+        self.assertEqual(len([query for query in queries if 'SAVEPOINT' not in query['sql']]), 3)
+        self.assertEqual(self.aggregates(self.product), {
+            'rating_avg': ratings.Decimal('3.50'), 'rating_count': 2,
+            'rating_1': 0, 'rating_2': 1, 'rating_3': 0, 'rating_4': 0, 'rating_5': 1,
+        })
+
+        second.rating = 4
+        second.save()
+        self.assertEqual(self.aggregates(self.product)['rating_avg'], ratings.Decimal('4.50'))
+
+        first.product = self.other
+        first.save()
+        self.assertEqual(self.aggregates(self.product)['rating_count'], 1)
+        self.assertEqual(self.aggregates(self.other)['rating_5'], 1)
+
+        second.delete()
+        self.assertEqual(self.aggregates(self.product), ratings.rating_fields({}))
+
+    def test_edit_holds_the_review_lock_until_the_aggregates_are_updated(self):
+        review = Review.objects.create(product=self.product, user=self.user, rating=5, comment='f')
+        outside, seen = list(connection.savepoint_ids), {}
+        select_for_update = QuerySet.select_for_update
+
+        def locking_read(queryset, *args, **kwargs):
+            if queryset.model is Review:
+                seen['lock'] = list(connection.savepoint_ids)
+            return select_for_update(queryset, *args, **kwargs)
+
+        def record(execute, sql, params, many, context):
+            if sql.startswith('UPDATE "product"'):
+                seen['aggregates'] = list(connection.savepoint_ids)
+            return execute(sql, params, many, context)
+
+        review.rating = 3
+        with mock.patch.object(QuerySet, 'select_for_update', locking_read), connection.execute_wrapper(record):
+            review.save()
+        # The old rating is read under a lock taken in the transaction Review.save() opens, which is still open when
+        # the aggregates are updated
+        self.assertGreater(len(seen['lock']), len(outside))
+        self.assertEqual(seen['aggregates'][:len(seen['lock'])], seen['lock'])
+        self.assertEqual(self.aggregates(self.product), ratings.rating_fields({3: 1}))
+
+    def test_recompute_repairs_drift(self):
+        for rating in (1, 4, 4):
+            Review.objects.create(product=self.product, user=self.user, rating=rating, comment='c')
+        # queryset.update() sends no signals
+        Review.objects.filter(rating=1).update(rating=5)
+        Review.objects.create(product=self.product, user=self.user, rating=9, comment='out of range')
+        self.assertEqual(ratings.recompute_product_ratings(batch_size=1), 2)
+        self.assertEqual(self.aggregates(self.product), ratings.rating_fields({4: 2, 5: 1}))
+        self.assertEqual(self.aggregates(self.product)['rating_avg'], ratings.Decimal('4.33'))
+        self.assertEqual(self.aggregates(self.other)['rating_count'], 0)
+
+    def test_deleting_product_skips_rating_updates(self):
+        for rating in (3, 4, 5):
+            Review.objects.create(product=self.product, user=self.user, rating=rating, comment='d')
+        with CaptureQueriesContext(connection) as queries:
+            self.product.delete()
+        self.assertFalse([query for query in queries if 'FOR UPDATE' in query['sql'] or 'UPDATE "product"' in query['sql']])
+
+    def test_serializers_expose_aggregates(self):
+        Review.objects.create(product=self.product, user=self.user, rating=4, comment='e')
+        product = ProductSerializer(Product.objects.get(pk=self.product.pk)).data
+        self.assertEqual((product['rating_avg'], product['rating_count']), (4.0, 1))
+        self.assertEqual(product['rating_histogram'], {'1': 0, '2': 0, '3': 0, '4': 1, '5': 0})
+
+
+class ReviewFeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='feed@test.com', name='Feeder', user_id='U_FEED', password='x')
+        category = Category.objects.create(name='Skincare')
+        cls.product = Product.objects.create(name='Reviewed', category=category, price=1000,
+                                             main_image='products/p.jpg')
+        ProductVariant.objects.create(product=cls.product, name='50ml', price=1000)
+
+    def create_reviews(self, count):
+        for index in range(count):
+            review = Review.objects.create(product=self.product, user=self.user, rating=5, comment=f'review {index}',
+                                           helpful_count=index % 3)
+            ReviewImage.objects.create(review=review, image=f'reviews/{index}.jpg')
+
+    def read_feed(self, sort, limit):
+        seen, cursor = [], None
+        while True:
+            payload = {'product_id': self.product.id, 'sort': sort, 'limit': limit}
+            if cursor:
+                payload['cursor'] = cursor
+            with query_budget(GetProductReviewsView.query_budget, max_duplicates=0):
+                body = call_view(GetProductReviewsView, payload)['body']
+            seen += body['reviews']
+            cursor = body['next_cursor']
+            if not cursor:
+                return seen
+
+    def test_helpful_sort_pages_through_ties(self):
+        self.create_reviews(7)
+        reviews = self.read_feed('-helpful_count', 2)
+        self.assertEqual([review['helpful_count'] for review in reviews], [2, 2, 1, 1, 0, 0, 0])
+        # Ties are ordered by id, so no review is skipped or repeated across pages
+        self.assertEqual(len({review['id'] for review in reviews}), 7)
+        self.assertEqual(reviews[0]['images'][0]['image'], 'http://testserver/media/reviews/5.jpg')
+
+    def test_recent_sort(self):
+        self.create_reviews(3)
+        reviews = self.read_feed('created_at', 2)
+        self.assertEqual([review['comment'] for review in reviews], ['review 0', 'review 1', 'review 2'])
+
+    def test_detail_returns_first_page(self):
+        counts = []
+        for extra in (3, 30):
+            self.create_reviews(extra)
+            with query_budget(GetProductDetailView.query_budget, max_duplicates=0):
+                with CaptureQueriesContext(connection) as queries:
+                    body = call_view(GetProductDetailView, {'product_id': str(self.product.id), 'limit': 5})['body']
+            counts.append(len(queries))
+        self.assertLessEqual(counts[1], counts[0])
+        self.assertEqual(len(body['product_reviews']), 5)
+        rest = call_view(GetProductReviewsView, {'product_id': self.product.id, 'limit': 100,
+                                                 'cursor': body['reviews_next_cursor']})['body']['reviews']
+        self.assertEqual(len(rest), 28)
+
+    def test_detail_without_paging_returns_every_review(self):
+        self.create_reviews(25)
+        body = call_view(GetProductDetailView, {'product_id': str(self.product.id)})['body']
+        self.assertEqual(len(body['product_reviews']), 25)
+        self.assertIsNone(body['reviews_next_cursor'])
+
+
+class SuggestionIndexTest(TestCase):
+    """Two SuggestionIndex objects sharing the cache stand in for two worker processes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(brand_name='Rose Garden')
+
+    def setUp(self):
+        cache.clear()
+        self.worker, self.other = SuggestionIndex(), SuggestionIndex()
+        self.worker.suggest('ro')
+        self.other.suggest('ro')
+
+    def brand_names(self, index, prefix='ro'):
+        return [item['name'] for item in index.suggest(prefix)['brands']]
+
+    def test_other_workers_replay_changes_without_reloading(self):
+        self.worker.apply('brands', 101, 'Rosy Lab')
+        self.worker.apply('brands', self.brand.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.brand_names(self.other), ['Rosy Lab'])
+            self.assertEqual(self.brand_names(self.worker), ['Rosy Lab'])
+
+    def test_bump_by_another_worker_in_between_is_not_skipped(self):
+        # A third worker bumps the generation between this worker's last sync and its own bump
+        SuggestionIndex().apply('brands', 102, 'Root Cause')
+        self.worker.apply('brands', 101, 'Rosy Lab')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.brand_names(self.worker), ['Root Cause', 'Rose Garden', 'Rosy Lab'])
+            self.assertEqual(self.brand_names(self.other), ['Root Cause', 'Rose Garden', 'Rosy Lab'])
+
+    def test_missing_change_reloads_from_the_database(self):
+        self.worker.apply('brands', 101, 'Rosy Lab')
+        cache.delete(SUGGEST_CHANGE_KEY.format(get_generation(SUGGEST_GENERATION_KEY)))
+        Brand.objects.create(brand_name='Rouge')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.brand_names(self.other), ['Rose Garden', 'Rouge'])
+        self.assertGreater(len(queries), 0)
+
+
+class SearchIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Skincare')
+        cls.bloom = Brand.objects.create(brand_name='Bloom')
+        seoul = Brand.objects.create(brand_name='설화')
+
+        def create(name, brand, **fields):
+            return Product.objects.create(name=name, category=category, brand=brand, price=100,
+                                          main_image='products/p.jpg', **fields)
+        cls.toner = create('Rose Toner', cls.bloom, description='Hydrating toner')
+        cls.cream = create('Green Tea Cream', cls.bloom, ingredients='Rose extract, green tea')
+        cls.korean = create('수분 크림', seoul, description='촉촉한 수분')
+        cls.accented = create('Crème Rosée', cls.bloom)
+        index_products()
+
+    def test_name_matches_rank_above_other_fields(self):
+        self.assertEqual(search_product_ids('rose', prefix=False), [self.toner.id, self.cream.id])
+        # Every term must match; brand terms count too
+        self.assertEqual(search_product_ids('bloom rose toner'), [self.toner.id])
+
+    def test_last_term_is_a_prefix(self):
+        self.assertEqual(set(search_product_ids('ros')), {self.toner.id, self.cream.id, self.accented.id})
+        # Full matches outrank prefix matches of the same field
+        self.assertEqual(search_product_ids('ros')[0], self.accented.id)
+        self.assertEqual(search_product_ids('ros', prefix=False), [])
+        self.assertEqual(search_product_ids('r'), [])
+
+    def test_korean_and_accented_terms(self):
+        self.assertEqual(search_product_ids('수분'), [self.korean.id])
+        self.assertEqual(search_product_ids('설화 크림'), [self.korean.id])
+        # Partial Korean words match as prefixes ("촉촉" -> "촉촉한"), down to MIN_PREFIX_LENGTH characters
+        self.assertEqual(search_product_ids('촉촉'), [self.korean.id])
+        self.assertEqual(search_product_ids('촉촉', prefix=False), [])
+        self.assertEqual(search_product_ids('CREME'), [self.accented.id])
+
+    def test_saves_reindex_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.toner.name = 'Peony Toner'
+            self.toner.save()
+        self.assertEqual(search_product_ids('peony'), [self.toner.id])
+        self.assertNotIn(self.toner.id, search_product_ids('rose'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bloom.brand_name = 'Blossom'
+            self.bloom.save()
+        self.assertEqual(set(search_product_ids('blossom')), {self.toner.id, self.cream.id, self.accented.id})
+        self.assertEqual(search_product_ids('bloom', prefix=False), [])
+
+
+class CategoryTreeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.skin = Category.objects.create(name='Skincare')
+        cls.face = Category.objects.create(name='Face', parent=cls.skin)
+        cls.toner = Category.objects.create(name='Toner', parent=cls.face)
+        cls.body = Category.objects.create(name='Body', parent=cls.skin)
+        cls.brand = Brand.objects.create(brand_name='Tree Brand')
+        for category in (cls.skin, cls.face, cls.toner, cls.body):
+            Product.objects.create(name=f'{category.name} product', category=category, brand=cls.brand, price=100,
+                                   main_image='products/p.jpg')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lookups(self):
+        tree = CategoryTree(Category.objects.values_list('id', 'name', 'slug', 'parent_id'))
+        self.assertEqual(tree.descendant_ids(self.skin.id), {self.skin.id, self.face.id, self.toner.id, self.body.id})
+        self.assertEqual(tree.descendant_ids(self.face.id), {self.face.id, self.toner.id})
+        self.assertEqual(tree.by_name('toner').path, (self.skin.id, self.face.id))
+        self.assertEqual(tree.by_slug('skincare').id, self.skin.id)
+        self.assertEqual([node.name for node in tree.ancestors(tree.get(self.toner.id))], ['Skincare', 'Face'])
+        self.assertIsNone(tree.child_by_name(tree.get(self.skin.id), 'Toner'))
+
+    def test_parent_cycle_is_left_out(self):
+        tree = CategoryTree([(1, 'A', 'a', 2), (2, 'B', 'b', 1), (3, 'C', 'c', None)])
+        self.assertEqual(list(tree.nodes), [3])
+
+    def test_listing_filters_by_descendants_without_category_queries(self):
+        category_tree.current()
+        with CaptureQueriesContext(connection) as queries:
+            body = call_view(GetProductListView, {'category': 'Skincare', 'subcategory': 'Face', 'limit': 10})['body']
+        self.assertFalse([query for query in queries if '"category"' in query['sql']])
+        self.assertEqual({product['name'] for product in body['products']}, {'Face product', 'Toner product'})
+
+        body = call_view(GetBrandProductsView, {'brand': 'Tree Brand', 'subcategory': 'Skincare', 'limit': 10})['body']
+        self.assertEqual(len(body['products']), 4)
+        result = call_view(GetProductListView, {'category': 'Face', 'limit': 10})
+        self.assertEqual(result['header']['code'], 1001)
+
+    def test_category_changes_reload_tree(self):
+        tree = category_tree.current()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Lips', parent=self.skin)
+        self.assertIsNot(category_tree.current(), tree)
+        self.assertIn(category_tree.current().by_name('Lips').id, category_tree.current().descendant_ids(self.skin.id))
+
+
+class ProductFilterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        skin = Category.objects.create(name='Skincare')
+        cls.face = Category.objects.create(name='Face', parent=skin)
+        cls.body = Category.objects.create(name='Body', parent=skin)
+        cls.acme, cls.zen = Brand.objects.create(brand_name='Acme'), Brand.objects.create(brand_name='Zen')
+        rows = (
+            ('Cheap face', cls.face, cls.acme, 300, 4.5, 5),
+            ('Mid face', cls.face, cls.zen, 800, 3.0, 0),
+            ('Mid body', cls.body, cls.acme, 1500, 4.0, 0),
+            ('Lux body', cls.body, cls.zen, 6000, 5.0, 2),
+        )
+        for name, category, brand, price, rating, stock in rows:
+            product = Product.objects.create(name=name, category=category, brand=brand, price=price, stock=stock,
+                                             main_image='products/p.jpg')
+            Product.objects.filter(pk=product.pk).update(rating_avg=rating)
+        # Stock only on a variant
+        ProductVariant.objects.create(product=Product.objects.get(name='Mid body'), name='50ml', price=1500, stock=3)
+        Product.objects.create(name='Hidden', category=cls.face, brand=cls.acme, price=300, is_active=False,
+                               main_image='products/p.jpg')
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, view, payload):
+        body = call_view(view, {'limit': 50, 'sort': 'price', **payload})['body']
+        return [product['name'] for product in body['products']], body.get('facets')
+
+    def test_filters(self):
+        names, _ = self.names(GetProductListView, {'category': 'Skincare'})
+        self.assertEqual(names, ['Cheap face', 'Mid face', 'Mid body', 'Lux body'])
+        cases = (
+            ({'min_price': 500, 'max_price': 2000}, ['Mid face', 'Mid body']),
+            ({'brand_ids': [self.zen.id]}, ['Mid face', 'Lux body']),
+            ({'min_rating': 4.2}, ['Cheap face', 'Lux body']),
+            ({'in_stock': True}, ['Cheap face', 'Mid body', 'Lux body']),
+            ({'subcategory': 'Body', 'max_price': 2000}, ['Mid body']),
+        )
+        for filters, expected in cases:
+            self.assertEqual(self.names(GetProductListView, {'category': 'Skincare', **filters})[0], expected, filters)
+
+    def test_facets_come_from_one_grouped_query(self):
+        category_tree.current()
+        with CaptureQueriesContext(connection) as queries:
+            _, facets = self.names(GetProductListView, {'category': 'Skincare', 'brand_ids': [self.acme.id],
+                                                        'max_price': 1000})
+        self.assertEqual(len([query for query in queries if 'GROUP BY' in query['sql']]), 1)
+        # Each facet ignores its own filter: brands under the price filter, prices under the brand filter
+        self.assertEqual(facets['brands'], [{'id': self.acme.id, 'name': 'Acme', 'count': 1},
+                                            {'id': self.zen.id, 'name': 'Zen', 'count': 1}])
+        self.assertEqual(facets['subcategories'], [{'id': self.body.id, 'name': 'Body', 'count': 0},
+                                                   {'id': self.face.id, 'name': 'Face', 'count': 1}])
+        self.assertEqual([bucket['count'] for bucket in facets['price_buckets']], [1, 0, 1, 0, 0])
+        self.assertEqual(facets['price_buckets'][-1], {'min': 5000, 'max': None, 'count': 0})
+
+    def test_brand_products_filters_and_facets(self):
+        names, facets = self.names(GetBrandProductsView, {'brand': 'Zen', 'subcategory': 'all', 'min_price': 500})
+        self.assertEqual(names, ['Mid face', 'Lux body'])
+        self.assertEqual([bucket['count'] for bucket in facets['price_buckets']], [0, 1, 0, 0, 1])
+        self.assertEqual([entry['name'] for entry in facets['subcategories']], ['Skincare'])
+
+    def test_invalid_filters(self):
+        for filters in ({'min_price': 'cheap'}, {'min_rating': 7}, {'min_price': 10, 'max_price': 5},
+                        {'brand_ids': ['x']}):
+            result = call_view(GetProductListView, {'category': 'Skincare', 'limit': 5, **filters})
+            self.assertEqual(result['header']['code'], 1006, filters)
+
+    def test_invalid_paging_values(self):
+        # Clients send JSON, so sort and cursor can arrive as any type
+        for paging in ({'sort': 1}, {'sort': ['price']}, {'limit': 5, 'sort': 1}, {'limit': 5, 'cursor': 1},
+                       {'limit': 5, 'cursor': {'id': 1}}, {'limit': 5, 'cursor': 'not a cursor'}):
+            result = call_view(GetProductListView, {'category': 'Skincare', **paging})
+            self.assertEqual(result['header']['code'], 1005, paging)
+
+
+class ReadOnlyView:
+    read_only = True
+
+
+class WritingView:
+    read_only = False
+
+
+def run_through_routing(view_class, user_id, handler):
+    """Runs handler(request) as the view would run behind ReplicaRoutingMiddleware."""
+    request = RequestFactory().post('/api/view/')
+    request.data = {'user_id': user_id}
+
+    def view(request):
+        return handler(request)
+    view.cls = view_class
+
+    def get_response(request):
+        middleware.process_view(request, view, (), {})
+        return view(request)
+    middleware = ReplicaRoutingMiddleware(get_response)
+    return middleware(request)
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(db_routing, 'replica_configured', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = db_routing.ReplicaRouter()
+
+    def test_routing_inside_a_request(self):
+        self.assertEqual(self.router.db_for_read(Product), DEFAULT_DB_ALIAS)  # outside any request
+
+        def handler(request):
+            reads = [self.router.db_for_read(Product)]
+            self.assertEqual(self.router.db_for_write(Product), DEFAULT_DB_ALIAS)
+            reads.append(self.router.db_for_read(Product))
+            return reads
+        self.assertEqual(run_through_routing(ReadOnlyView, 'U1', handler), [db_routing.REPLICA_ALIAS, DEFAULT_DB_ALIAS])
+        self.assertEqual(run_through_routing(WritingView, 'U2', lambda request: self.router.db_for_read(Product)),
+                         DEFAULT_DB_ALIAS)
+
+    def test_user_sticks_to_primary_after_a_write(self):
+        read = lambda request: self.router.db_for_read(Product)
+        run_through_routing(WritingView, 'U1', lambda request: self.router.db_for_write(Product))
+        self.assertEqual(run_through_routing(ReadOnlyView, 'U1', read), DEFAULT_DB_ALIAS)
+        self.assertEqual(run_through_routing(ReadOnlyView, 'U2', read), db_routing.REPLICA_ALIAS)
+
+        cache.delete(db_routing.STICKY_KEY.format('U1'))  # the window has passed
+        self.assertEqual(run_through_routing(ReadOnlyView, 'U1', read), db_routing.REPLICA_ALIAS)
+
+    def test_catalog_cache_is_filled_from_the_primary(self):
+        def handler(request):
+            reads = [self.router.db_for_read(Product)]
+            if get_cached_listing('products', 'routing') is None:
+                set_cached_listing({'products': []}, 'products', 'routing')
+            reads.append(self.router.db_for_read(Product))
+            return reads
+        # The miss builds an entry that outlives replica lag: primary
+        self.assertEqual(run_through_routing(ReadOnlyView, 'U1', handler), [db_routing.REPLICA_ALIAS, DEFAULT_DB_ALIAS])
+        # A hit leaves the request on the replica
+        self.assertEqual(run_through_routing(ReadOnlyView, 'U1', handler),
+                         [db_routing.REPLICA_ALIAS, db_routing.REPLICA_ALIAS])
+
+    def test_no_replica_configured(self):
+        with mock.patch.object(db_routing, 'replica_configured', return_value=False):
+            self.assertEqual(run_through_routing(ReadOnlyView, 'U1', lambda request: self.router.db_for_read(Product)),
+                             DEFAULT_DB_ALIAS)
+
+
+class ReplicaDatabaseTest(TransactionTestCase):
+    # The test settings add a replica alias mirroring the default database (ecombackend/settings.py)
+    databases = {DEFAULT_DB_ALIAS, db_routing.REPLICA_ALIAS}
+
+    def setUp(self):
+        cache.clear()
+
+    def test_read_only_views_query_the_replica(self):
+        def handler(request):
+            with collect_queries() as stats:
+                list(Category.objects.all())
+                with transaction.atomic():
+                    list(Category.objects.all())
+            return stats
+        stats = run_through_routing(ReadOnlyView, 'U1', handler)
+        self.assertEqual(stats.by_alias[db_routing.REPLICA_ALIAS], 1)
+        self.assertGreaterEqual(stats.by_alias[DEFAULT_DB_ALIAS], 1)  # the read inside the transaction
+
+        endpoint_metrics.reset()
+        endpoint_metrics.add('view', stats, 0.0)
+        self.assertEqual(set(endpoint_metrics.alias_snapshot()), {DEFAULT_DB_ALIAS, db_routing.REPLICA_ALIAS})
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def make_pool(self, **options):
+        self.opened = []
+        self.now = 0.0
+
+        def factory():
+            self.opened.append(FakeConnection(len(self.opened)))
+            return self.opened[-1]
+
+        def reset(raw):
+            raw.rollbacks += 1
+            if not raw.alive:
+                raise ConnectionError("gone")
+        return ConnectionPool(factory, name='test', check=lambda raw: raw.alive, reset=reset,
+                              close=lambda raw: setattr(raw, 'closed', True), clock=lambda: self.now, **options)
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool(max_size=2)
+        first = pool.acquire()
+        self.assertEqual(pool.snapshot()['in_use'], 1)
+        pool.release(first)
+        second = pool.acquire()
+        pool.release(second)
+        self.assertIs(second.raw, first.raw)
+        self.assertEqual(first.raw.rollbacks, 2)
+        stats = pool.snapshot()
+        self.assertEqual((stats['created'], stats['reused'], stats['in_use'], stats['idle']), (1, 1, 0, 1))
+
+    def test_min_size_is_opened_on_first_checkout(self):
+        pool = self.make_pool(min_size=3, max_size=5)
+        pool.release(pool.acquire())
+        self.assertEqual(len(self.opened), 3)
+        self.assertEqual(pool.snapshot()['idle'], 3)
+
+    def test_dead_and_old_connections_are_replaced(self):
+        pool = self.make_pool(max_size=2, max_lifetime=60)
+        first = pool.acquire()
+        pool.release(first)
+        first.raw.alive = False
+        second = pool.acquire()
+        self.assertIsNot(second.raw, first.raw)
+        self.assertTrue(first.raw.closed)
+        pool.release(second)
+
+        self.now = 61.0
+        third = pool.acquire()
+        self.assertIsNot(third.raw, second.raw)
+        self.assertTrue(second.raw.closed)
+        stats = pool.snapshot()
+        self.assertEqual((stats['failed_checks'], stats['recycled'], stats['created']), (1, 1, 3))
+
+        # A connection that fails its reset is closed instead of going back to the pool
+        third.raw.alive = False
+        pool.release(third)
+        self.assertTrue(third.raw.closed)
+        self.assertEqual(pool.snapshot()['idle'], 0)
+
+    def test_checkout_waits_for_a_free_connection(self):
+        pool = ConnectionPool(lambda: FakeConnection(0), max_size=1, timeout=0.05)
+        held = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+        pool.timeout = 5
+        releaser = threading.Timer(0.05, pool.release, args=(held,))
+        releaser.start()
+        self.assertIs(pool.acquire().raw, held.raw)
+        releaser.join()
+        stats = pool.snapshot()
+        self.assertEqual((stats['timeouts'], stats['created'], stats['checkouts']), (1, 1, 2))
+        self.assertGreater(stats['wait_max_ms'], 0)
+
+
+async def call_async_view(view_class, data, **extra):
+    """call_view() for an AsyncAPIView."""
+    request = AsyncRequestFactory().post('/api/', data, content_type='application/json', **extra)
+    response = await view_class.as_view()(request)
+    return response, json.loads(crypto.decrypt_data(settings.ECOM_SECRET, response.data['enc_data']))
+
+
+class CountingCaptureView(AsyncAPIView):
+    basename = 'counting_capture'
+    calls = 0
+
+    @idempotency.async_idempotent
+    async def handle(self, request, *args, **kwargs):
+        CountingCaptureView.calls += 1
+        return api_success(body={"call": CountingCaptureView.calls}).secure().rest()
+
+
+class AsyncViewTest(TestCase):
+    def test_middleware_chain_stays_async(self):
+        # With DEBUG on, Django logs every middleware it has to wrap in a sync/async adapter
+        with self.settings(DEBUG=True), self.assertNoLogs('django.request', 'DEBUG'):
+            BaseHandler().load_middleware(is_async=True)
+
+    async def test_stream_id_comes_from_the_upstream(self):
+        upstream = StubUpstream([(200, 0)], body=b'{"roomId": "room-1", "links": {"get_room": "https://room"}}')
+        self.addCleanup(upstream.close)
+        with mock.patch.object(community_controller, 'VIDEOSDK_ROOMS_URL', upstream.url):
+            response, result = await call_async_view(AsyncCreateStreamIdView, {'token': 'token'})
+            self.assertEqual(result['body'], {"roomId": "room-1", "get_room": "https://room"})
+
+            upstream.replies = [(500, 0)]
+            with mock.patch.object(community_controller.traceback, 'print_exc'):
+                response, result = await call_async_view(AsyncCreateStreamIdView, {'token': 'token'})
+            self.assertEqual(result['header']['code'], 1002)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        await async_http.close_session()
+
+    async def test_async_dependency_retries_and_times_out(self):
+        upstream = StubUpstream([(503, 0), (200, 0)])
+        self.addCleanup(upstream.close)
+        dependency = resilience.Dependency('async', retries=2, backoff=0.01)
+        self.assertEqual((await dependency.arequest('GET', upstream.url)).status_code, 200)
+        self.assertEqual(upstream.hits, 2)
+
+        upstream.replies = [(200, 0.5)]
+        with self.assertRaises(requests.Timeout):
+            await dependency.arequest('GET', upstream.url, timeout=(1, 0.1))
+        self.assertEqual(dependency.snapshot()['timeouts'], 3)
+        await async_http.close_session()
+
+    async def test_send_otp(self):
+        response, result = await call_async_view(AsyncSendOtpView, {'email': 'user@example.com'})
+        self.assertEqual(result['body'], {"otp_sent": True})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+        self.assertIn((await EmailOTP.objects.aget(email='user@example.com')).otp, mail.outbox[0].body)
+
+    async def test_idempotent_retry_is_replayed(self):
+        CountingCaptureView.calls = 0
+        first, result = await call_async_view(CountingCaptureView, {'orderID': 'A'}, headers={'Idempotency-Key': 'k'})
+        retry, replayed = await call_async_view(CountingCaptureView, {'orderID': 'A'}, headers={'Idempotency-Key': 'k'})
+        self.assertEqual(CountingCaptureView.calls, 1)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry[idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(replayed['body'], {"call": 1})
+
+
+def razorpay_at(test, upstream):
+    """Points the Razorpay SDK client and create_razorpay_order at a StubUpstream for the rest of the test."""
+    root = upstream.url.split('/v1/')[0]
+    patches = (mock.patch.object(payment_gateway.client, 'base_url', root),
+               mock.patch.object(payment_gateway, 'RAZORPAY_ORDERS_URL', f"{root}{URL.V1}{URL.ORDER_URL}"))
+    for patch in patches:
+        patch.start()
+        test.addCleanup(patch.stop)
+
+
+class AsyncPaymentViewTest(TestCase):
+    """The async payment views against a local stand-in for Razorpay and PayPal."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _, cls.product, cls.variants = create_checkout_fixture(1, stock=5)
+        # What the create call saved for the order being captured
+        PaypalOrder.objects.create(order_id='PAY-1', purchase_units=[], status='CREATED', raw_response={})
+        PrepareOrder.objects.create(id='PAY-1', user=cls.user, amount='12.50', currency='INR')
+
+    def setUp(self):
+        # Error replies below count as provider failures; keep them from opening the shared circuits
+        for name in ('razorpay', 'paypal'):
+            resilience.get_dependency(name).breaker.record_success()
+            self.addCleanup(resilience.get_dependency(name).breaker.record_success)
+
+    def stub(self, replies, body):
+        upstream = StubUpstream(replies, body=json.dumps(body).encode('utf-8'))
+        self.addCleanup(upstream.close)
+        return upstream
+
+    def paypal_at(self, upstream):
+        patches = (mock.patch.object(paypal, 'PAYPAL_API_BASE', upstream.url.split('/v1/')[0]),
+                   mock.patch.object(paypal.access_token, 'aget', mock.AsyncMock(return_value='token')))
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def test_razorpay_order_matches_the_sdk_call(self):
+        upstream = self.stub([(200, 0)], {"id": "order_1", "status": "created"})
+        razorpay_at(self, upstream)
+        order_data = {"amount": 1000, "currency": "INR", "receipt": "receipt_U1", "notes": {"user_id": "U1"}}
+        sdk_order = await sync_to_async(payment_gateway.client.order.create)(data=order_data)
+        self.assertEqual(await payment_gateway.create_razorpay_order(order_data), sdk_order)
+
+        (sdk_method, sdk_path, sdk_headers, sdk_body), (method, path, headers, body) = upstream.received
+        self.assertEqual((method, path), (sdk_method, sdk_path))
+        for header in ('Authorization', 'User-Agent', 'Content-Type'):
+            self.assertEqual(headers[header], sdk_headers[header], header)
+        self.assertEqual(json.loads(body), json.loads(sdk_body))
+
+        for status_code, code in ((400, 'BAD_REQUEST_ERROR'), (502, 'GATEWAY_ERROR'), (500, 'SERVER_ERROR')):
+            upstream.replies = [(status_code, 0)]
+            upstream.body = json.dumps({"error": {"code": code, "description": f"{code} reply"}}).encode('utf-8')
+            with self.assertRaises(Exception) as sdk_error:
+                await sync_to_async(payment_gateway.client.order.create)(data=order_data)
+            with self.assertRaises(Exception) as error:
+                await payment_gateway.create_razorpay_order(order_data)
+            self.assertIs(type(error.exception), type(sdk_error.exception), code)
+            self.assertEqual(str(error.exception), str(sdk_error.exception), code)
+        await async_http.close_session()
+
+    async def test_create_order_holds_the_stock(self):
+        razorpay_at(self, self.stub([(200, 0)], {"id": "order_async", "amount": 100000, "currency": "INR"}))
+        items = [{'product_id': self.product.id, 'variant_id': self.variants[0].id, 'quantity': 2}]
+        _, result = await call_async_view(AsyncCreateOrderView, {'user_id': self.user.user_id, 'amount': 1000,
+                                                                 'items': items})
+        self.assertEqual(result['body']['order']['id'], 'order_async')
+        self.assertEqual(result['body']['reservation_ttl'], RESERVATION_TTL)
+        reservation = await StockReservation.objects.aget(prepare_order_id='order_async')
+        self.assertEqual(reservation.quantity, 2)
+        await async_http.close_session()
+
+    async def test_create_order_reports_razorpay_errors(self):
+        razorpay_at(self, self.stub([(400, 0)], {"error": {"code": "BAD_REQUEST_ERROR",
+                                                          "description": "The amount must be at least INR 1.00"}}))
+        _, result = await call_async_view(AsyncCreateOrderView, {'user_id': self.user.user_id, 'amount': 0})
+        self.assertEqual(result['header']['code'], 1005)
+        self.assertEqual(result['header']['api_msg'], "Razorpay Error: The amount must be at least INR 1.00")
+        self.assertFalse(await PrepareOrder.objects.exclude(id='PAY-1').aexists())
+        await async_http.close_session()
+
+    async def test_paypal_create_order(self):
+        upstream = self.stub([(201, 0)], {"id": "PAY-2", "status": "CREATED"})
+        self.paypal_at(upstream)
+        payload = {'user': self.user.user_id, 'amount': '12.50', 'purchase_units': [{"amount": {"value": "12.50"}}]}
+        _, result = await call_async_view(AsyncPaypalCreateOrderView, payload)
+        self.assertEqual(result['body'], {"id": "PAY-2", "status": "CREATED"})
+        self.assertEqual(upstream.received[0][1], '/v2/checkout/orders')
+        self.assertEqual(upstream.received[0][2]['Authorization'], 'Bearer token')
+        self.assertEqual((await PaypalOrder.objects.aget(order_id='PAY-2')).status, 'CREATED')
+        self.assertEqual((await PrepareOrder.objects.aget(id='PAY-2')).user_id, self.user.pk)
+
+        upstream.replies = [(400, 0)]
+        _, result = await call_async_view(AsyncPaypalCreateOrderView, payload)
+        self.assertEqual(result['header']['code'], 1003)
+        await async_http.close_session()
+
+    async def test_paypal_capture_order(self):
+        capture = {"id": "PAY-1", "status": "COMPLETED", "purchase_units": [{"payments": {"captures": [
+            {"amount": {"value": "12.50", "currency_code": "USD"}}]}}]}
+        upstream = self.stub([(201, 0)], capture)
+        self.paypal_at(upstream)
+        _, result = await call_async_view(AsyncPaypalCaptureOrderView, {'orderID': 'PAY-1'})
+        self.assertEqual(result['body'], capture)
+        self.assertEqual(upstream.received[0][1], '/v2/checkout/orders/PAY-1/capture')
+        self.assertEqual((await PaypalOrder.objects.aget(order_id='PAY-1')).status, 'COMPLETED')
+        prepare_order = await PrepareOrder.objects.aget(id='PAY-1')
+        self.assertEqual((str(prepare_order.amount), prepare_order.currency), ('12.50', 'USD'))
+
+        upstream.replies = [(422, 0)]
+        _, result = await call_async_view(AsyncPaypalCaptureOrderView, {'orderID': 'PAY-1'})
+        self.assertEqual(result['header']['code'], 1007)
+        _, result = await call_async_view(AsyncPaypalCaptureOrderView, {'orderID': 'PAY-404'})
+        self.assertEqual(result['header']['code'], 1005)
+        await async_http.close_session()
+
+
+class CreateOrderStockTest(TestCase):
+    """CreateOrderView holds the stock before it asks Razorpay for an order."""
+
+    def setUp(self):
+        cache.clear()
+        self.user, _, self.product, (self.variant,) = create_checkout_fixture(1, stock=5)
+        self.upstream = StubUpstream([(200, 0)], body=b'{"id": "order_rzp", "amount": 100000, "currency": "INR"}')
+        self.addCleanup(self.upstream.close)
+        razorpay_at(self, self.upstream)
+        resilience.get_dependency('razorpay').breaker.record_success()
+        self.addCleanup(resilience.get_dependency('razorpay').breaker.record_success)
+
+    def create_order(self, variant_id, quantity):
+        items = [{'product_id': self.product.id, 'variant_id': variant_id, 'quantity': quantity}]
+        return call_view(CreateOrderView, {'user_id': self.user.user_id, 'amount': 1000, 'items': items})
+
+    def test_holds_move_to_the_razorpay_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.create_order(self.variant.id, 2)
+        self.assertEqual(result['body']['order']['id'], 'order_rzp')
+        self.assertEqual(list(StockReservation.objects.values_list('prepare_order_id', 'quantity')), [('order_rzp', 2)])
+        self.assertEqual(list(PrepareOrder.objects.values_list('id', flat=True)), ['order_rzp'])
+        self.assertEqual(get_available_stock([self.variant])[self.variant.id], 3)
+
+    def test_short_stock_creates_no_razorpay_order(self):
+        other = PrepareOrder.objects.create(id='order_other', user=self.user, amount=1000)
+        reserve_stock(other, {self.variant.id: 4})
+        # A stale pre-check lets the request through to the authoritative hold
+        with mock.patch.object(CreateOrderView, 'stock_error', return_value=None):
+            result = self.create_order(self.variant.id, 2)
+        self.assertEqual((result['header']['code'], result['header']['api_msg']),
+                         (1007, f"Insufficient stock for {self.variant.name}"))
+        self.assertEqual(self.upstream.hits, 0)
+        self.assertEqual(list(PrepareOrder.objects.values_list('id', flat=True)), ['order_other'])
+
+    def test_razorpay_error_releases_the_hold(self):
+        self.upstream.replies = [(400, 0)]
+        self.upstream.body = b'{"error": {"code": "BAD_REQUEST_ERROR", "description": "Invalid amount"}}'
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.create_order(self.variant.id, 2)
+        self.assertEqual(result['header']['code'], 1005)
+        self.assertFalse(PrepareOrder.objects.exists())
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(get_available_stock([self.variant])[self.variant.id], 5)
+
+    def test_sweeper_deletes_left_behind_hold_orders(self):
+        order_data = {"receipt": "receipt_U_BUYER", "notes": {}}
+        # The worker died after holding the stock: nothing released these
+        stale = CreateOrderView.hold_stock(self.user, 1000, 'INR', order_data, {self.variant.id: 2})
+        fresh = CreateOrderView.hold_stock(self.user, 1000, 'INR', order_data, {self.variant.id: 1})
+        paid = PrepareOrder.objects.create(id='order_paid', user=self.user, amount=1000)
+        long_ago = timezone.now() - timedelta(seconds=RESERVATION_TTL + 1)
+        PrepareOrder.objects.filter(pk__in=[stale.pk, paid.pk]).update(created_at=long_ago)
+        StockReservation.objects.filter(prepare_order=stale).update(expires_at=long_ago)
+
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertEqual(set(PrepareOrder.objects.values_list('id', flat=True)), {fresh.pk, 'order_paid'})
+        self.assertEqual(list(StockReservation.objects.values_list('prepare_order_id', flat=True)), [fresh.pk])
+
+    async def test_cancelled_async_create_releases_the_hold(self):
+        items = [{'product_id': self.product.id, 'variant_id': self.variant.id, 'quantity': 2}]
+        with mock.patch.object(payment_gateway, 'create_razorpay_order', side_effect=asyncio.CancelledError):
+            with self.assertRaises(asyncio.CancelledError):
+                await call_async_view(AsyncCreateOrderView, {'user_id': self.user.user_id, 'amount': 1000,
+                                                             'items': items})
+        self.assertFalse(await PrepareOrder.objects.aexists())
+        self.assertFalse(await StockReservation.objects.aexists())
+
+    def test_unknown_variants_are_named_by_id(self):
+        result = self.create_order(999999, 1)
+        self.assertEqual(result['header']['api_msg'], "Insufficient stock for variant 999999")
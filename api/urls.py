@@ -1,4 +1,5 @@
 
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import SimpleRouter
 from api import views_files
@@ -24,6 +25,8 @@ router.register("sent_otp", views_files.SendOtpView, basename="sent_otp")
 router.register("verify_otp", views_files.VerifyOtpView, basename="verify_otp")
 router.register("google_login", views_files.GoogleLoginView, basename="google_login")
 router.register("search_products", views_files.SearchProductsView, basename="search_products")
+router.register("get_product_reviews", views_files.GetProductReviewsView, basename="get_product_reviews")
+router.register("suggest", views_files.SuggestView, basename="suggest")
 router.register("get_order_history", views_files.GetUserOrderHistoryView, basename="get_order_history")
 router.register("register_coupon", views_files.RegisterCouponView, basename='register_coupon')
 router.register("get_user_coupons", views_files.GetUserCouponView, basename='get_user_coupons')
@@ -31,8 +34,21 @@ router.register("get_cancel_refund_list", views_files.GetCancelRefundListView, b
 router.register("cancel_return_order", views_files.CancelRefundCreateView, basename='cancel_return_order')
 router.register('create_paypal_order', views_files.PaypalCreateOrderView, basename='create_paypal_order')
 router.register('paypal_capture_order', views_files.PaypalCaptureOrderView, basename='paypal_capture_order')
+router.register('web/query_metrics', views_files.QueryMetricsView, basename='query_metrics')
+router.register('web/dependency_health', views_files.DependencyHealthView, basename='dependency_health')
+router.register('web/razorpay_webhook', views_files.RazorpayWebhookView, basename='razorpay_webhook')
+router.register('web/paypal_webhook', views_files.PaypalWebhookView, basename='paypal_webhook')
 
-urlpatterns = [
+# Async variants take the same URLs (resolved before the router's) when serving ASGI
+async_urlpatterns = [
+    path('prepare_order/', views_files.AsyncCreateOrderView.as_view(), name='prepare_order-list'),
+    path('sent_otp/', views_files.AsyncSendOtpView.as_view(), name='sent_otp-list'),
+    path('create_paypal_order/', views_files.AsyncPaypalCreateOrderView.as_view(), name='create_paypal_order-list'),
+    path('paypal_capture_order/', views_files.AsyncPaypalCaptureOrderView.as_view(),
+         name='paypal_capture_order-list'),
+]
+
+urlpatterns = (async_urlpatterns if settings.ASYNC_VIEWS else []) + [
     # auth api
     path('', include(router.urls)),
     path('community/', include('communityapi.urls')),
@@ -3,11 +3,14 @@ Author:Saurav
 Date: 2025-10-03
 Description: Module that abstracts API requests and responses
 """
-import requests
 from rest_framework import status
 from rest_framework.response import Response
 from api.utility_files import crypto
-from django.http import JsonResponse
+from api.utility_files import http_client
+from api.utility_files import compression
+from api.utility_files import json_stream
+from api.utility_files.query_metrics import measure_serialization
+from django.http import JsonResponse, StreamingHttpResponse
 from django.conf import settings
 from typing import Optional
 
@@ -130,7 +133,7 @@ class APIRequest:
             url = self.test_url
             logger.info(f"API is running in test mode: {url}{self.endpoint}")
         request_data = self.get_request_data()
-        result = requests.post(f"{url}{self.endpoint}", headers=self.headers, json=request_data)
+        result = http_client.post(f"{url}{self.endpoint}", headers=self.headers, json=request_data)
         result_data = self.get_result_data(result)
         response = self.handle_result(result_data)
 
@@ -188,7 +191,10 @@ class APIResponse:
         )
 
     def rest(self, http_status=status.HTTP_200_OK):
-        return Response(self.get_response_data(), headers=self.http_headers, status=http_status)
+        response = Response(self.get_response_data(), headers=self.http_headers, status=http_status)
+        # Readable after encryption, e.g. by api.utility_files.idempotency
+        response.api_status = self.api_status
+        return response
 
     def http(self, http_status=status.HTTP_200_OK):
         response = JsonResponse(self.get_response_data(), status=http_status)
@@ -258,13 +264,56 @@ class SecureAPIResponse(APIResponse):
 
     # @Override
     def get_response_data(self):
+        with measure_serialization():
+            return self._encrypt_response_data()
+
+    def _encrypt_response_data(self):
         response_data = self.format_response_data()
-        plain_data = json.dumps(response_data, ensure_ascii=False)  # crypto.format_text(json.dumps(response_data, ensure_ascii=False))
-        encrypted_data = crypto.encrypt_data(self.secret_key, plain_data)
-        signature = crypto.generate_signature(plain_data, self.secret_key)
+        # Encoded once and shared by the cipher and the HMAC
+        plain_data = json.dumps(response_data, ensure_ascii=False).encode('utf-8')
+        signature = crypto.sign_bytes(plain_data, self.secret_key)
+        encoding = compression.get_response_encoding()
+        if encoding:
+            # The signature stays over the uncompressed JSON, clients verify after decompressing
+            plain_data = compression.compress(encoding, plain_data)
+            self.http_headers[compression.ENCODING_HEADER] = encoding
+        encrypted_data = crypto.encrypt_bytes(self.secret_key, plain_data)
         self.http_headers["X-Signature"] = signature
         return {
             "enc_data": encrypted_data,
             "signature": signature
         }
 
+    def _plain_chunks(self):
+        for piece in json_stream.iterencode(self.format_response_data()):
+            yield piece.encode('utf-8')
+
+    def _envelope_chunks(self, signature, encoding=None):
+        # Same compact document the REST renderer produces for get_response_data()
+        chunks = self._plain_chunks()
+        if encoding:
+            chunks = compression.iter_compress(encoding, chunks)
+        yield b'{"enc_data":"'
+        for piece in crypto.iter_encrypt_bytes(self.secret_key, chunks):
+            yield piece.encode('utf-8')
+        yield b'","signature":"' + signature + b'"}'
+
+    def stream(self, http_status=status.HTTP_200_OK):
+        """
+        Same wire format as rest(), but encoded, encrypted and sent chunk by chunk, so large listings never exist
+        as one plaintext/ciphertext string. The signature is needed for the X-Signature header before the body
+        is sent, so the payload is encoded twice: once to sign it, once while streaming.
+        """
+        with measure_serialization():
+            signature = crypto.sign_chunks(self._plain_chunks(), self.secret_key)
+        self.http_headers["X-Signature"] = signature
+        # Read now, the body is produced after the request context has been reset
+        encoding = compression.get_response_encoding()
+        if encoding:
+            self.http_headers[compression.ENCODING_HEADER] = encoding
+        response = StreamingHttpResponse(self._envelope_chunks(signature, encoding), status=http_status,
+                                         content_type="application/json")
+        for k, v in self.http_headers.items():
+            response[k] = v
+        return response
+
@@ -0,0 +1,104 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Async counterpart of http_client for the views served as coroutines under ASGI.
+One aiohttp ClientSession per event loop (a session is bound to the loop it was created on) reuses keep-alive
+connections, with the same default timeouts as http_client. Its connector caps open connections at CONNECTION_LIMIT
+for all hosts together rather than per host: requests only limits the idle connections it keeps, and a per-host cap
+would queue concurrent calls to one provider behind each other. Responses are read completely and
+returned as Response, which has the parts of requests.Response the views use; aiohttp errors are raised as the
+matching requests exceptions, so resilience.Dependency and the views handle both clients alike.
+"""
+from django.conf import settings
+from api.utility_files import http_client
+import aiohttp
+import asyncio
+import json
+import requests
+import weakref
+
+CONNECTION_LIMIT = getattr(settings, 'OUTBOUND_HTTP_ASYNC_LIMIT', 100)
+
+_sessions = weakref.WeakKeyDictionary()
+
+
+class NotSentError(requests.ConnectionError):
+    """The connection to the host could not be opened, so no byte of the request was sent."""
+
+
+class Response:
+    def __init__(self, status_code: int, headers, content: bytes, url: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+def _client_timeout(timeout) -> aiohttp.ClientTimeout:
+    """:param timeout: Seconds, or (connect, read) seconds as for requests"""
+    connect, read = timeout if isinstance(timeout, (list, tuple)) else (timeout, timeout)
+    return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """:return: The pooled session of the running event loop, created on first use"""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = _sessions[loop] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=CONNECTION_LIMIT),
+            timeout=_client_timeout(http_client.DEFAULT_TIMEOUT),
+        )
+    return session
+
+
+async def close_session() -> None:
+    """Closes the running loop's session, e.g. before the loop shuts down."""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+async def request(method: str, url: str, timeout=None, auth=None, **kwargs) -> Response:
+    """
+    Sends a request through the running loop's pooled session.
+    :param method: HTTP method
+    :param url: Full URL
+    :param timeout: Seconds or (connect, read) seconds, DEFAULT_TIMEOUT when omitted
+    :param auth: (user, password) for basic auth
+    :param kwargs: aiohttp keyword arguments (params, data, json, headers)
+    :return: Response with the body already read
+    :raise requests.RequestException: NotSentError, Timeout or ConnectionError
+    """
+    if auth is not None and not isinstance(auth, aiohttp.BasicAuth):
+        auth = aiohttp.BasicAuth(*auth)
+    options = {'timeout': _client_timeout(timeout)} if timeout is not None else {}
+    try:
+        async with get_session().request(method, url, auth=auth, **options, **kwargs) as response:
+            content = await response.read()
+            return Response(response.status, response.headers, content, str(response.url))
+    except aiohttp.ClientConnectorError as e:
+        raise NotSentError(str(e)) from e
+    except (aiohttp.ServerTimeoutError, asyncio.TimeoutError) as e:
+        raise requests.Timeout(str(e) or "Request timed out") from e
+    except aiohttp.ClientError as e:
+        raise requests.ConnectionError(str(e)) from e
+
+
+async def get(url: str, **kwargs) -> Response:
+    return await request('GET', url, **kwargs)
+
+
+async def post(url: str, **kwargs) -> Response:
+    return await request('POST', url, **kwargs)
@@ -0,0 +1,44 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Sending mail from async views.
+With the SMTP backend the message is sent by aiosmtplib on the event loop, with the EMAIL_* settings Django's SMTP
+backend uses. Without aiosmtplib, or with any other backend (locmem in tests, console in development), Django's
+send_mail runs on a worker thread, so the loop is never blocked by the SMTP round trips either way.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import EmailMessage, send_mail as django_send_mail
+
+try:
+    import aiosmtplib
+except ImportError:  # aiosmtplib is optional, the thread fallback always works
+    aiosmtplib = None
+
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+
+async def send_mail(subject: str, message: str, from_email: str, recipient_list: list) -> int:
+    """
+    Async django.core.mail.send_mail.
+    :return: Number of messages sent (1)
+    :raise Exception: Whatever the SMTP client raises when the message cannot be sent
+    """
+    if aiosmtplib is None or settings.EMAIL_BACKEND != SMTP_BACKEND:
+        return await sync_to_async(django_send_mail, thread_sensitive=False)(
+            subject, message, from_email, recipient_list)
+
+    email = EmailMessage(subject, message, from_email, recipient_list)
+    await aiosmtplib.send(
+        email.message(),
+        sender=email.from_email,
+        recipients=email.recipients(),
+        hostname=settings.EMAIL_HOST,
+        port=settings.EMAIL_PORT,
+        username=settings.EMAIL_HOST_USER or None,
+        password=settings.EMAIL_HOST_PASSWORD or None,
+        start_tls=settings.EMAIL_USE_TLS or None,
+        use_tls=settings.EMAIL_USE_SSL,
+        timeout=settings.EMAIL_TIMEOUT,
+    )
+    return 1
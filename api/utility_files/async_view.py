@@ -0,0 +1,64 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Base class of the async view variants (endpoints that mostly wait on Razorpay, PayPal, videosdk or SMTP).
+Under ASGI an async view waits on the event loop instead of holding a worker thread for the upstream round trip.
+DRF views cannot be coroutines, so these are Django views that behave like the create() of the sync viewsets:
+POST only, CSRF exempt, the body SecureRequestMiddleware decrypted in request.data, and the same
+api_success/api_failed(...).secure().rest() responses, rendered in the view with DRF's JSON renderer.
+ORM calls use the async ORM (aget, acreate, ...); blocks that need a transaction are sync functions run with
+sync_to_async, on the request's own thread.
+"""
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from api.utility_files.api_call import api_failed
+import json
+
+_renderer = JSONRenderer()
+
+
+def render(response):
+    """
+    :param response: DRF Response (as returned by APIResponse.rest()) or any HttpResponse
+    :return: HttpResponse with the content DRF would have rendered, keeping .data and .api_status readable
+    """
+    if not isinstance(response, Response):
+        return response
+    rendered = HttpResponse(_renderer.render(response.data), status=response.status_code,
+                            content_type=_renderer.media_type)
+    for header, value in response.items():
+        if header.lower() != 'content-type':
+            rendered[header] = value
+    rendered.data = response.data
+    rendered.api_status = getattr(response, 'api_status', None)
+    return rendered
+
+
+class AsyncAPIView(View):
+    http_method_names = ['post']
+    # Router basename of the sync variant; the idempotency scope is shared with it
+    basename = None
+    read_only = False
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Read by QueryMetricsMiddleware and ReplicaRoutingMiddleware, as on DRF views
+        view.cls = cls
+        view.csrf_exempt = True
+        return view
+
+    async def post(self, request, *args, **kwargs):
+        if not hasattr(request, 'data'):
+            # Requests SecureRequestMiddleware does not decrypt carry plain JSON
+            try:
+                request.data = json.loads(request.body or b'{}')
+            except ValueError:
+                return render(api_failed("Request body format is incorrect.").secure().rest())
+        return render(await self.handle(request, *args, **kwargs))
+
+    async def handle(self, request, *args, **kwargs):
+        """The endpoint, as create() of the sync variant; returns a DRF Response."""
+        raise NotImplementedError
@@ -0,0 +1,92 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Versioned cache for serialized catalog payloads.
+Every key embeds the current catalog generation, so bumping the generation invalidates all cached listings at once.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from api.utility_files import db_routing
+import hashlib
+import json
+import time
+
+CATALOG_GENERATION_KEY = 'catalog:generation'
+CATALOG_CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def _seed_generation() -> int:
+    # Time based seed so a flushed cache never hands out a generation that was already used
+    return int(time.time() * 1000)
+
+
+def get_generation(key: str = CATALOG_GENERATION_KEY) -> int:
+    """
+    Returns the current value of a generation counter, creating it if the cache does not have one yet.
+    :param key: Cache key of the counter
+    :return: Generation number
+    """
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _seed_generation(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(key: str = CATALOG_GENERATION_KEY) -> int:
+    """
+    Moves a generation counter forward. Anything built for an older generation is never read again
+    and simply expires.
+    :param key: Cache key of the counter
+    :return: The generation this bump produced
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = _seed_generation()
+        cache.set(key, generation, timeout=None)
+        return generation
+
+
+def get_catalog_generation() -> int:
+    return get_generation(CATALOG_GENERATION_KEY)
+
+
+def bump_catalog_generation() -> None:
+    bump_generation(CATALOG_GENERATION_KEY)
+
+
+def invalidate_catalog_on_commit() -> None:
+    """
+    Bumps the generation once the surrounding transaction commits, so readers cannot re-cache
+    rows that are still uncommitted.
+    """
+    transaction.on_commit(bump_catalog_generation)
+
+
+def listing_cache_key(namespace: str, *parts) -> str:
+    """
+    Builds a cache key for a catalog payload.
+    :param namespace: Payload kind (e.g. "products")
+    :param parts: Values that identify the payload (category, subcategory, ...)
+    :return: Cache key bound to the current generation
+    """
+    digest = hashlib.md5(json.dumps(parts, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+    return f"catalog:{namespace}:{get_catalog_generation()}:{digest}"
+
+
+def get_cached_listing(namespace: str, *parts):
+    """
+    :return: The cached payload, or None. On a miss the rest of the request reads from the primary: the payload it
+             builds is cached for CATALOG_CACHE_TIMEOUT, and a replica that has not caught up with the change that
+             invalidated the cache would make that stale for the whole timeout.
+    """
+    payload = cache.get(listing_cache_key(namespace, *parts))
+    if payload is None:
+        db_routing.read_from_primary()
+    return payload
+
+
+def set_cached_listing(payload, namespace: str, *parts) -> None:
+    cache.set(listing_cache_key(namespace, *parts), payload, timeout=CATALOG_CACHE_TIMEOUT)
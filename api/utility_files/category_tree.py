@@ -0,0 +1,124 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: In-process category tree.
+All categories are loaded with one query into an immutable snapshot that answers name -> node, slug -> node and
+node -> descendant ids lookups from dicts, so resolving a listing's category filter costs no database query. The
+tree supports any depth: every node carries its materialized path (ancestor ids from the root) and the frozen set
+of its own and all descendant ids.
+Category signals bump a shared generation counter once the change commits; every worker reloads its snapshot the
+next time it sees a newer generation.
+"""
+from django.db import DEFAULT_DB_ALIAS
+from api.models import Category
+from api.utility_files.catalog_cache import get_generation, bump_generation
+import threading
+
+CATEGORY_TREE_GENERATION_KEY = 'category_tree:generation'
+
+
+class CategoryNode:
+    __slots__ = ("id", "name", "slug", "parent_id", "path", "children", "descendant_ids")
+
+    def __init__(self, category_id, name, slug, parent_id):
+        self.id = category_id
+        self.name = name
+        self.slug = slug
+        self.parent_id = parent_id
+        self.path = ()  # ancestor ids, root first
+        self.children = []
+        self.descendant_ids = frozenset()  # this node and everything below it
+
+    @property
+    def depth(self) -> int:
+        return len(self.path)
+
+    def __repr__(self):
+        return f"<CategoryNode {self.id} {self.name!r}>"
+
+
+class CategoryTree:
+    """Immutable snapshot of the category table."""
+
+    def __init__(self, rows=()):
+        """
+        :param rows: iterable of (id, name, slug, parent id)
+        """
+        self.nodes = {row[0]: CategoryNode(*row) for row in rows}
+        self.roots = []
+        for node in self.nodes.values():
+            parent = self.nodes.get(node.parent_id)
+            if parent is None:
+                self.roots.append(node)
+            else:
+                parent.children.append(node)
+        for siblings in [self.roots] + [node.children for node in self.nodes.values()]:
+            siblings.sort(key=lambda node: node.name)
+
+        # Depth-first from the roots; nodes caught in a parent cycle are never reached and stay out of the tree
+        reached = []
+        stack = [(root, ()) for root in reversed(self.roots)]
+        while stack:
+            node, path = stack.pop()
+            node.path = path
+            reached.append(node)
+            stack.extend((child, path + (node.id,)) for child in reversed(node.children))
+        for node in reversed(reached):  # children before their parents
+            node.descendant_ids = frozenset((node.id,)).union(*(child.descendant_ids for child in node.children))
+        self.nodes = {node.id: node for node in reached}
+
+        # Matched case-insensitively, as the name and slug lookups were under MySQL's default collation
+        self._by_name = {node.name.casefold(): node for node in reached}
+        self._by_slug = {node.slug.casefold(): node for node in reached if node.slug}
+
+    def get(self, category_id):
+        return self.nodes.get(category_id)
+
+    def by_name(self, name: str):
+        return self._by_name.get(name.casefold()) if name else None
+
+    def by_slug(self, slug: str):
+        return self._by_slug.get(slug.casefold()) if slug else None
+
+    def child_by_name(self, node, name: str):
+        """:return: The direct child of node called name, or None"""
+        child = self.by_name(name)
+        return child if child is not None and child.parent_id == node.id else None
+
+    def descendant_ids(self, category_id) -> frozenset:
+        """:return: The category's id and the ids of all categories below it (empty for an unknown id)"""
+        node = self.nodes.get(category_id)
+        return node.descendant_ids if node is not None else frozenset()
+
+    def ancestors(self, node) -> list:
+        """:return: Nodes from the root down to node's parent"""
+        return [self.nodes[category_id] for category_id in node.path]
+
+
+class CategoryTreeCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree = None
+        self._generation = None
+
+    def _load(self):
+        generation = get_generation(CATEGORY_TREE_GENERATION_KEY)
+        # Kept until the next category change, so read from the primary (see db_routing)
+        rows = Category.objects.using(DEFAULT_DB_ALIAS).values_list("id", "name", "slug", "parent_id")
+        self._tree = CategoryTree(rows)
+        self._generation = generation
+
+    def current(self) -> CategoryTree:
+        """:return: The tree for the current generation, loading it when this worker's copy is stale"""
+        if self._tree is None or self._generation != get_generation(CATEGORY_TREE_GENERATION_KEY):
+            with self._lock:
+                if self._tree is None or self._generation != get_generation(CATEGORY_TREE_GENERATION_KEY):
+                    self._load()
+        return self._tree
+
+    def invalidate(self) -> None:
+        """Makes every worker (this one included) reload the tree on its next lookup."""
+        bump_generation(CATEGORY_TREE_GENERATION_KEY)
+
+
+category_tree = CategoryTreeCache()
@@ -0,0 +1,124 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Optional compression of the plaintext inside the enc_data envelope.
+Ciphertext does not compress, so HTTP level gzip is useless for secure responses; instead the JSON is compressed
+before it is encrypted. Clients opt in with the X-Enc-Accept-Encoding request header, and a compressed envelope is
+marked with X-Enc-Encoding. Signatures are always computed over the uncompressed JSON.
+"""
+from contextvars import ContextVar
+from typing import Optional
+from django.conf import settings
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, deflate is always available
+    zstandard = None
+
+ACCEPT_ENCODING_HEADER = 'X-Enc-Accept-Encoding'
+ENCODING_HEADER = 'X-Enc-Encoding'
+
+DEFLATE = 'deflate'
+ZSTD = 'zstd'
+DEFLATE_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Upper bound for a decompressed request body, protects the workers from compression bombs
+MAX_DECOMPRESSED_SIZE = getattr(settings, 'ENC_MAX_DECOMPRESSED_SIZE', 16 * 1024 * 1024)
+
+# Preferred first
+SUPPORTED_ENCODINGS = (ZSTD, DEFLATE) if zstandard is not None else (DEFLATE,)
+DECOMPRESS_ERRORS = (zlib.error, zstandard.ZstdError) if zstandard is not None else (zlib.error,)
+
+# Encoding negotiated for the response of the request being handled, set by SecureRequestMiddleware
+_response_encoding = ContextVar('enc_response_encoding', default=None)
+
+
+class CompressionError(ValueError):
+    pass
+
+
+def negotiate(accept_header: str) -> Optional[str]:
+    """
+    Function to pick the response encoding from the client's X-Enc-Accept-Encoding header.
+    :param accept_header: Comma separated encodings, e.g. "zstd, deflate"
+    :return: The best encoding both sides support, or None for uncompressed
+    """
+    if not accept_header:
+        return None
+    accepted = {value.strip().lower() for value in accept_header.split(',')}
+    for encoding in SUPPORTED_ENCODINGS:
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+def set_response_encoding(encoding: Optional[str]):
+    return _response_encoding.set(encoding)
+
+
+def reset_response_encoding(token) -> None:
+    _response_encoding.reset(token)
+
+
+def get_response_encoding() -> Optional[str]:
+    return _response_encoding.get()
+
+
+def compress(encoding: str, data: bytes) -> bytes:
+    """
+    :param encoding: One of SUPPORTED_ENCODINGS
+    :param data: Plaintext bytes
+    :return: Compressed bytes
+    """
+    if encoding == DEFLATE:
+        return zlib.compress(data, DEFLATE_LEVEL)
+    if encoding == ZSTD and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise CompressionError(f"Unsupported encoding: {encoding}")
+
+
+def iter_compress(encoding: str, chunks):
+    """
+    Function to compress a stream of bytes.
+    :param encoding: One of SUPPORTED_ENCODINGS
+    :param chunks: Iterable of plaintext bytes
+    :return: Generator of compressed bytes
+    """
+    if encoding == DEFLATE:
+        compressor = zlib.compressobj(DEFLATE_LEVEL)
+    elif encoding == ZSTD and zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    else:
+        raise CompressionError(f"Unsupported encoding: {encoding}")
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def decompress(encoding: str, data: bytes, max_size: int = MAX_DECOMPRESSED_SIZE) -> bytes:
+    """
+    :param encoding: Encoding named in the request's X-Enc-Encoding header
+    :param data: Compressed bytes
+    :param max_size: Largest accepted decompressed size
+    :return: Decompressed bytes
+    """
+    encoding = (encoding or '').strip().lower()
+    try:
+        if encoding == DEFLATE:
+            decompressor = zlib.decompressobj()
+            result = decompressor.decompress(data, max_size + 1)
+            if not decompressor.eof and len(result) <= max_size:
+                raise CompressionError("Truncated compressed body")
+        elif encoding == ZSTD and zstandard is not None:
+            result = zstandard.ZstdDecompressor().stream_reader(data).read(max_size + 1)
+        else:
+            raise CompressionError(f"Unsupported encoding: {encoding}")
+    except DECOMPRESS_ERRORS as e:
+        raise CompressionError(str(e))
+    if len(result) > max_size:
+        raise CompressionError("Decompressed body is too large")
+    return result
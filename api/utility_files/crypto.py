@@ -15,6 +15,7 @@ import base64
 import re
 import secrets
 import binascii
+from functools import lru_cache
 
 def format_text(text: str) -> str:
     """
@@ -81,6 +82,53 @@ def get_cypher(mode="ECB", primary_key: str = "", secondary_key: str = ""):
     return AES.new(primary_key.encode('utf-8'), cipher_mode)
 
 
+@lru_cache(maxsize=32)
+def key_bytes(key: str) -> bytes:
+    """ Function to return the UTF-8 bytes of a key, computed once per key """
+    return key.encode('utf-8')
+
+
+@lru_cache(maxsize=32)
+def _ecb_cypher(primary_key: str):
+    # ECB keeps no state between calls, so one cipher object per key can be shared by every request
+    return AES.new(key_bytes(primary_key), AES.MODE_ECB)
+
+
+def _cached_cypher(mode: str, primary_key: str, secondary_key: str):
+    if mode == "ECB" and not secondary_key:
+        return _ecb_cypher(primary_key)
+    # Chained modes carry state (the IV), so they still need a fresh cipher per message
+    return get_cypher(mode, primary_key, secondary_key)
+
+
+def encrypt_bytes(key: str, plain_body: bytes, mode: str = "ECB", secondary_key: str = "") -> str:
+    """
+    Function to encrypt raw bytes using AES256 with a secret key.
+    :param key: AES secret key
+    :param plain_body: The bytes to be encrypted
+    :param mode: AES mode
+    :param secondary_key: AES IV (for CBC mode)
+    :return: Base64 encoded encrypted string
+    """
+    cipher = _cached_cypher(mode, key, secondary_key)
+    encrypted_body = cipher.encrypt(pad(plain_body, AES.block_size))
+    return base64.b64encode(encrypted_body).decode('utf-8')
+
+
+def decrypt_bytes(key: str, encrypted_body: str, mode: str = "ECB", secondary_key: str = "") -> bytes:
+    """
+    Function to decrypt a base64 encoded AES256 encrypted string into raw bytes.
+    :param key: AES secret key
+    :param encrypted_body: The string to be decrypted
+    :param mode: AES mode
+    :param secondary_key: AES IV (for CBC mode)
+    :return: Decrypted bytes
+    """
+    decoded_body = base64.b64decode(encrypted_body)
+    cipher = _cached_cypher(mode, key, secondary_key)
+    return unpad(cipher.decrypt(decoded_body), AES.block_size)
+
+
 def encrypt_data(key: str, plain_body: str, mode: str = "ECB", secondary_key: str = "") -> str:
     """
     Function to encrypt a given string using AES256 with a secret key.
@@ -90,9 +138,7 @@ def encrypt_data(key: str, plain_body: str, mode: str = "ECB", secondary_key: st
     :param secondary_key: AES IV (for CBC mode)
     :return: Base64 encoded encrypted string
     """
-    cipher = get_cypher(mode, key, secondary_key)
-    encrypted_body = cipher.encrypt(pad(plain_body.encode('utf-8'), AES.block_size))
-    return base64.b64encode(encrypted_body).decode('utf-8')
+    return encrypt_bytes(key, plain_body.encode('utf-8'), mode, secondary_key)
 
 
 def decrypt_data(key: str, encrypted_body: str, mode: str = "ECB", secondary_key: str = "") -> str:
@@ -104,10 +150,34 @@ def decrypt_data(key: str, encrypted_body: str, mode: str = "ECB", secondary_key
     :param secondary_key: AES IV (for CBC mode)
     :return: Decrypted string
     """
-    decoded_body = base64.b64decode(encrypted_body)
-    cipher = get_cypher(mode, key, secondary_key)
-    decrypted_body = unpad(cipher.decrypt(decoded_body), AES.block_size).decode('utf-8')
-    return decrypted_body
+    return decrypt_bytes(key, encrypted_body, mode, secondary_key).decode('utf-8')
+
+
+# 48 bytes is both a multiple of the AES block and of a base64 quantum, so chunks of it can be
+# encrypted and base64 encoded independently and still concatenate to the one-shot result
+STREAM_BLOCK_SIZE = 48
+STREAM_CHUNK_SIZE = STREAM_BLOCK_SIZE * 1365  # ~64 KiB
+
+
+def iter_encrypt_bytes(key: str, chunks, mode: str = "ECB", secondary_key: str = "", chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Function to encrypt a stream of bytes using AES256, chunk by chunk.
+    :param key: AES secret key
+    :param chunks: Iterable of bytes
+    :param mode: AES mode
+    :param secondary_key: AES IV (for CBC mode)
+    :param chunk_size: Plaintext bytes encrypted per step (a multiple of STREAM_BLOCK_SIZE)
+    :return: Generator of base64 str pieces; joined they equal encrypt_bytes(key, b"".join(chunks))
+    """
+    cipher = _cached_cypher(mode, key, secondary_key)
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= chunk_size:
+            cut = len(buffer) - len(buffer) % STREAM_BLOCK_SIZE
+            yield base64.b64encode(cipher.encrypt(bytes(buffer[:cut]))).decode('utf-8')
+            del buffer[:cut]
+    yield base64.b64encode(cipher.encrypt(pad(bytes(buffer), AES.block_size))).decode('utf-8')
 
 
 def generate_hs_key(req_data: str, access_token: str) -> str:
@@ -122,6 +192,56 @@ def generate_hs_key(req_data: str, access_token: str) -> str:
     return hash_key
 
 
+@lru_cache(maxsize=32)
+def _hmac_template(secret_key: str):
+    # Keyed HMAC state (inner/outer pads) computed once; each message works on a copy
+    return hmac.new(key_bytes(secret_key), digestmod=hashlib.sha256)
+
+
+def new_hmac(secret_key: str):
+    """ Function to return a fresh HMAC-SHA256 object for the secret key """
+    return _hmac_template(secret_key).copy()
+
+
+def sign_bytes(data: bytes, secret_key: str) -> bytes:
+    """
+    Function to compute the signature of raw bytes (same format as generate_signature).
+    :param data: The JSON data bytes
+    :param secret_key: The secret key
+    :return: The computed signature
+    """
+    digest = new_hmac(secret_key)
+    digest.update(data)
+    return base64.b64encode(digest.hexdigest().encode("utf-8"))
+
+
+def sign_chunks(chunks, secret_key: str) -> bytes:
+    """
+    Function to compute the signature of a stream of bytes (same format as generate_signature).
+    :param chunks: Iterable of bytes
+    :param secret_key: The secret key
+    :return: The computed signature
+    """
+    digest = new_hmac(secret_key)
+    for chunk in chunks:
+        digest.update(chunk)
+    return base64.b64encode(digest.hexdigest().encode("utf-8"))
+
+
+def verify_signature_bytes(data: bytes, signature: str, secret_key: str) -> bool:
+    """
+    Function to verify the signature of raw request bytes.
+    :param data: The decrypted request bytes
+    :param signature: The signature from the request data
+    :param secret_key: The secret key
+    :return: Whether the signature is valid
+    """
+    decoded_signature = base64.b64decode(signature).decode('utf-8')
+    digest = new_hmac(secret_key)
+    digest.update(data)
+    return hmac.compare_digest(digest.hexdigest(), decoded_signature)
+
+
 def generate_signature(data: str, secret_key: str):
     """
     Function to compute the signature for server POST requests and secure responses.
@@ -129,7 +249,7 @@ def generate_signature(data: str, secret_key: str):
     :param secret_key: The secret key
     :return: The computed signature
     """
-    return base64.b64encode(hmac.new(secret_key.encode('utf-8'), data.encode('utf-8'), hashlib.sha256).hexdigest().encode("utf-8"))
+    return sign_bytes(data.encode('utf-8'), secret_key)
 
 
 def verify_signature(data: str, signature: str, secret_key: str):
@@ -140,9 +260,7 @@ def verify_signature(data: str, signature: str, secret_key: str):
     :param secret_key: The secret key
     :return: Whether the signature is valid
     """
-    decoded_signature = base64.b64decode(signature).decode('utf-8')
-    calc_signature = hmac.new(secret_key.encode('utf-8'), data.encode('utf-8'), hashlib.sha256).hexdigest()
-    return hmac.compare_digest(calc_signature, decoded_signature)
+    return verify_signature_bytes(data.encode('utf-8'), signature, secret_key)
 
 def generate_secret_key():
     return base64.b64encode(secrets.token_bytes(32))
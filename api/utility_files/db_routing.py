@@ -0,0 +1,121 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Read replica routing.
+Views that only read declare read_only = True. While such a view runs (ReplicaRoutingMiddleware), ReplicaRouter sends
+its reads to the replica alias; everything else, writes, and reads inside a transaction go to the primary.
+Replication lags, so a user who has just written keeps reading from the primary for STICKY_SECONDS ("read your own
+writes"): the middleware marks the user in the shared cache after a request that wrote, and read-only views skip the
+replica while the mark is there. Without a configured replica alias every query goes to the primary.
+Data that is cached for longer than the replica lag (catalog listings, the category tree, the suggestion index) is
+built from the primary, otherwise a rebuild right after an invalidation could store the replica's stale rows.
+"""
+from collections import Counter
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+import threading
+
+REPLICA_ALIAS = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+STICKY_SECONDS = getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 10)
+STICKY_KEY = 'db_routing:sticky:{}'
+
+
+class RoutingState:
+    """Routing decisions of one request."""
+    __slots__ = ('use_replica', 'wrote', 'user_key')
+
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+        self.user_key = None
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+def replica_configured() -> bool:
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def begin_request() -> tuple:
+    """:return: (RoutingState, token for end_request)"""
+    state = RoutingState()
+    return state, _state.set(state)
+
+
+def end_request(token) -> None:
+    _state.reset(token)
+
+
+def get_state():
+    return _state.get()
+
+
+def read_from_primary() -> None:
+    """Sends the remaining reads of the current request to the primary."""
+    state = _state.get()
+    if state is not None:
+        state.use_replica = False
+
+
+def is_sticky(user_key) -> bool:
+    """:return: Whether the user wrote within the last STICKY_SECONDS"""
+    return user_key is not None and cache.get(STICKY_KEY.format(user_key)) is not None
+
+
+def mark_sticky(user_key) -> None:
+    if user_key is not None:
+        cache.set(STICKY_KEY.format(user_key), 1, timeout=STICKY_SECONDS)
+
+
+class ReplicaRouter:
+    """settings.DATABASE_ROUTERS entry; see the module docstring."""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica or state.wrote or not replica_configured():
+            return DEFAULT_DB_ALIAS
+        # Reads in a transaction must see its own uncommitted writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Later reads of this request must see the write
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+
+class RoutingMetrics:
+    """Requests per routing outcome, kept in process memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            'replica_configured': replica_configured(),
+            **{key: counts.get(key, 0) for key in ('replica_requests', 'sticky_requests', 'writing_requests')},
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+routing_metrics = RoutingMetrics()
@@ -0,0 +1,165 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Shared outbound HTTP layer.
+One keep-alive requests.Session per upstream host (so repeated calls reuse pooled TLS connections) with explicit
+default timeouts, and a token cache for provider OAuth tokens: tokens are reused until shortly before they expire
+and refreshed by a single caller at a time (per process with a lock, across workers with a cache lock).
+"""
+from urllib.parse import urlsplit
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+import logging
+import requests
+import threading
+import time
+
+logger = logging.getLogger('apicall')
+
+# (connect, read) seconds
+DEFAULT_TIMEOUT = getattr(settings, 'OUTBOUND_HTTP_TIMEOUT', (3.05, 15))
+POOL_SIZE = getattr(settings, 'OUTBOUND_HTTP_POOL_SIZE', 10)
+
+# Tokens are refreshed this many seconds before the provider says they expire
+TOKEN_EXPIRY_MARGIN = 60
+# How long a worker waits for another worker's refresh before fetching the token itself
+TOKEN_REFRESH_WAIT = 5.0
+TOKEN_CACHE_KEY = 'oauth:token:{}'
+TOKEN_LOCK_KEY = 'oauth:token:{}:lock'
+
+
+class TimeoutSession(requests.Session):
+    """Session that applies DEFAULT_TIMEOUT to every request that does not set its own."""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def new_session(session_class=TimeoutSession) -> requests.Session:
+    """
+    :param session_class: TimeoutSession or a subclass of it
+    :return: Session with a connection pool of POOL_SIZE keep-alive connections
+    """
+    session = session_class()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    Returns the pooled session for the host of a URL, creating it on first use.
+    :param url: Any URL on the upstream host (or the base URL itself)
+    :return: Shared TimeoutSession
+    """
+    key = _host_key(url)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _sessions[key] = new_session()
+    return session
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Sends a request through the pooled session of the URL's host.
+    :param method: HTTP method
+    :param url: Full URL
+    :param kwargs: requests keyword arguments (timeout defaults to DEFAULT_TIMEOUT)
+    :return: requests.Response
+    """
+    return get_session(url).request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request('GET', url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request('POST', url, **kwargs)
+
+
+class TokenCache:
+    """
+    Caches one provider token. fetch() must return (token, expires_in_seconds).
+    """
+
+    def __init__(self, name: str, fetch):
+        self.name = name
+        self.fetch = fetch
+        self._lock = threading.Lock()
+        self._token = None
+        self._valid_until = 0.0
+
+    def _from_shared_cache(self):
+        entry = cache.get(TOKEN_CACHE_KEY.format(self.name))
+        if entry and entry['valid_until'] > time.time():
+            self._token, self._valid_until = entry['token'], entry['valid_until']
+            return self._token
+        return None
+
+    def _store(self, token, expires_in):
+        lifetime = max(0, int(expires_in) - TOKEN_EXPIRY_MARGIN)
+        self._token, self._valid_until = token, time.time() + lifetime
+        if lifetime:
+            cache.set(TOKEN_CACHE_KEY.format(self.name), {'token': token, 'valid_until': self._valid_until}, lifetime)
+
+    def get(self) -> str:
+        """
+        :return: A valid token, fetched from the provider only when no worker has a fresh one
+        """
+        if self._token and self._valid_until > time.time():
+            return self._token
+        with self._lock:
+            if self._token and self._valid_until > time.time():
+                return self._token
+            token = self._from_shared_cache()
+            if token:
+                return token
+
+            lock_key = TOKEN_LOCK_KEY.format(self.name)
+            if not cache.add(lock_key, 1, timeout=int(TOKEN_REFRESH_WAIT * 2)):
+                # Another worker is refreshing, wait for its result
+                deadline = time.time() + TOKEN_REFRESH_WAIT
+                while time.time() < deadline:
+                    time.sleep(0.05)
+                    token = self._from_shared_cache()
+                    if token:
+                        return token
+                logger.warning(f"Token refresh for {self.name} timed out waiting for another worker")
+            try:
+                token, expires_in = self.fetch()
+                self._store(token, expires_in)
+                return token
+            finally:
+                cache.delete(lock_key)
+
+    async def aget(self) -> str:
+        """get() for async views; only a refresh (rare, it blocks on locks and the provider) runs on a thread"""
+        if self._token and self._valid_until > time.time():
+            return self._token
+        return await sync_to_async(self.get, thread_sensitive=False)()
+
+    def invalidate(self) -> None:
+        """Drops the token, e.g. after the provider answered 401."""
+        with self._lock:
+            self._token, self._valid_until = None, 0.0
+            cache.delete(TOKEN_CACHE_KEY.format(self.name))
+
+    async def ainvalidate(self) -> None:
+        await sync_to_async(self.invalidate, thread_sensitive=False)()
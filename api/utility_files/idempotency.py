@@ -0,0 +1,221 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Idempotency keys for endpoints that must not run twice (order saving, payment verification and capture).
+A client sends the same Idempotency-Key header with every retry of one logical request. The first request claims the
+key by inserting an IdempotencyRecord (the unique (scope, key) constraint decides the winner), runs the handler and
+stores the encrypted response. Retries replay that response without running the handler again; a retry that arrives
+while the first request is still running waits for its result. Failed outcomes are not stored, so a retry after a
+failure runs the handler again.
+async_idempotent() does the same for the handle() of an async view.
+"""
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from api.models import IdempotencyRecord
+from api.utility_files import compression
+from api.utility_files.api_call import api_failed
+from api.utility_files.apibase import API_STATUS_OK
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger('apicall')
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 128
+
+KEY_TTL = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)  # seconds a completed response is replayed
+# An in-progress claim older than this is assumed to belong to a dead worker and may be taken over
+IN_PROGRESS_TIMEOUT = getattr(settings, 'IDEMPOTENCY_IN_PROGRESS_TIMEOUT', 60)
+WAIT_TIMEOUT = 10.0  # seconds a duplicate waits for the in-flight request
+POLL_INTERVAL = 0.1
+
+# Response headers needed to read a replayed response
+STORED_HEADERS = ('X-Signature', compression.ENCODING_HEADER)
+
+ERROR_INVALID_KEY = 1090
+ERROR_KEY_REUSED = 1091
+ERROR_IN_PROGRESS = 1092
+
+
+class IdempotencyError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+def request_hash(data) -> str:
+    """:return: Digest of the request body, so a key cannot be reused for a different request"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _create(scope, key, digest):
+    try:
+        with transaction.atomic():
+            return IdempotencyRecord.objects.create(
+                scope=scope, key=key, request_hash=digest, expires_at=timezone.now() + timedelta(seconds=KEY_TTL),
+            )
+    except IntegrityError:
+        return None
+
+
+def claim(scope: str, key: str, digest: str):
+    """
+    Claims a key or waits for the request that holds it.
+    :param scope: Endpoint name
+    :param key: Client supplied idempotency key
+    :param digest: request_hash() of the request body
+    :return: (record, True) when this request must run the handler, (record, False) when the stored response
+             should be replayed
+    :raise IdempotencyError: When the key was used for another request or the first request is still running
+    """
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while True:
+        # Read first: a replay then costs a single query
+        record = IdempotencyRecord.objects.filter(scope=scope, key=key).first()
+        if record is None:
+            record = _create(scope, key, digest)
+            if record is not None:
+                return record, True
+            # Lost the race for the key, read the winner's record
+            continue
+
+        now = timezone.now()
+        if record.expires_at <= now:
+            IdempotencyRecord.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+            continue
+        if record.request_hash != digest:
+            raise IdempotencyError("Idempotency key was already used for a different request", ERROR_KEY_REUSED)
+        if record.status == IdempotencyRecord.STATUS_COMPLETED:
+            return record, False
+        if record.created_at <= now - timedelta(seconds=IN_PROGRESS_TIMEOUT):
+            taken = IdempotencyRecord.objects.filter(pk=record.pk, created_at=record.created_at,
+                                                     status=IdempotencyRecord.STATUS_IN_PROGRESS).update(created_at=now)
+            if taken:
+                logger.warning(f"Idempotency key {scope}:{key} taken over from a stalled request")
+                record.created_at = now
+                return record, True
+        if time.monotonic() >= deadline:
+            raise IdempotencyError("A request with this idempotency key is still being processed", ERROR_IN_PROGRESS)
+        time.sleep(POLL_INTERVAL)
+
+
+def complete(record, response) -> None:
+    """Stores a successful response for replay; any other outcome releases the key."""
+    if getattr(response, 'api_status', None) != API_STATUS_OK or getattr(response, 'data', None) is None:
+        release(record)
+        return
+    headers = {name: response[name] for name in STORED_HEADERS if response.has_header(name)}
+    IdempotencyRecord.objects.filter(pk=record.pk).update(
+        status=IdempotencyRecord.STATUS_COMPLETED,
+        response_status=response.status_code,
+        # Stored as the renderer would write it (the signature is bytes until rendered)
+        response_data=json.loads(json.dumps(response.data, cls=JSONEncoder)),
+        response_headers=headers,
+    )
+
+
+def release(record) -> None:
+    IdempotencyRecord.objects.filter(pk=record.pk, status=IdempotencyRecord.STATUS_IN_PROGRESS).delete()
+
+
+def replay(record) -> Response:
+    return Response(record.response_data, status=record.response_status,
+                    headers={**(record.response_headers or {}), REPLAYED_HEADER: 'true'})
+
+
+def _request_key(request):
+    """:return: (stripped Idempotency-Key or None, error response for a malformed key or None)"""
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return None, None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return None, api_failed("Invalid idempotency key", headers={"code": ERROR_INVALID_KEY}).secure().rest()
+    return key, None
+
+
+def _scope(view) -> str:
+    return getattr(view, 'basename', None) or type(view).__name__
+
+
+def idempotent(handler):
+    """
+    Decorator for a viewset's create(): requests carrying an Idempotency-Key header run at most once per key.
+    Requests without the header are handled as before.
+    """
+    @wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key, error = _request_key(request)
+        if error is not None:
+            return error
+        if key is None:
+            return handler(view, request, *args, **kwargs)
+
+        try:
+            record, owner = claim(_scope(view), key, request_hash(request.data))
+        except IdempotencyError as e:
+            return api_failed(str(e), headers={"code": e.code}).secure().rest()
+        if not owner:
+            return replay(record)
+
+        try:
+            response = handler(view, request, *args, **kwargs)
+        except BaseException:
+            release(record)
+            raise
+        complete(record, response)
+        return response
+
+    return wrapper
+
+
+def async_idempotent(handler):
+    """idempotent() for the handle() coroutine of an AsyncAPIView; the key queries run on the request's thread."""
+    @wraps(handler)
+    async def wrapper(view, request, *args, **kwargs):
+        key, error = _request_key(request)
+        if error is not None:
+            return error
+        if key is None:
+            return await handler(view, request, *args, **kwargs)
+
+        try:
+            record, owner = await sync_to_async(claim)(_scope(view), key, request_hash(request.data))
+        except IdempotencyError as e:
+            return api_failed(str(e), headers={"code": e.code}).secure().rest()
+        if not owner:
+            return replay(record)
+
+        try:
+            response = await handler(view, request, *args, **kwargs)
+        except BaseException:
+            await sync_to_async(release)(record)
+            raise
+        await sync_to_async(complete)(record, response)
+        return response
+
+    return wrapper
+
+
+def purge_expired_records(batch_size: int = 1000) -> int:
+    """
+    Deletes expired idempotency records in batches.
+    :param batch_size: Rows deleted per statement
+    :return: Number of records deleted
+    """
+    deleted = 0
+    while True:
+        ids = list(IdempotencyRecord.objects.filter(expires_at__lte=timezone.now())
+                   .order_by("expires_at").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyRecord.objects.filter(id__in=ids).delete()[0]
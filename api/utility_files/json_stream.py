@@ -0,0 +1,46 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Incremental JSON encoding that yields exactly the text of json.dumps(obj, ensure_ascii=False).
+The outer containers are walked item by item and each item is encoded with the C encoder, so a large
+listing is produced in small pieces instead of one multi-megabyte string.
+"""
+import json
+
+ITEM_SEPARATOR = ', '
+KEY_SEPARATOR = ': '
+# response -> body -> listing -> item: items of a listing are the unit of encoding
+DEFAULT_SPLIT_DEPTH = 3
+
+_encode = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def iterencode(obj, split_depth: int = DEFAULT_SPLIT_DEPTH):
+    """
+    Function to encode an object to JSON piece by piece.
+    :param obj: JSON serializable object
+    :param split_depth: How many container levels are walked before items are encoded in one call
+    :return: Generator of str pieces; joined they equal json.dumps(obj, ensure_ascii=False)
+    """
+    if split_depth <= 0 or not obj:
+        yield _encode(obj)
+    elif isinstance(obj, dict):
+        if not all(isinstance(key, str) for key in obj):
+            # json.dumps coerces non-string keys, let it do so for the whole mapping
+            yield _encode(obj)
+            return
+        separator = '{'
+        for key, value in obj.items():
+            yield separator + _encode(key) + KEY_SEPARATOR
+            yield from iterencode(value, split_depth - 1)
+            separator = ITEM_SEPARATOR
+        yield '}'
+    elif isinstance(obj, (list, tuple)):
+        separator = '['
+        for value in obj:
+            yield separator
+            yield from iterencode(value, split_depth - 1)
+            separator = ITEM_SEPARATOR
+        yield ']'
+    else:
+        yield _encode(obj)
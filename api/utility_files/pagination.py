@@ -0,0 +1,138 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Keyset (cursor) pagination helpers for list endpoints.
+Pages are ordered by (sort field, pk) and the cursor carries the last row's values, so every page costs
+one index range scan no matter how deep the client has paged.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from django.db.models import Q
+from api.utility_files.api_call import get_body_data
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+DEFAULT_SORT = "-created_at"
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def is_paginated_request(request) -> bool:
+    """
+    Pagination is opt-in so that clients which still expect the full listing keep working.
+    :param request: DRF request object
+    :return: Whether the caller asked for a page
+    """
+    return "limit" in request.data or "cursor" in request.data
+
+
+def get_page_params(request, allowed_sorts, default_sort=DEFAULT_SORT) -> dict:
+    """
+    Reads and validates the paging parameters from the request body.
+    :param request: DRF request object
+    :param allowed_sorts: Field names the caller may sort on (prefix with "-" for descending)
+    :param default_sort: Sort used when the caller does not pick one
+    :return: Keyword arguments for paginate_keyset
+    """
+    sort = get_body_data(request, "sort", "") or default_sort
+    if not isinstance(sort, str) or sort.lstrip("-") not in allowed_sorts:
+        raise PaginationError(f"Unsupported sort key: {sort}")
+    try:
+        limit = int(get_body_data(request, "limit", DEFAULT_PAGE_SIZE) or DEFAULT_PAGE_SIZE)
+    except (TypeError, ValueError):
+        raise PaginationError("limit must be an integer")
+    return {
+        "sort": sort,
+        "cursor": get_body_data(request, "cursor", "") or None,
+        "limit": max(1, min(limit, MAX_PAGE_SIZE)),
+    }
+
+
+def _to_json_value(value):
+    # datetime.isoformat keeps microseconds, which the cursor needs for an exact boundary
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(sort: str, value, pk) -> str:
+    raw = json.dumps([sort, _to_json_value(value), pk], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor: str, sort: str):
+    """
+    :param cursor: Cursor string previously returned as next_cursor
+    :param sort: Sort the current request uses; a cursor is only valid for the sort that produced it
+    :return: (sort field value, pk)
+    """
+    if not isinstance(cursor, str):
+        raise PaginationError("Invalid cursor")
+    try:
+        cursor_sort, value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")).decode("utf-8"))
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise PaginationError("Invalid cursor")
+    if cursor_sort != sort:
+        raise PaginationError("Cursor does not match the requested sort")
+    return value, pk
+
+
+def paginate_keyset(queryset, sort=DEFAULT_SORT, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Returns one page of the queryset ordered by (sort field, pk).
+    :param queryset: Base queryset (any prefetches are applied to the page only); a .values() queryset must
+                     include the sort field and the pk
+    :param sort: Sort field, prefixed with "-" for descending order
+    :param cursor: Cursor of the previous page, or None for the first page
+    :param limit: Page size
+    :return: (list of rows, next cursor or None)
+    """
+    descending = sort.startswith("-")
+    field_name = sort.lstrip("-")
+    prefix = "-" if descending else ""
+    queryset = queryset.order_by(f"{prefix}{field_name}", f"{prefix}pk")
+
+    if cursor:
+        value, pk = decode_cursor(cursor, sort)
+        try:
+            value = queryset.model._meta.get_field(field_name).to_python(value)
+        except Exception:
+            raise PaginationError("Invalid cursor")
+        lookup = "lt" if descending else "gt"
+        queryset = queryset.filter(
+            Q(**{f"{field_name}__{lookup}": value}) | Q(**{field_name: value, f"pk__{lookup}": pk})
+        )
+
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    if isinstance(last, dict):
+        return rows, encode_cursor(sort, last[field_name], last[queryset.model._meta.pk.attname])
+    return rows, encode_cursor(sort, getattr(last, field_name), last.pk)
+
+
+def paginate_ranked(ids, cursor=None, limit=DEFAULT_PAGE_SIZE, sort="relevance"):
+    """
+    Pages an already ranked list of ids (e.g. search results). The cursor is the position in that list.
+    :param ids: Ranked ids
+    :param cursor: Cursor of the previous page, or None for the first page
+    :param limit: Page size
+    :param sort: Name of the ranking, stored in the cursor
+    :return: (ids of the page, next cursor or None)
+    """
+    offset = 0
+    if cursor:
+        offset, _ = decode_cursor(cursor, sort)
+        if not isinstance(offset, int) or offset < 0:
+            raise PaginationError("Invalid cursor")
+    page = ids[offset:offset + limit]
+    next_offset = offset + limit
+    return page, (encode_cursor(sort, next_offset, None) if next_offset < len(ids) else None)
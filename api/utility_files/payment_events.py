@@ -0,0 +1,287 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Payment gateway webhooks.
+The webhook endpoints verify the delivery, append it to the PaymentWebhookEvent inbox with a single INSERT (provider
+redeliveries are dropped by the unique (provider, event_id) constraint) and acknowledge at once. reconcile_events(),
+run by the reconcile_payment_events command, applies pending events in batches: every batch costs a fixed number of
+queries (read events, read the affected orders, one bulk update per table) whatever its size.
+Razorpay deliveries are verified on arrival (HMAC of the raw body); PayPal deliveries can only be verified through
+PayPal's API, so that call is made by the reconciler rather than on the webhook's request path. A batch is claimed
+with a lease in one short transaction, verified with no transaction open, and applied in a second short transaction,
+so no row lock is held across the PayPal round trips.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from api.models import Orders, PaymentWebhookEvent, PaypalOrder, PrepareOrder
+import hashlib
+import hmac
+import json
+import logging
+import requests
+
+logger = logging.getLogger('apicall')
+
+RAZORPAY_WEBHOOK_SECRET = getattr(settings, 'RAZORPAY_WEBHOOK_SECRET', None)
+PAYPAL_WEBHOOK_ID = getattr(settings, 'PAYPAL_WEBHOOK_ID', None)
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 30  # seconds before the first retry of an event, doubled for every further attempt
+# Seconds a claimed batch is hidden from other reconcilers; a batch not applied by then is claimed again
+CLAIM_LEASE = 300
+
+# PayPal delivery headers required by /v1/notifications/verify-webhook-signature
+PAYPAL_VERIFICATION_HEADERS = {
+    'PAYPAL-AUTH-ALGO': 'auth_algo',
+    'PAYPAL-CERT-URL': 'cert_url',
+    'PAYPAL-TRANSMISSION-ID': 'transmission_id',
+    'PAYPAL-TRANSMISSION-SIG': 'transmission_sig',
+    'PAYPAL-TRANSMISSION-TIME': 'transmission_time',
+}
+
+PAYMENT_STATUS_RANK = {status: rank for rank, (status, _) in enumerate(PrepareOrder.PAYMENT_STATUS_CHOICES)}
+
+# Orders status set when the payment reaches a payment status; only orders still in these statuses are moved
+ORDER_STATUS_FOR_PAYMENT = {
+    'paid': ('processing', ('pending',)),
+    'refunded': ('refunded', ('pending', 'processing', 'cancelled')),
+}
+
+
+class InvalidWebhook(Exception):
+    pass
+
+
+def verify_razorpay_signature(body: bytes, signature: str) -> bool:
+    """
+    :param body: Raw request body
+    :param signature: X-Razorpay-Signature header (hex HMAC-SHA256 of the body with the webhook secret)
+    """
+    if not RAZORPAY_WEBHOOK_SECRET or not signature:
+        return False
+    expected = hmac.new(RAZORPAY_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def record_event(provider: str, event_id: str, event_type: str, payload: dict, headers: dict = None) -> None:
+    """Appends one delivery to the inbox; a redelivery of a stored event is a no-op. Runs a single INSERT."""
+    PaymentWebhookEvent.objects.bulk_create(
+        [PaymentWebhookEvent(provider=provider, event_id=event_id[:128], event_type=event_type[:64],
+                             payload=payload, headers=headers)],
+        ignore_conflicts=True,
+    )
+
+
+def ingest_razorpay(body: bytes, signature: str, event_id: str = None) -> None:
+    """
+    :param body: Raw request body
+    :param signature: X-Razorpay-Signature header
+    :param event_id: X-Razorpay-Event-Id header (falls back to a digest of the body)
+    :raise InvalidWebhook: Bad signature or body
+    """
+    if not verify_razorpay_signature(body, signature):
+        raise InvalidWebhook("Invalid signature")
+    try:
+        payload = json.loads(body)
+        event_type = payload['event']
+    except (ValueError, KeyError, TypeError):
+        raise InvalidWebhook("Invalid body")
+    record_event('razorpay', event_id or hashlib.sha256(body).hexdigest(), event_type, payload)
+
+
+def ingest_paypal(body: bytes, headers) -> None:
+    """
+    :param body: Raw request body
+    :param headers: Request headers; the PAYPAL-* verification headers are kept for the reconciler
+    :raise InvalidWebhook: Missing verification headers or bad body
+    """
+    if not PAYPAL_WEBHOOK_ID:
+        raise InvalidWebhook("PayPal webhooks are not configured")
+    stored_headers = {name: headers.get(name) for name in PAYPAL_VERIFICATION_HEADERS}
+    if not all(stored_headers.values()):
+        raise InvalidWebhook("Missing PayPal transmission headers")
+    try:
+        payload = json.loads(body)
+        event_id, event_type = payload['id'], payload['event_type']
+    except (ValueError, KeyError, TypeError):
+        raise InvalidWebhook("Invalid body")
+    record_event('paypal', event_id, event_type, payload, stored_headers)
+
+
+def verify_paypal_event(event) -> bool:
+    """
+    Asks PayPal whether a stored delivery is genuine.
+    :return: False only when PayPal answered and rejected the signature
+    :raise requests.RequestException: PayPal did not answer with 200 (outage, rate limit, ...); the event is retried
+    """
+    from api.utility_files import paypal
+
+    verification = {field: event.headers.get(header) for header, field in PAYPAL_VERIFICATION_HEADERS.items()}
+    response = paypal.post('/v1/notifications/verify-webhook-signature',
+                           json={**verification, 'webhook_id': PAYPAL_WEBHOOK_ID, 'webhook_event': event.payload})
+    if response.status_code != 200:
+        raise requests.HTTPError(f"PayPal verification returned {response.status_code}", response=response)
+    return response.json().get('verification_status') == 'SUCCESS'
+
+
+def parse_event(event):
+    """
+    Reduces an event to the change it asks for.
+    :return: (order id, payment status, payment id, PayPal order status) or None for events we do not track.
+             Any of the last three may be None.
+    """
+    payload = event.payload
+    if event.provider == 'razorpay':
+        entities = payload.get('payload', {})
+        payment = entities.get('payment', {}).get('entity', {})
+        order_id = payment.get('order_id') or entities.get('order', {}).get('entity', {}).get('id')
+        status = {
+            'payment.captured': 'paid',
+            'order.paid': 'paid',
+            'payment.failed': 'failed',
+            'refund.processed': 'refunded',
+        }.get(event.event_type)
+        if not status or not order_id:
+            return None
+        return order_id, status, payment.get('id'), None
+
+    resource = payload.get('resource', {})
+    if event.event_type == 'CHECKOUT.ORDER.APPROVED':
+        return resource.get('id'), None, None, 'APPROVED'
+    order_id = resource.get('supplementary_data', {}).get('related_ids', {}).get('order_id')
+    status = {
+        'PAYMENT.CAPTURE.COMPLETED': ('paid', 'COMPLETED'),
+        'PAYMENT.CAPTURE.DENIED': ('failed', None),
+        'PAYMENT.CAPTURE.DECLINED': ('failed', None),
+        'PAYMENT.CAPTURE.REFUNDED': ('refunded', None),
+    }.get(event.event_type)
+    if not status or not order_id:
+        return None
+    return order_id, status[0], resource.get('id'), status[1]
+
+
+def _fail(event, error):
+    event.attempts += 1
+    event.last_error = str(error)[:255]
+    if event.attempts >= MAX_ATTEMPTS:
+        event.status = 'failed'
+    else:
+        event.available_at = timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (event.attempts - 1))
+
+
+def apply_events(events) -> None:
+    """
+    Applies a batch of events to PrepareOrder, PaypalOrder and Orders and sets each event's outcome in memory.
+    Payment statuses only move forward (created < failed < paid < refunded), so late or out of order deliveries
+    cannot undo a later state.
+    """
+    now = timezone.now()
+    changes = {}
+    for event in events:
+        change = parse_event(event)
+        if change is None:
+            event.status, event.processed_at = 'ignored', now
+            continue
+        changes.setdefault(change[0], []).append((event, change))
+
+    prepare_orders = PrepareOrder.objects.in_bulk(list(changes))
+    paypal_orders = {order.order_id: order for order in PaypalOrder.objects.filter(order_id__in=list(changes))}
+    orders = {order.order_ref_id: order for order in Orders.objects.filter(order_ref_id__in=list(changes))}
+    dirty_prepare, dirty_paypal, dirty_orders = {}, {}, {}
+
+    for order_id, order_changes in changes.items():
+        prepare_order = prepare_orders.get(order_id)
+        paypal_order = paypal_orders.get(order_id)
+        for event, (_, payment_status, payment_id, paypal_status) in order_changes:
+            if prepare_order is None and paypal_order is None:
+                # The webhook may arrive before the order is stored; try again in a later batch
+                _fail(event, f"Unknown order {order_id}")
+                continue
+            if payment_status and prepare_order is not None:
+                if PAYMENT_STATUS_RANK[payment_status] > PAYMENT_STATUS_RANK[prepare_order.payment_status]:
+                    prepare_order.payment_status = payment_status
+                    if payment_status == 'paid':
+                        prepare_order.paid_at = now
+                    prepare_order.updated_at = now
+                    dirty_prepare[order_id] = prepare_order
+                if payment_id and payment_status == 'paid':
+                    prepare_order.payment_id = payment_id
+                    dirty_prepare[order_id] = prepare_order
+            if paypal_status and paypal_order is not None and paypal_order.status != 'COMPLETED':
+                paypal_order.status = paypal_status
+                paypal_order.updated_at = now
+                dirty_paypal[order_id] = paypal_order
+            event.status, event.processed_at = 'processed', now
+
+        order = orders.get(order_id)
+        if prepare_order is not None and order is not None:
+            target = ORDER_STATUS_FOR_PAYMENT.get(prepare_order.payment_status)
+            if target and order.status in target[1] and order.status != target[0]:
+                order.status = target[0]
+                dirty_orders[order_id] = order
+
+    if dirty_prepare:
+        PrepareOrder.objects.bulk_update(dirty_prepare.values(), ["payment_status", "payment_id", "paid_at", "updated_at"])
+    if dirty_paypal:
+        PaypalOrder.objects.bulk_update(dirty_paypal.values(), ["status", "updated_at"])
+    if dirty_orders:
+        Orders.objects.bulk_update(dirty_orders.values(), ["status"])
+
+
+def claim_events(batch_size: int):
+    """
+    Takes a batch of pending events for this reconciler by moving their available_at to a lease expiry.
+    :return: (events, lease); the events are still 'pending' and are ours while their available_at equals lease
+    """
+    with transaction.atomic():
+        # skip_locked: several reconcilers can claim side by side without waiting on each other
+        events = list(
+            PaymentWebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', available_at__lte=timezone.now()).order_by('available_at')[:batch_size]
+        )
+        lease = timezone.now() + timedelta(seconds=CLAIM_LEASE)
+        if events:
+            PaymentWebhookEvent.objects.filter(pk__in=[event.pk for event in events]).update(available_at=lease)
+    return events, lease
+
+
+def reconcile_events(batch_size: int = 200) -> int:
+    """
+    Applies one batch of pending events.
+    :param batch_size: Events read per batch
+    :return: Number of events taken from the inbox (0 when it is empty)
+    """
+    claimed, lease = claim_events(batch_size)
+    if not claimed:
+        return 0
+
+    # PayPal calls are made with no transaction open; outcomes are kept by event id until the apply step
+    rejected, errors = set(), {}
+    for event in claimed:
+        if event.provider != 'paypal':
+            continue
+        try:
+            if not verify_paypal_event(event):
+                rejected.add(event.pk)
+        except requests.RequestException as e:
+            errors[event.pk] = e
+
+    with transaction.atomic():
+        # Events whose lease ran out meanwhile may have been claimed again; they are left to that reconciler
+        events = list(PaymentWebhookEvent.objects.select_for_update()
+                      .filter(pk__in=[event.pk for event in claimed], status='pending', available_at=lease)
+                      .order_by('pk'))
+        verified = []
+        for event in events:
+            if event.pk in errors:
+                _fail(event, errors[event.pk])
+            elif event.pk in rejected:
+                event.status, event.last_error = 'failed', 'Signature verification failed'
+            else:
+                verified.append(event)
+        apply_events(verified)
+
+        PaymentWebhookEvent.objects.bulk_update(
+            events, ["status", "attempts", "last_error", "available_at", "processed_at"])
+    return len(claimed)
@@ -0,0 +1,74 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: PayPal REST client.
+Calls go through the "paypal" dependency (pooled connections, timeouts, retries, circuit breaker), and the OAuth
+access token (valid for hours) is cached and shared by all workers instead of being requested again for every order.
+Every call carries a PayPal-Request-Id, so PayPal treats a retried POST as the same request.
+apost() is the same call for async views.
+"""
+from django.conf import settings
+from requests.auth import HTTPBasicAuth
+from api.utility_files import async_http, http_client, resilience
+import requests
+import uuid
+
+PAYPAL_API_BASE = getattr(settings, 'PAYPAL_API_BASE', 'https://api-m.sandbox.paypal.com')
+
+
+class PaypalTokenError(Exception):
+    pass
+
+
+def _fetch_access_token():
+    """:return: (access token, lifetime in seconds) straight from PayPal"""
+    try:
+        response = resilience.post(
+            'paypal',
+            f"{PAYPAL_API_BASE}/v1/oauth2/token",
+            data={"grant_type": "client_credentials"},
+            auth=HTTPBasicAuth(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_SECRET_KEY),
+        )
+    except requests.RequestException as e:
+        raise PaypalTokenError(str(e)) from e
+    if response.status_code != 200:
+        raise PaypalTokenError(f"PayPal token request failed with {response.status_code}")
+    data = response.json()
+    return data['access_token'], data.get('expires_in', 0)
+
+
+access_token = http_client.TokenCache('paypal', _fetch_access_token)
+
+
+def _headers(kwargs) -> dict:
+    return {"Content-Type": "application/json", "PayPal-Request-Id": str(uuid.uuid4()), **kwargs.pop('headers', {})}
+
+
+def post(path: str, **kwargs) -> requests.Response:
+    """
+    Sends an authenticated POST to the PayPal API. A 401 means the cached token was revoked or expired early, so it
+    is dropped and the call is made once more with a fresh token.
+    :param path: API path, e.g. /v2/checkout/orders
+    :param kwargs: requests keyword arguments
+    :return: requests.Response
+    :raise PaypalTokenError: When no access token can be obtained
+    :raise requests.RequestException: On connection errors, timeouts and while the circuit is open
+    """
+    headers = _headers(kwargs)
+    for attempt in range(2):
+        headers["Authorization"] = f"Bearer {access_token.get()}"
+        response = resilience.post('paypal', f"{PAYPAL_API_BASE}{path}", headers=headers, **kwargs)
+        if response.status_code != 401 or attempt:
+            return response
+        access_token.invalidate()
+
+
+async def apost(path: str, **kwargs) -> async_http.Response:
+    """post() for async views."""
+    headers = _headers(kwargs)
+    for attempt in range(2):
+        headers["Authorization"] = f"Bearer {await access_token.aget()}"
+        response = await resilience.apost('paypal', f"{PAYPAL_API_BASE}{path}", headers=headers, **kwargs)
+        if response.status_code != 401 or attempt:
+            return response
+        await access_token.ainvalidate()
@@ -0,0 +1,152 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Server-side filters and facet counts for the product listings.
+Filters: price range, brands, minimum rating, in stock. Facet counts (per brand, per subcategory, per price bucket)
+come from a single grouped aggregate over (brand, category, price bucket, inside the price range), folded in Python.
+Every facet ignores its own filter and applies the others, so a client can offer the alternatives of a filter that
+is already set (e.g. other brands) with their counts.
+"""
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db.models import BooleanField, Case, Count, Exists, IntegerField, OuterRef, Q, Value, When
+from api.models import ProductVariant
+from api.utility_files.api_call import get_body_data
+
+# Upper bounds of the price buckets; the last bucket has no upper bound
+PRICE_BUCKETS = tuple(getattr(settings, 'CATALOG_PRICE_BUCKETS', (500, 1000, 2000, 5000)))
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _decimal(request, key, minimum=None, maximum=None):
+    value = get_body_data(request, key, None)
+    if value in (None, ""):
+        return None
+    try:
+        value = Decimal(str(value))
+    except InvalidOperation:
+        raise FilterError(f"{key} must be a number")
+    if not value.is_finite() or (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise FilterError(f"{key} is out of range")
+    return value
+
+
+def get_filters(request) -> dict:
+    """
+    Reads the listing filters from the request body: min_price, max_price, brand_ids (list of brand ids),
+    min_rating (0-5) and in_stock (true/false). Missing keys do not filter.
+    :raise FilterError: When a value is malformed
+    """
+    brand_ids = get_body_data(request, "brand_ids", None) or []
+    if not isinstance(brand_ids, list):
+        brand_ids = [brand_ids]
+    try:
+        brand_ids = sorted({int(brand_id) for brand_id in brand_ids})
+    except (TypeError, ValueError):
+        raise FilterError("brand_ids must be a list of brand ids")
+    filters = {
+        "min_price": _decimal(request, "min_price", minimum=0),
+        "max_price": _decimal(request, "max_price", minimum=0),
+        "brand_ids": brand_ids,
+        "min_rating": _decimal(request, "min_rating", minimum=0, maximum=5),
+        "in_stock": get_body_data(request, "in_stock", False) in (True, 1, "true", "1"),
+    }
+    if filters["min_price"] is not None and filters["max_price"] is not None \
+            and filters["min_price"] > filters["max_price"]:
+        raise FilterError("min_price is greater than max_price")
+    return filters
+
+
+def cache_key_parts(filters) -> tuple:
+    """:return: The filters as a JSON-serializable tuple for catalog cache keys"""
+    return tuple(str(filters[key]) for key in ("min_price", "max_price", "brand_ids", "min_rating", "in_stock"))
+
+
+def _price_q(filters) -> Q:
+    q = Q()
+    if filters["min_price"] is not None:
+        q &= Q(price__gte=filters["min_price"])
+    if filters["max_price"] is not None:
+        q &= Q(price__lte=filters["max_price"])
+    return q
+
+
+def apply_base_filters(queryset, filters):
+    """Filters that are not facets: active products, minimum rating, in stock."""
+    queryset = queryset.filter(is_active=True)
+    if filters["min_rating"] is not None:
+        queryset = queryset.filter(rating_avg__gte=filters["min_rating"])
+    if filters["in_stock"]:
+        # Products sold through variants keep their stock on the variants
+        queryset = queryset.filter(
+            Q(stock__gt=0) | Exists(ProductVariant.objects.filter(product=OuterRef("pk"), stock__gt=0)))
+    return queryset
+
+
+def apply_facet_filters(queryset, filters, category_ids=None):
+    """
+    Filters that are also facets.
+    :param category_ids: Categories chosen by the subcategory filter, None for no category filter
+    """
+    if category_ids is not None:
+        queryset = queryset.filter(category__in=category_ids)
+    if filters["brand_ids"]:
+        queryset = queryset.filter(brand_id__in=filters["brand_ids"])
+    return queryset.filter(_price_q(filters))
+
+
+def _bucket_bounds():
+    lower = (0,) + PRICE_BUCKETS
+    upper = PRICE_BUCKETS + (None,)
+    return list(zip(lower, upper))
+
+
+def facet_counts(base, filters, facet_nodes, category_ids=None) -> dict:
+    """
+    Counts the products of base per brand, per subcategory and per price bucket in one grouped query.
+    :param base: Products queryset with apply_base_filters applied (no facet filters)
+    :param filters: get_filters() result
+    :param facet_nodes: CategoryNodes offered as subcategory facets; products count under the node they are below
+    :param category_ids: Categories chosen by the subcategory filter, None for no category filter
+    :return: {"brands": [{id, name, count}], "subcategories": [{id, name, count}],
+              "price_buckets": [{min, max, count}]}
+    """
+    facet_of = {category_id: node for node in facet_nodes for category_id in node.descendant_ids}
+    price_q = _price_q(filters)
+    rows = (
+        base.annotate(
+            price_bucket=Case(
+                *[When(price__lt=bound, then=Value(index)) for index, bound in enumerate(PRICE_BUCKETS)],
+                default=Value(len(PRICE_BUCKETS)), output_field=IntegerField(),
+            ),
+            in_price_range=Case(When(price_q, then=Value(True)), default=Value(False), output_field=BooleanField())
+            if price_q else Value(True, output_field=BooleanField()),
+        )
+        .values("brand_id", "brand__brand_name", "category_id", "price_bucket", "in_price_range")
+        .annotate(products=Count("id"))
+        .order_by()
+    )
+
+    brand_ids = set(filters["brand_ids"])
+    brands, subcategories, buckets = {}, {node.id: 0 for node in facet_nodes}, [0] * (len(PRICE_BUCKETS) + 1)
+    for row in rows:
+        brand_ok = not brand_ids or row["brand_id"] in brand_ids
+        category_ok = category_ids is None or row["category_id"] in category_ids
+        if category_ok and row["in_price_range"] and row["brand_id"] is not None:
+            entry = brands.setdefault(row["brand_id"], {"id": row["brand_id"], "name": row["brand__brand_name"],
+                                                        "count": 0})
+            entry["count"] += row["products"]
+        if brand_ok and row["in_price_range"] and row["category_id"] in facet_of:
+            subcategories[facet_of[row["category_id"]].id] += row["products"]
+        if brand_ok and category_ok:
+            buckets[row["price_bucket"]] += row["products"]
+
+    return {
+        "brands": sorted(brands.values(), key=lambda entry: (-entry["count"], entry["name"])),
+        "subcategories": [{"id": node.id, "name": node.name, "count": subcategories[node.id]} for node in facet_nodes],
+        "price_buckets": [{"min": low, "max": high, "count": count}
+                          for (low, high), count in zip(_bucket_bounds(), buckets)],
+    }
@@ -0,0 +1,245 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Per-request ORM instrumentation.
+Every SQL statement goes through a connection.execute_wrapper that records its count, duration, database alias and a
+fingerprint (the statement with its literals removed). A fingerprint executed again and again within one request is
+the signature of an N+1. QueryMetricsMiddleware collects the numbers for each request and aggregates them per view;
+query_budget() lets tests pin the number of queries an endpoint may run.
+"""
+from asgiref.sync import sync_to_async
+from collections import Counter
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger('query_metrics')
+
+# A statement repeated this many times in one request is reported as a probable N+1
+DUPLICATE_THRESHOLD = getattr(settings, 'QUERY_METRICS_DUPLICATE_THRESHOLD', 3)
+
+_FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+)
+
+_current_stats = ContextVar('query_metrics_stats', default=None)
+
+
+def fingerprint(sql: str) -> str:
+    """
+    Function to reduce a statement to its shape, e.g. "... WHERE id = 12" and "... WHERE id = 13" are the same query.
+    :param sql: SQL statement
+    :return: Normalized statement
+    """
+    for pattern, replacement in _FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class QueryStats:
+    """Numbers collected for one request (or one query_budget block)."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.serialization_time = 0.0
+        self.by_alias = Counter()
+        self.time_by_alias = Counter()
+        self.fingerprints = Counter()
+
+    def record(self, sql, alias, duration):
+        self.count += 1
+        self.duration += duration
+        self.by_alias[alias] += 1
+        self.time_by_alias[alias] += duration
+        self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicate_count(self) -> int:
+        """Statements that repeated an earlier statement of the same shape."""
+        return sum(count - 1 for count in self.fingerprints.values() if count > 1)
+
+    def repeated(self, threshold: int = DUPLICATE_THRESHOLD) -> list:
+        """:return: [(fingerprint, count)] for statements executed at least threshold times, most frequent first"""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count >= threshold]
+
+    def as_dict(self) -> dict:
+        return {
+            "queries": self.count,
+            "db_time_ms": round(self.duration * 1000, 2),
+            "serialization_time_ms": round(self.serialization_time * 1000, 2),
+            "duplicates": self.duplicate_count,
+            "by_alias": dict(self.by_alias),
+        }
+
+
+class _QueryRecorder:
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.stats.record(sql, context['connection'].alias, time.perf_counter() - started)
+
+
+def get_current_stats():
+    """:return: QueryStats of the block being collected, or None"""
+    return _current_stats.get()
+
+
+@contextmanager
+def collect_queries():
+    """
+    Records every statement run on any database alias inside the block.
+    :return: QueryStats, filled in as the block runs
+    """
+    stats = QueryStats()
+    recorder = _QueryRecorder(stats)
+    token = _current_stats.set(stats)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@asynccontextmanager
+async def acollect_queries():
+    """
+    collect_queries() for async requests. Their ORM calls run on the request's sync_to_async thread (one per request
+    under ASGI), so the recorder is installed on that thread's connections.
+    :return: QueryStats, filled in as the block runs
+    """
+    stats = QueryStats()
+    recorder = _QueryRecorder(stats)
+    token = _current_stats.set(stats)
+    stack = ExitStack()
+
+    def install():
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+    try:
+        await sync_to_async(install)()
+        try:
+            yield stats
+        finally:
+            await sync_to_async(stack.close)()
+    finally:
+        _current_stats.reset(token)
+
+
+@contextmanager
+def measure_serialization():
+    """Adds the time spent in the block to the current request's serialization time."""
+    stats = _current_stats.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialization_time += time.perf_counter() - started
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries: int, max_duplicates: int = None):
+    """
+    Test helper: fails when the block runs more queries than the endpoint's budget.
+    e.g. with query_budget(GetWishListView.query_budget): ...
+    :param max_queries: Largest allowed number of statements
+    :param max_duplicates: Largest allowed number of repeated statements (None to skip the check)
+    """
+    with collect_queries() as stats:
+        yield stats
+    problems = []
+    if stats.count > max_queries:
+        problems.append(f"{stats.count} queries, budget is {max_queries}")
+    if max_duplicates is not None and stats.duplicate_count > max_duplicates:
+        problems.append(f"{stats.duplicate_count} repeated queries, budget is {max_duplicates}")
+    if problems:
+        repeated = "\n".join(f"  {count}x {sql}" for sql, count in stats.repeated(2))
+        raise QueryBudgetExceeded("; ".join(problems) + (f"\nRepeated statements:\n{repeated}" if repeated else ""))
+
+
+class EndpointMetrics:
+    """Running totals per view, kept in process memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._aliases = {}
+
+    def add(self, endpoint: str, stats: QueryStats, view_time: float) -> None:
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {
+                "requests": 0, "queries": 0, "max_queries": 0, "duplicates": 0, "db_time": 0.0,
+                "serialization_time": 0.0, "view_time": 0.0, "by_alias": Counter(),
+            })
+            entry["requests"] += 1
+            entry["queries"] += stats.count
+            entry["max_queries"] = max(entry["max_queries"], stats.count)
+            entry["duplicates"] += stats.duplicate_count
+            entry["db_time"] += stats.duration
+            entry["serialization_time"] += stats.serialization_time
+            entry["view_time"] += view_time
+            entry["by_alias"].update(stats.by_alias)
+            for alias, count in stats.by_alias.items():
+                alias_entry = self._aliases.setdefault(alias, {"queries": 0, "db_time": 0.0})
+                alias_entry["queries"] += count
+                alias_entry["db_time"] += stats.time_by_alias[alias]
+
+    def snapshot(self) -> dict:
+        """:return: Per-endpoint averages and maxima"""
+        with self._lock:
+            result = {}
+            for endpoint, entry in self._endpoints.items():
+                requests = entry["requests"]
+                result[endpoint] = {
+                    "requests": requests,
+                    "avg_queries": round(entry["queries"] / requests, 2),
+                    "max_queries": entry["max_queries"],
+                    "avg_duplicates": round(entry["duplicates"] / requests, 2),
+                    "avg_db_time_ms": round(entry["db_time"] * 1000 / requests, 2),
+                    "avg_serialization_time_ms": round(entry["serialization_time"] * 1000 / requests, 2),
+                    "avg_view_time_ms": round(entry["view_time"] * 1000 / requests, 2),
+                    "by_alias": dict(entry["by_alias"]),
+                }
+            return result
+
+    def alias_snapshot(self) -> dict:
+        """:return: Query totals per database alias over all endpoints"""
+        with self._lock:
+            return {
+                alias: {
+                    "queries": entry["queries"],
+                    "avg_db_time_ms": round(entry["db_time"] * 1000 / entry["queries"], 2) if entry["queries"] else 0,
+                }
+                for alias, entry in self._aliases.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+            self._aliases.clear()
+
+
+endpoint_metrics = EndpointMetrics()
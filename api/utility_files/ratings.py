@@ -0,0 +1,94 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Per-product review aggregates (average, count and 1-5 star histogram) stored on Product.
+Review signals move one review in or out of its product's histogram under a row lock, so a review change costs
+two queries (plus one to read the old rating of an edited review) however many reviews the product has. recompute_product_ratings() rebuilds the
+aggregates from the Review table in bulk (recompute_product_ratings command) to repair any drift, e.g. after
+reviews were changed with queryset.update() or raw SQL, which sends no signals.
+Ratings outside 1-5 are not counted.
+"""
+from collections import Counter
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import transaction
+from django.db.models import Count
+from api.models import Product, Review
+
+RATING_VALUES = (1, 2, 3, 4, 5)
+HISTOGRAM_FIELDS = tuple(f"rating_{value}" for value in RATING_VALUES)
+RATING_FIELDS = ("rating_avg", "rating_count") + HISTOGRAM_FIELDS
+
+
+def rating_fields(histogram) -> dict:
+    """
+    :param histogram: {rating: number of reviews}
+    :return: Values of RATING_FIELDS for that histogram
+    """
+    counts = {value: histogram.get(value, 0) for value in RATING_VALUES}
+    count = sum(counts.values())
+    average = Decimal(sum(value * counts[value] for value in RATING_VALUES)) / count if count else Decimal(0)
+    return {
+        "rating_avg": average.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
+        "rating_count": count,
+        **{f"rating_{value}": counts[value] for value in RATING_VALUES},
+    }
+
+
+def rating_histogram(product) -> dict:
+    """:return: {"1": count, ..., "5": count} for a product (model instance or .values() row)"""
+    get = product.get if isinstance(product, dict) else lambda field: getattr(product, field)
+    return {str(value): get(f"rating_{value}") for value in RATING_VALUES}
+
+
+def apply_review_change(product_id, added=None, removed=None) -> None:
+    """
+    Updates a product's aggregates for one review change.
+    :param product_id: Product the review belongs to
+    :param added: Rating counted in (new review, or the new value of an edited rating)
+    :param removed: Rating counted out (deleted review, or the old value of an edited rating)
+    """
+    delta = Counter()
+    if added in RATING_VALUES:
+        delta[added] += 1
+    if removed in RATING_VALUES:
+        delta[removed] -= 1
+    if not any(delta.values()):
+        return
+    with transaction.atomic():
+        # The lock serializes concurrent reviews of the same product
+        current = Product.objects.select_for_update().filter(pk=product_id).values(*HISTOGRAM_FIELDS).first()
+        if current is None:
+            return
+        histogram = {value: max(0, current[f"rating_{value}"] + delta[value]) for value in RATING_VALUES}
+        Product.objects.filter(pk=product_id).update(**rating_fields(histogram))
+
+
+def recompute_product_ratings(queryset=None, batch_size: int = 500) -> int:
+    """
+    Rebuilds the aggregates of many products from their reviews, one grouped query and one bulk update per batch.
+    :param queryset: Products to recompute (all products by default)
+    :param batch_size: Number of products handled per transaction
+    :return: Number of products recomputed
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            # Same lock as apply_review_change, so no review change lands between the count and the write
+            batch_ids = list(Product.objects.select_for_update().filter(pk__in=ids[start:start + batch_size])
+                             .order_by("pk").values_list("pk", flat=True))
+            histograms = {product_id: {} for product_id in batch_ids}
+            rows = (Review.objects.filter(product_id__in=batch_ids, rating__in=RATING_VALUES)
+                    .values("product_id", "rating").annotate(reviews=Count("id")).order_by())
+            for row in rows:
+                histograms[row["product_id"]][row["rating"]] = row["reviews"]
+
+            products = []
+            for product_id, histogram in histograms.items():
+                product = Product(pk=product_id)
+                for field, value in rating_fields(histogram).items():
+                    setattr(product, field, value)
+                products.append(product)
+            Product.objects.bulk_update(products, RATING_FIELDS)
+    return len(ids)
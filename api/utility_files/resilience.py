@@ -0,0 +1,312 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Fault handling for calls to third-party providers (Razorpay, PayPal, videosdk).
+Each provider is a Dependency with its own timeout, a bounded number of retries with jittered exponential backoff
+and a circuit breaker. After failure_threshold consecutive failures (connection errors, timeouts, 5xx) the circuit
+opens and calls fail immediately with CircuitOpenError instead of tying up a worker; after reset_timeout seconds a
+single probe call is let through (half-open) and its outcome closes or re-opens the circuit.
+Non-idempotent calls are only retried when the request never reached the provider, unless the dependency sets
+retry_unsafe (the provider de-duplicates retries, e.g. PayPal-Request-Id).
+Async views call through the same Dependency (arequest), so both clients share one breaker and one set of counters.
+"""
+from collections import Counter
+from django.conf import settings
+from urllib3.exceptions import NewConnectionError
+from api.utility_files import async_http, http_client
+import asyncio
+import logging
+import random
+import requests
+import threading
+import time
+
+logger = logging.getLogger('apicall')
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+DEFAULT_POLICY = {
+    'timeout': http_client.DEFAULT_TIMEOUT,  # (connect, read) seconds
+    'retries': 2,
+    'backoff': 0.2,  # seconds, doubled per retry
+    'backoff_cap': 2.0,
+    'failure_threshold': 5,
+    'reset_timeout': 30,  # seconds the circuit stays open before a probe
+    'retry_unsafe': False,
+}
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised without calling the provider while its circuit is open."""
+
+    def __init__(self, name):
+        super().__init__(f"{name} is unavailable (circuit open)")
+        self.name = name
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float, on_change=None, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_change = on_change
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        previous, self.state = self.state, state
+        if self.on_change:
+            self.on_change(previous, state)
+
+    def allow(self) -> bool:
+        """:return: Whether a call may go to the provider now"""
+        with self._lock:
+            if self.state == OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    return False
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                # Only one probe at a time
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = self.clock()
+                self._set_state(OPEN)
+
+    def release(self) -> None:
+        """Ends a call that failed for reasons unrelated to the provider."""
+        with self._lock:
+            self._probing = False
+
+
+class DependencySession(http_client.TimeoutSession):
+    """Pooled session whose requests go through a Dependency (also usable as razorpay.Client(session=...))."""
+    dependency = None
+
+    def request(self, method, url, **kwargs):
+        send = lambda **options: super(DependencySession, self).request(method, url, **options)
+        return self.dependency.execute(method, send, **kwargs)
+
+
+def _not_sent(error) -> bool:
+    """:return: Whether the request failed before any byte reached the provider"""
+    if isinstance(error, (requests.exceptions.ConnectTimeout, async_http.NotSentError)):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class Dependency:
+    def __init__(self, name, timeout=DEFAULT_POLICY['timeout'], retries=DEFAULT_POLICY['retries'],
+                 backoff=DEFAULT_POLICY['backoff'], backoff_cap=DEFAULT_POLICY['backoff_cap'],
+                 failure_threshold=DEFAULT_POLICY['failure_threshold'],
+                 reset_timeout=DEFAULT_POLICY['reset_timeout'], retry_unsafe=DEFAULT_POLICY['retry_unsafe']):
+        self.name = name
+        self.timeout = tuple(timeout) if isinstance(timeout, (list, tuple)) else timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.retry_unsafe = retry_unsafe
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, on_change=self._state_changed)
+        self.session = http_client.new_session(DependencySession)
+        self.session.dependency = self
+        self._metrics_lock = threading.Lock()
+        self._metrics = Counter()
+        self._state_since = time.time()
+
+    def _count(self, key, amount=1):
+        with self._metrics_lock:
+            self._metrics[key] += amount
+
+    def _state_changed(self, previous, state):
+        self._state_since = time.time()
+        self._count(f"became_{state}")
+        log = logger.info if state == CLOSED else logger.warning
+        log(f"Circuit for {self.name}: {previous} -> {state}")
+
+    def _retryable(self, method, error) -> bool:
+        if self.retry_unsafe or method.upper() in IDEMPOTENT_METHODS:
+            return True
+        return error is not None and _not_sent(error)
+
+    def _backoff_delay(self, attempt) -> float:
+        # Full jitter: concurrent callers do not retry in lockstep
+        return random.uniform(0, min(self.backoff_cap, self.backoff * 2 ** (attempt - 1)))
+
+    def _finished(self, method, response, error, attempt) -> bool:
+        """
+        Records the outcome of one attempt.
+        :return: Whether the call ends here (success, retries exhausted or not retryable)
+        """
+        if error is None and response.status_code < 500:
+            self.breaker.record_success()
+            self._count('successes')
+            return True
+        self.breaker.record_failure()
+        self._count('failures')
+        if isinstance(error, requests.Timeout):
+            self._count('timeouts')
+        return attempt >= self.retries or not self._retryable(method, error)
+
+    def _allow_retry(self) -> bool:
+        if not self.breaker.allow():
+            self._count('short_circuits')
+            return False
+        self._count('retries')
+        return True
+
+    def _start(self, kwargs) -> None:
+        kwargs.setdefault('timeout', self.timeout)
+        if not self.breaker.allow():
+            self._count('short_circuits')
+            raise CircuitOpenError(self.name)
+
+    def execute(self, method, send, **kwargs):
+        """
+        Runs one logical call with timeout, retries and the circuit breaker.
+        :param method: HTTP method (decides whether failed attempts may be repeated)
+        :param send: Callable(**kwargs) -> requests.Response performing one attempt
+        :param kwargs: requests keyword arguments (timeout defaults to the dependency's timeout)
+        :return: requests.Response (a 5xx response once retries are exhausted)
+        :raise CircuitOpenError: While the circuit is open
+        :raise requests.RequestException: Last connection error or timeout once retries are exhausted
+        """
+        self._start(kwargs)
+        attempt = 0
+        while True:
+            self._count('calls')
+            response = error = None
+            try:
+                response = send(**kwargs)
+            except requests.RequestException as e:
+                error = e
+            except BaseException:
+                self.breaker.release()
+                raise
+            if self._finished(method, response, error, attempt):
+                break
+            attempt += 1
+            time.sleep(self._backoff_delay(attempt))
+            if not self._allow_retry():
+                break
+
+        if error is not None:
+            raise error
+        return response
+
+    async def aexecute(self, method, send, **kwargs):
+        """execute() for a coroutine send, e.g. async_http.request; backoff sleeps do not block the loop."""
+        self._start(kwargs)
+        attempt = 0
+        while True:
+            self._count('calls')
+            response = error = None
+            try:
+                response = await send(**kwargs)
+            except requests.RequestException as e:
+                error = e
+            except BaseException:
+                self.breaker.release()
+                raise
+            if self._finished(method, response, error, attempt):
+                break
+            attempt += 1
+            await asyncio.sleep(self._backoff_delay(attempt))
+            if not self._allow_retry():
+                break
+
+        if error is not None:
+            raise error
+        return response
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        return self.session.request(method, url, **kwargs)
+
+    async def arequest(self, method: str, url: str, **kwargs) -> async_http.Response:
+        send = lambda **options: async_http.request(method, url, **options)
+        return await self.aexecute(method, send, **kwargs)
+
+    def snapshot(self) -> dict:
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        return {
+            'state': self.breaker.state,
+            'state_since': self._state_since,
+            'consecutive_failures': self.breaker.failures,
+            **{key: metrics.get(key, 0) for key in ('calls', 'successes', 'failures', 'timeouts', 'retries',
+                                                   'short_circuits', f'became_{OPEN}', f'became_{HALF_OPEN}',
+                                                   f'became_{CLOSED}')},
+        }
+
+
+_dependencies = {}
+_dependencies_lock = threading.Lock()
+
+
+def get_dependency(name: str) -> Dependency:
+    """
+    :param name: Dependency name; its policy is DEFAULT_POLICY updated with settings.OUTBOUND_DEPENDENCIES[name]
+    :return: The process-wide Dependency (one breaker per provider per worker)
+    """
+    dependency = _dependencies.get(name)
+    if dependency is None:
+        with _dependencies_lock:
+            dependency = _dependencies.get(name)
+            if dependency is None:
+                policy = {**DEFAULT_POLICY, **getattr(settings, 'OUTBOUND_DEPENDENCIES', {}).get(name, {})}
+                dependency = _dependencies[name] = Dependency(name, **policy)
+    return dependency
+
+
+def session(name: str) -> requests.Session:
+    """:return: Pooled session routed through the named dependency"""
+    return get_dependency(name).session
+
+
+def request(name: str, method: str, url: str, **kwargs) -> requests.Response:
+    return get_dependency(name).request(method, url, **kwargs)
+
+
+def get(name: str, url: str, **kwargs) -> requests.Response:
+    return request(name, 'GET', url, **kwargs)
+
+
+def post(name: str, url: str, **kwargs) -> requests.Response:
+    return request(name, 'POST', url, **kwargs)
+
+
+async def arequest(name: str, method: str, url: str, **kwargs) -> async_http.Response:
+    return await get_dependency(name).arequest(method, url, **kwargs)
+
+
+async def aget(name: str, url: str, **kwargs) -> async_http.Response:
+    return await arequest(name, 'GET', url, **kwargs)
+
+
+async def apost(name: str, url: str, **kwargs) -> async_http.Response:
+    return await arequest(name, 'POST', url, **kwargs)
+
+
+def dependency_health() -> dict:
+    """:return: {name: breaker state and call counters} for every dependency used by this worker"""
+    with _dependencies_lock:
+        dependencies = list(_dependencies.values())
+    return {dependency.name: dependency.snapshot() for dependency in dependencies}
@@ -0,0 +1,149 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Product search index.
+Product text is tokenized and normalized into the ProductSearchTerm table, so a search is an index lookup
+per query term instead of a LIKE scan over every product description.
+"""
+from django.db import transaction
+from django.db.models import Q
+from api.models import Product, ProductSearchTerm
+import re
+import unicodedata
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+MIN_PREFIX_LENGTH = 2
+MAX_SEARCH_RESULTS = 1000
+
+# (field, weight) - a term found in several fields gets the sum of their weights
+FIELD_WEIGHTS = (
+    ("name", 8),
+    ("brand", 5),
+    ("ingredients", 3),
+    ("how_to_use", 1),
+    ("description", 1),
+)
+# Share of the weight a term earns when it only matches the query as a prefix
+PREFIX_MATCH_FACTOR = 0.5
+
+
+def normalize(text: str) -> str:
+    """
+    Case-folds the text and strips accents. Hangul and other scripts are recomposed so they stay intact.
+    :param text: Raw text
+    :return: Normalized text
+    """
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+    return unicodedata.normalize("NFC", stripped).casefold()
+
+
+def tokenize(text: str) -> list:
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(normalize(text))]
+
+
+def build_terms(product: Product, brand_name: str = None) -> dict:
+    """
+    :param product: Product to index
+    :param brand_name: Brand name, when already known (avoids fetching the brand)
+    :return: Mapping of term to weight
+    """
+    if brand_name is None:
+        brand_name = product.brand.brand_name if product.brand_id else ""
+    texts = {
+        "name": product.name,
+        "brand": brand_name,
+        "ingredients": product.ingredients,
+        "how_to_use": product.how_to_use,
+        "description": product.description,
+    }
+    terms = {}
+    for field, weight in FIELD_WEIGHTS:
+        for term in set(tokenize(texts[field])):
+            terms[term] = terms.get(term, 0) + weight
+    return terms
+
+
+def index_product(product: Product) -> None:
+    """
+    Replaces the index rows of a single product.
+    """
+    terms = build_terms(product)
+    with transaction.atomic():
+        ProductSearchTerm.objects.filter(product=product).delete()
+        ProductSearchTerm.objects.bulk_create(
+            [ProductSearchTerm(product=product, term=term, weight=weight) for term, weight in terms.items()]
+        )
+
+
+def index_products(queryset=None, batch_size: int = 500) -> int:
+    """
+    Rebuilds the index rows for many products.
+    :param queryset: Products to index (all products by default)
+    :param batch_size: Number of products handled per transaction
+    :return: Number of products indexed
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    queryset = queryset.select_related("brand").order_by("pk")
+    count = 0
+    batch = []
+    for product in queryset.iterator(chunk_size=batch_size):
+        batch.append(product)
+        if len(batch) >= batch_size:
+            count += _index_batch(batch)
+            batch = []
+    if batch:
+        count += _index_batch(batch)
+    return count
+
+
+def _index_batch(products) -> int:
+    rows = []
+    for product in products:
+        terms = build_terms(product, product.brand.brand_name if product.brand_id else "")
+        rows.extend(ProductSearchTerm(product=product, term=term, weight=weight) for term, weight in terms.items())
+    with transaction.atomic():
+        ProductSearchTerm.objects.filter(product__in=products).delete()
+        ProductSearchTerm.objects.bulk_create(rows, batch_size=1000)
+    return len(products)
+
+
+def search_product_ids(query: str, prefix: bool = True, limit: int = MAX_SEARCH_RESULTS) -> list:
+    """
+    Finds products matching every term of the query, best match first.
+    :param query: Search text
+    :param prefix: Treat the last query term as a prefix (for search-as-you-type)
+    :param limit: Maximum number of ids returned
+    :return: Product ids ordered by relevance
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not tokens:
+        return []
+    last = tokens[-1]
+    use_prefix = prefix and len(last) >= MIN_PREFIX_LENGTH
+
+    condition = Q(term__in=tokens)
+    if use_prefix:
+        condition |= Q(term__istartswith=last)
+    rows = ProductSearchTerm.objects.filter(condition).values_list("product_id", "term", "weight")
+
+    # product id -> {query token: best score for that token}
+    matches = {}
+    for product_id, term, weight in rows:
+        scores = matches.setdefault(product_id, {})
+        if term in tokens:
+            scores[term] = max(scores.get(term, 0), weight)
+        if use_prefix and term != last and term.startswith(last):
+            scores[last] = max(scores.get(last, 0), weight * PREFIX_MATCH_FACTOR)
+
+    ranked = [
+        (sum(scores.values()), product_id)
+        for product_id, scores in matches.items()
+        if len(scores) == len(tokens)
+    ]
+    # Best score first, newer products first on ties
+    ranked.sort(reverse=True)
+    return [product_id for _, product_id in ranked[:limit]]
@@ -0,0 +1,234 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Stock bookkeeping for checkout.
+Stock is never read into Python and written back; it is decremented by one conditional UPDATE per table
+("stock = stock - n WHERE stock >= n"), so two checkouts racing for the last units cannot both succeed.
+Between prepare_order and save_order variant quantities are held by StockReservation rows; a hold is not taken
+out of stock, it is subtracted when availability is computed (available = stock - live holds).
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Min, Q, Sum, When
+from django.utils import timezone
+from api.models import PrepareOrder, ProductVariant, StockReservation
+from api.utility_files.catalog_cache import invalidate_catalog_on_commit
+
+RESERVATION_TTL = getattr(settings, 'STOCK_RESERVATION_TTL', 15 * 60)  # seconds
+# Upper bound for caching a variant's held quantity; entries also expire when their earliest hold does
+HELD_CACHE_TIMEOUT = 60
+HELD_CACHE_KEY = 'stock:held:{}'
+# Id prefix of the provisional PrepareOrder that holds the stock while the payment order is created
+# (CreateOrderView.hold_stock); release_expired_reservations deletes the ones left behind
+HOLD_ORDER_PREFIX = 'hold_'
+
+
+class InsufficientStock(Exception):
+    def __init__(self, ids):
+        super().__init__(f"Insufficient stock for {sorted(ids)}")
+        self.ids = ids
+
+
+def decrement_stock(model, quantities: dict) -> None:
+    """
+    Takes quantities out of stock for many rows in a single statement. Rows are matched in primary key order, so
+    concurrent checkouts lock them in the same order. When any row is short nothing is decremented and
+    InsufficientStock names the short rows.
+    queryset.update() sends no post_save, so the catalog cache is invalidated here once the sale commits.
+    :param model: Model with a stock field (Product or ProductVariant)
+    :param quantities: {pk: quantity}
+    """
+    if not quantities:
+        return
+    ids = sorted(quantities)
+    stock_field = model._meta.get_field("stock")
+    condition = Q()
+    whens = []
+    for pk in ids:
+        condition |= Q(pk=pk, stock__gte=quantities[pk])
+        whens.append(When(pk=pk, then=F("stock") - quantities[pk]))
+    try:
+        # Savepoint: a partial update is undone before the short rows are looked up
+        with transaction.atomic():
+            updated = model.objects.filter(condition).update(
+                stock=Case(*whens, default=F("stock"), output_field=stock_field)
+            )
+            if updated != len(ids):
+                raise InsufficientStock(ids)
+    except InsufficientStock:
+        available = dict(model.objects.filter(pk__in=ids).values_list("pk", "stock"))
+        raise InsufficientStock([pk for pk in ids if available.get(pk, 0) < quantities[pk]] or ids)
+    invalidate_catalog_on_commit()
+
+
+def parse_variant_quantities(items) -> dict:
+    """
+    :param items: Cart lines [{"product_id", "variant_id", "quantity"}]; lines without a variant are not held
+    :return: {variant_id: total quantity}
+    """
+    quantities = {}
+    for item in items:
+        if not item.get("variant_id"):
+            continue
+        variant_id, quantity = int(item["variant_id"]), int(item["quantity"])
+        if quantity <= 0:
+            raise ValueError(f"Invalid quantity for variant {variant_id}")
+        quantities[variant_id] = quantities.get(variant_id, 0) + quantity
+    return quantities
+
+
+def _held_from_db(variant_ids, now, exclude_order_id=None):
+    """:return: {variant_id: (held quantity, earliest expiry)} for variants with live holds"""
+    holds = StockReservation.objects.filter(variant_id__in=variant_ids, expires_at__gt=now)
+    if exclude_order_id is not None:
+        holds = holds.exclude(prepare_order_id=exclude_order_id)
+    return {
+        row["variant_id"]: (row["held"], row["expires"])
+        for row in holds.order_by().values("variant_id").annotate(held=Sum("quantity"), expires=Min("expires_at"))
+    }
+
+
+def get_held_quantities(variant_ids) -> dict:
+    """
+    Quantity held by live reservations per variant, served from the cache where possible.
+    :param variant_ids: Variant ids
+    :return: {variant_id: held quantity} (0 for variants without holds)
+    """
+    variant_ids = list(variant_ids)
+    keys = {HELD_CACHE_KEY.format(variant_id): variant_id for variant_id in variant_ids}
+    cached = cache.get_many(keys)
+    held = {keys[key]: value for key, value in cached.items()}
+    missing = [variant_id for variant_id in variant_ids if variant_id not in held]
+    if missing:
+        now = timezone.now()
+        rows = _held_from_db(missing, now)
+        for variant_id in missing:
+            quantity, expires = rows.get(variant_id, (0, None))
+            held[variant_id] = quantity
+            timeout = HELD_CACHE_TIMEOUT
+            if expires is not None:
+                # The cached sum must not outlive the first hold in it
+                timeout = max(1, min(timeout, int((expires - now).total_seconds())))
+            cache.set(HELD_CACHE_KEY.format(variant_id), quantity, timeout)
+    return held
+
+
+def get_available_stock(variants) -> dict:
+    """
+    :param variants: ProductVariant objects
+    :return: {variant_id: stock minus live holds}
+    """
+    held = get_held_quantities(variant.id for variant in variants)
+    return {variant.id: max(0, variant.stock - held[variant.id]) for variant in variants}
+
+
+def _invalidate_held(variant_ids) -> None:
+    keys = [HELD_CACHE_KEY.format(variant_id) for variant_id in set(variant_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _lock_and_check(quantities: dict, exclude_order_id=None) -> None:
+    """
+    Locks the variants (primary key order, the same order every writer uses) and checks that stock minus the
+    holds of other orders covers the quantities. Must run inside transaction.atomic().
+    """
+    now = timezone.now()
+    ids = sorted(quantities)
+    stock = dict(ProductVariant.objects.select_for_update().filter(pk__in=ids).order_by("pk").values_list("pk", "stock"))
+    held = _held_from_db(ids, now, exclude_order_id)
+    short = [pk for pk in ids if stock.get(pk, 0) - held.get(pk, (0, None))[0] < quantities[pk]]
+    if short:
+        raise InsufficientStock(short)
+
+
+def reserve_stock(prepare_order, quantities: dict, ttl: int = RESERVATION_TTL) -> None:
+    """
+    Places holds for a prepared order, replacing any holds it already had.
+    :param prepare_order: PrepareOrder the holds belong to
+    :param quantities: {variant_id: quantity}
+    :param ttl: Seconds until the holds expire
+    """
+    if not quantities:
+        return
+    with transaction.atomic():
+        _lock_and_check(quantities, exclude_order_id=prepare_order.pk)
+        previous = list(StockReservation.objects.filter(prepare_order=prepare_order).values_list("variant_id", flat=True))
+        StockReservation.objects.filter(prepare_order=prepare_order).delete()
+        expires_at = timezone.now() + timedelta(seconds=ttl)
+        StockReservation.objects.bulk_create([
+            StockReservation(prepare_order=prepare_order, variant_id=variant_id, quantity=quantity, expires_at=expires_at)
+            for variant_id, quantity in quantities.items()
+        ])
+        _invalidate_held(list(quantities) + previous)
+
+
+def move_reservations(source, target) -> None:
+    """
+    Hands the holds of one prepared order to another. Variants and quantities do not change, so the cached held
+    quantities stay valid.
+    :param source: PrepareOrder holding the stock
+    :param target: PrepareOrder taking the holds over
+    """
+    StockReservation.objects.filter(prepare_order=source).update(prepare_order=target)
+
+
+def release_reservations(prepare_order) -> None:
+    """Deletes the holds of a prepared order that will not be saved (e.g. its payment order was never created)."""
+    released = list(StockReservation.objects.filter(prepare_order=prepare_order).values_list("variant_id", flat=True))
+    if released:
+        StockReservation.objects.filter(prepare_order=prepare_order).delete()
+        _invalidate_held(released)
+
+
+def consume_reservations(prepare_order, quantities: dict) -> None:
+    """
+    Converts the order's holds into a sale: checks availability ignoring the order's own holds, takes the quantities
+    out of stock and deletes the holds. Works for orders without holds too (they just compete with everyone's holds).
+    Must run inside transaction.atomic(). Listings show stock, not holds, so the catalog cache is invalidated only
+    when stock is taken (by decrement_stock).
+    :param prepare_order: PrepareOrder being saved
+    :param quantities: {variant_id: quantity} actually ordered
+    """
+    if quantities:
+        _lock_and_check(quantities, exclude_order_id=prepare_order.pk)
+        decrement_stock(ProductVariant, quantities)
+    released = list(StockReservation.objects.filter(prepare_order=prepare_order).values_list("variant_id", flat=True))
+    if released:
+        StockReservation.objects.filter(prepare_order=prepare_order).delete()
+    _invalidate_held(list(quantities) + released)
+
+
+def release_expired_reservations(batch_size: int = 1000) -> int:
+    """
+    Deletes expired holds in batches, then the provisional hold orders older than RESERVATION_TTL (left behind when
+    a worker died or failed between holding the stock and creating the payment order).
+    :param batch_size: Rows deleted per statement
+    :return: Number of holds released
+    """
+    released = 0
+    while True:
+        now = timezone.now()
+        rows = list(StockReservation.objects.filter(expires_at__lte=now).order_by("expires_at")
+                    .values_list("id", "variant_id")[:batch_size])
+        if not rows:
+            break
+        with transaction.atomic():
+            released += StockReservation.objects.filter(id__in=[row_id for row_id, _ in rows]).delete()[0]
+            _invalidate_held(variant_id for _, variant_id in rows)
+
+    stale = PrepareOrder.objects.filter(id__startswith=HOLD_ORDER_PREFIX,
+                                        created_at__lte=timezone.now() - timedelta(seconds=RESERVATION_TTL))
+    while True:
+        ids = list(stale.order_by("created_at").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return released
+        with transaction.atomic():
+            # A hold order normally has no holds left by now; any that remain go with it
+            variant_ids = list(StockReservation.objects.filter(prepare_order_id__in=ids)
+                               .values_list("variant_id", flat=True))
+            PrepareOrder.objects.filter(id__in=ids).delete()
+            released += len(variant_ids)
+            _invalidate_held(variant_ids)
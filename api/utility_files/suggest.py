@@ -0,0 +1,182 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: In-process typeahead index for product, brand and category names.
+Names are kept in sorted arrays (one per kind) and looked up with bisect, so a suggestion never touches the database.
+Every change is applied incrementally: the worker that saved the object bumps a shared generation counter and
+stores the change under the generation it got, and other workers replay the changes between their generation and
+the current one on their next lookup. A worker only rebuilds from the database on first use, after a cache flush,
+or when it finds a change missing (expired, or more than MAX_REPLAY behind).
+"""
+from bisect import bisect_left, insort
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from api.models import Product, Brand, Category
+from api.utility_files.catalog_cache import get_generation, bump_generation
+from api.utility_files.search_index import normalize, TOKEN_RE
+import threading
+
+SUGGEST_GENERATION_KEY = 'suggest:generation'
+SUGGEST_CHANGE_KEY = 'suggest:change:{}'
+# Seconds a change stays replayable; a worker idle for longer rebuilds instead
+CHANGE_TIMEOUT = 3600
+# A worker further behind than this rebuilds rather than replaying change by change
+MAX_REPLAY = 500
+DEFAULT_SUGGEST_LIMIT = 5
+MAX_SUGGEST_LIMIT = 20
+# Matches inspected per kind before ranking, bounds the work done for very short prefixes
+MAX_SCAN = 256
+
+KINDS = ("products", "brands", "categories")
+
+
+def _entry_keys(name: str) -> list:
+    """
+    A name can be matched from the start of any of its words, so it gets one key per word start.
+    e.g. "Rose Toner" -> ["rose toner", "toner"]
+    """
+    normalized = normalize(name).strip()
+    return [normalized[match.start():] for match in TOKEN_RE.finditer(normalized)]
+
+
+class _SortedNames:
+    """
+    Immutable snapshot of one kind: parallel sorted lists of keys and (key, rank, id, name) entries.
+    Writers build a new snapshot, so readers never need a lock.
+    """
+    __slots__ = ("keys", "entries", "keys_by_id")
+
+    def __init__(self, entries=None, keys_by_id=None):
+        self.entries = entries or []
+        self.keys = [entry[0] for entry in self.entries]
+        self.keys_by_id = keys_by_id or {}
+
+    @classmethod
+    def build(cls, rows):
+        """
+        :param rows: iterable of (id, name, rank), higher rank is suggested first
+        """
+        entries = []
+        keys_by_id = {}
+        for obj_id, name, rank in rows:
+            keys = _entry_keys(name)
+            keys_by_id[obj_id] = keys
+            entries.extend((key, -rank, obj_id, name) for key in keys)
+        entries.sort()
+        return cls(entries, keys_by_id)
+
+    def upsert(self, obj_id, name, rank):
+        snapshot = self.remove(obj_id)
+        keys = _entry_keys(name)
+        for key in keys:
+            insort(snapshot.entries, (key, -rank, obj_id, name))
+        snapshot.keys = [entry[0] for entry in snapshot.entries]
+        snapshot.keys_by_id[obj_id] = keys
+        return snapshot
+
+    def remove(self, obj_id):
+        keys_by_id = dict(self.keys_by_id)
+        keys_by_id.pop(obj_id, None)
+        entries = [entry for entry in self.entries if entry[2] != obj_id]
+        return _SortedNames(entries, keys_by_id)
+
+    def lookup(self, prefix: str, limit: int) -> list:
+        matches = {}
+        position = bisect_left(self.keys, prefix)
+        end = min(len(self.entries), position + MAX_SCAN)
+        while position < end and self.keys[position].startswith(prefix):
+            _, neg_rank, obj_id, name = self.entries[position]
+            matches.setdefault(obj_id, (neg_rank, name, obj_id))
+            position += 1
+        return [{"id": obj_id, "name": name} for _, name, obj_id in sorted(matches.values())[:limit]]
+
+
+class SuggestionIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = None
+        self._generation = None
+
+    def _load(self):
+        generation = get_generation(SUGGEST_GENERATION_KEY)
+        # Kept until the next change, so read from the primary (see db_routing)
+        products = Product.objects.using(DEFAULT_DB_ALIAS).filter(is_active=True)
+        brands = Brand.objects.using(DEFAULT_DB_ALIAS)
+        categories = Category.objects.using(DEFAULT_DB_ALIAS)
+        names = {
+            "products": _SortedNames.build(products.values_list("id", "name", "sold_count")),
+            "brands": _SortedNames.build(
+                (brand_id, brand_name, 0) for brand_id, brand_name in brands.values_list("id", "brand_name")
+            ),
+            "categories": _SortedNames.build(
+                (category_id, name, 0) for category_id, name in categories.values_list("id", "name")
+            ),
+        }
+        self._names, self._generation = names, generation
+
+    @staticmethod
+    def _changed(names: dict, kind: str, obj_id, name, rank) -> dict:
+        names = dict(names)
+        if name is None:
+            names[kind] = names[kind].remove(obj_id)
+        else:
+            names[kind] = names[kind].upsert(obj_id, name, rank)
+        return names
+
+    def _catch_up(self, generation: int) -> None:
+        """Replays the changes after the local generation, or reloads when any of them is gone. Holds _lock."""
+        behind = generation - self._generation
+        if 0 < behind <= MAX_REPLAY:
+            keys = [SUGGEST_CHANGE_KEY.format(self._generation + step) for step in range(1, behind + 1)]
+            changes = cache.get_many(keys)
+            if len(changes) == len(keys):
+                names = self._names
+                for key in keys:
+                    names = self._changed(names, *changes[key])
+                self._names, self._generation = names, generation
+                return
+        self._load()
+
+    def _current(self) -> dict:
+        if self._names is None or self._generation != get_generation(SUGGEST_GENERATION_KEY):
+            with self._lock:
+                generation = get_generation(SUGGEST_GENERATION_KEY)
+                if self._names is None:
+                    self._load()
+                elif self._generation != generation:
+                    self._catch_up(generation)
+        return self._names
+
+    def suggest(self, query: str, limit: int = DEFAULT_SUGGEST_LIMIT) -> dict:
+        """
+        :param query: Prefix typed by the user
+        :param limit: Maximum suggestions per kind
+        :return: {"products": [...], "brands": [...], "categories": [...]} with {"id", "name"} items
+        """
+        prefix = normalize(query).strip()
+        if not prefix:
+            return {kind: [] for kind in KINDS}
+        names = self._current()
+        return {kind: names[kind].lookup(prefix, limit) for kind in KINDS}
+
+    def apply(self, kind: str, obj_id, name: str = None, rank: int = 0) -> None:
+        """
+        Applies a single change to the local index and publishes it for the other workers.
+        :param kind: One of KINDS
+        :param obj_id: Object id
+        :param name: New name, or None when the object was removed
+        :param rank: Ranking value, higher is suggested first
+        """
+        generation = bump_generation(SUGGEST_GENERATION_KEY)
+        cache.set(SUGGEST_CHANGE_KEY.format(generation), (kind, obj_id, name, rank), CHANGE_TIMEOUT)
+        with self._lock:
+            if self._names is None:
+                # Nothing loaded yet, the next lookup builds the index from the database
+                return
+            if generation == self._generation + 1:
+                self._names = self._changed(self._names, kind, obj_id, name, rank)
+                self._generation = generation
+            # Otherwise another worker bumped in between; the next lookup replays its change and this one in order
+
+
+suggestion_index = SuggestionIndex()
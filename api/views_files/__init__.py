@@ -4,14 +4,18 @@ RegisterView,
 LoginView,
 VerifyOtpView,
 SendOtpView,
-GoogleLoginView
+GoogleLoginView,
+AsyncSendOtpView
 )
 from .payment_gateway import (
 CreateOrderView,
 VerifyOrderView,
 SaveOrdersView,
 PaypalCreateOrderView,
-PaypalCaptureOrderView
+PaypalCaptureOrderView,
+AsyncCreateOrderView,
+AsyncPaypalCreateOrderView,
+AsyncPaypalCaptureOrderView
 )
 from .products import  (
 GetProductListView,
@@ -25,12 +29,22 @@ GetAddressListView,
 DeleteAddressView,
 UpdateAddressView,
 SearchProductsView,
+GetProductReviewsView,
+SuggestView,
 GetUserOrderHistoryView,
 RegisterCouponView,
 GetUserCouponView,
 GetCancelRefundListView,
 CancelRefundCreateView
 )
+from .monitoring import (
+QueryMetricsView,
+DependencyHealthView
+)
+from .webhooks import (
+RazorpayWebhookView,
+PaypalWebhookView
+)
 __all__=[
 "GetCsrfView",
 "RegisterView",
@@ -52,11 +66,21 @@ __all__=[
 "SendOtpView",
 "GoogleLoginView",
 "SearchProductsView",
+"GetProductReviewsView",
+"SuggestView",
 "GetUserOrderHistoryView",
 "RegisterCouponView",
 "GetUserCouponView",
 "GetCancelRefundListView",
 "CancelRefundCreateView",
 "PaypalCreateOrderView",
-"PaypalCaptureOrderView"
+"PaypalCaptureOrderView",
+"AsyncCreateOrderView",
+"AsyncPaypalCreateOrderView",
+"AsyncPaypalCaptureOrderView",
+"AsyncSendOtpView",
+"QueryMetricsView",
+"DependencyHealthView",
+"RazorpayWebhookView",
+"PaypalWebhookView"
 ]
\ No newline at end of file
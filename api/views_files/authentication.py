@@ -1,3 +1,4 @@
+import logging
 from django.contrib.auth.hashers import make_password,check_password
 from django.forms import model_to_dict
 from django.middleware.csrf import get_token
@@ -11,6 +12,10 @@ from api.utility_files.utils import generate_user_id
 from django.contrib.auth import authenticate
 from django.utils.timezone import now
 from django.core.mail import send_mail
+from api.utility_files import async_mail
+from api.utility_files.async_view import AsyncAPIView
+
+logger = logging.getLogger('apicall')
 MAX_GENERATE_ATTEMPT = 10
 class GetCsrfView(viewsets.GenericViewSet, mixins.ListModelMixin):
     queryset = []
@@ -92,18 +97,9 @@ class LoginView(viewsets.GenericViewSet, mixins.CreateModelMixin):
 class SendOtpView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     queryset = EmailOTP.objects.all()
 
-    def create(self, request, *args, **kwargs):
-        email = get_body_data(request, "email", "").strip()
-        if not email:
-            return api_failed("Email is required", headers={"code": 1010}).secure().rest()
-        print("email", email)
-        # Generate a 6-digit OTP
-        otp = str(random.randint(100000, 999999))
-        print("otp", otp)
-        # Save the OTP record (you could also delete/expire previous OTPs for the same email)
-        otp_entry = EmailOTP.objects.create(email=email, otp=otp)
-
-        # Prepare email content
+    @staticmethod
+    def otp_mail(otp):
+        """:return: (subject, message, from_email) of the OTP email"""
         subject = "Your duhappi OTP Verification Code"
         message = (
             f"Hello,\n\n"
@@ -116,6 +112,21 @@ class SendOtpView(viewsets.GenericViewSet, mixins.CreateModelMixin):
             f"The duhappi Team"
         )
         from_email = "tsaurav1711@gmail.com"  # Change to your sender email
+        return subject, message, from_email
+
+    def create(self, request, *args, **kwargs):
+        email = get_body_data(request, "email", "").strip()
+        if not email:
+            return api_failed("Email is required", headers={"code": 1010}).secure().rest()
+        print("email", email)
+        # Generate a 6-digit OTP
+        otp = str(random.randint(100000, 999999))
+        print("otp", otp)
+        # Save the OTP record (you could also delete/expire previous OTPs for the same email)
+        otp_entry = EmailOTP.objects.create(email=email, otp=otp)
+
+        # Prepare email content
+        subject, message, from_email = self.otp_mail(otp)
         recipient_list = [email]
 
         try:
@@ -128,6 +139,24 @@ class SendOtpView(viewsets.GenericViewSet, mixins.CreateModelMixin):
 
         return api_success("OTP sent successfully", body={"otp_sent": True}).secure().rest()
 
+
+class AsyncSendOtpView(AsyncAPIView):
+    """SendOtpView for ASGI: waits on the SMTP server without holding a thread."""
+
+    async def handle(self, request, *args, **kwargs):
+        email = get_body_data(request, "email", "").strip()
+        if not email:
+            return api_failed("Email is required", headers={"code": 1010}).secure().rest()
+        otp = str(random.randint(100000, 999999))
+        await EmailOTP.objects.acreate(email=email, otp=otp)
+        subject, message, from_email = SendOtpView.otp_mail(otp)
+        try:
+            await async_mail.send_mail(subject, message, from_email, [email])
+        except Exception as e:
+            logger.warning(f"Sending the OTP email failed: {e}")
+            return api_failed("Error sending email", headers={"code": 1011}).secure().rest()
+        return api_success("OTP sent successfully", body={"otp_sent": True}).secure().rest()
+
 class VerifyOtpView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     queryset = EmailOTP.objects.all()
 
@@ -0,0 +1,67 @@
+import hmac
+
+from rest_framework import mixins, viewsets, status
+from django.conf import settings
+from api.utility_files.api_call import api_success, api_failed
+from api.utility_files.db_routing import routing_metrics
+from api.utility_files.query_metrics import endpoint_metrics
+from api.utility_files.resilience import dependency_health
+from ecombackend.db_backends.mysql_pool.pool import pool_stats
+
+MONITORING_TOKEN_HEADER = "HTTP_X_MONITORING_TOKEN"
+
+
+def is_monitoring_request(request) -> bool:
+    """Staff users (admin session) or callers sending X-Monitoring-Token equal to settings.MONITORING_TOKEN.
+
+    The caller's address is not trusted: behind a reverse proxy every request comes from localhost.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+    token = settings.MONITORING_TOKEN
+    sent = request.META.get(MONITORING_TOKEN_HEADER)
+    return bool(token) and bool(sent) and hmac.compare_digest(sent.encode("utf-8"), token.encode("utf-8"))
+
+
+def not_available():
+    return api_failed("Not available", headers={"code": 1001}).http(status.HTTP_403_FORBIDDEN)
+
+
+class QueryMetricsView(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.CreateModelMixin):
+    """Per-view query totals collected by QueryMetricsMiddleware (staff or monitoring token only).
+
+    GET returns the totals; POST returns them and resets the counters.
+    """
+    queryset = []
+
+    def snapshot(self):
+        return {
+            "endpoints": endpoint_metrics.snapshot(),
+            "databases": endpoint_metrics.alias_snapshot(),
+            "routing": routing_metrics.snapshot(),
+            "pools": pool_stats(),
+        }
+
+    def list(self, request, *args, **kwargs):
+        if not is_monitoring_request(request):
+            return not_available()
+        return api_success("Query metrics fetched successfully", body=self.snapshot()).http()
+
+    def create(self, request, *args, **kwargs):
+        if not is_monitoring_request(request):
+            return not_available()
+        body = self.snapshot()
+        endpoint_metrics.reset()
+        routing_metrics.reset()
+        return api_success("Query metrics reset successfully", body=body).http()
+
+
+class DependencyHealthView(viewsets.GenericViewSet, mixins.ListModelMixin):
+    """Circuit breaker state and call counters per third-party provider, for this worker process."""
+    queryset = []
+
+    def list(self, request, *args, **kwargs):
+        if not is_monitoring_request(request):
+            return not_available()
+        return api_success("Dependency health fetched successfully", body={"dependencies": dependency_health()}).http()
@@ -1,27 +1,130 @@
 import hashlib
 import hmac
+import logging
+import uuid
 from sqlite3 import IntegrityError
 
 import razorpay
+from asgiref.sync import sync_to_async
 from django.db import transaction
 from api.models import *
 import os
-from requests.auth import HTTPBasicAuth
 import requests
-from rest_framework import viewsets, mixins
+from rest_framework import viewsets, mixins, status
+from rest_framework.response import Response
+from razorpay.constants import ERROR_CODE
+from razorpay.constants.url import URL
 from django.conf import settings
 from api.serializers_files.serializers import PrepareOrderSerializer, SaveOrderSerializer, PaypalCreateOrderSerializer, PaypalCaptureOrderSerializer
 from api.utility_files.api_call import get_body_data, api_failed, api_success
+from api.utility_files import paypal, resilience
+from api.utility_files.async_view import AsyncAPIView
+from api.utility_files.idempotency import async_idempotent, idempotent
+from api.utility_files.stock import InsufficientStock, decrement_stock, consume_reservations, reserve_stock, \
+    get_available_stock, move_reservations, parse_variant_quantities, release_reservations, RESERVATION_TTL, \
+    HOLD_ORDER_PREFIX
 
 TEST_KEY_ID = "rzp_test_4DWYbn4PlWlGQF"
 TEST_KEY_SECRET = "LUt6VWiy6wrfZy9ubKkkhVII"
-client = razorpay.Client(auth=(TEST_KEY_ID, TEST_KEY_SECRET))
+client = razorpay.Client(session=resilience.session('razorpay'), auth=(TEST_KEY_ID, TEST_KEY_SECRET))
 client.set_app_details({"title" : "ELeve", "version" : "1.0"})
+logger = logging.getLogger('apicall')
+
+RAZORPAY_ORDERS_URL = f"{URL.BASE_URL}{URL.V1}{URL.ORDER_URL}"
+# The SDK's User-Agent (SDK version and app details), built once instead of on every call
+RAZORPAY_HEADERS = client._update_user_agent_header({"headers": {"Content-type": "application/json"}})["headers"]
+RAZORPAY_ERRORS = {
+    ERROR_CODE.BAD_REQUEST_ERROR: razorpay.errors.BadRequestError,
+    ERROR_CODE.GATEWAY_ERROR: razorpay.errors.GatewayError,
+}
+
+
+async def create_razorpay_order(order_data):
+    """
+    client.order.create() for async views: same endpoint, credentials, headers and errors, sent with async_http.
+    :raise razorpay.errors.BadRequestError, razorpay.errors.GatewayError, razorpay.errors.ServerError: When Razorpay
+           rejects the order
+    """
+    response = await resilience.apost('razorpay', RAZORPAY_ORDERS_URL, json=order_data, auth=client.auth,
+                                      headers=RAZORPAY_HEADERS)
+    if 200 <= response.status_code < 300:
+        return response.json()
+    error = response.json().get("error", {})
+    error_class = RAZORPAY_ERRORS.get(str(error.get("code", "")).upper(), razorpay.errors.ServerError)
+    raise error_class(error.get("description", ""))
+
 
 class CreateOrderView(viewsets.GenericViewSet, mixins.DestroyModelMixin):
     queryset = PrepareOrder.objects.all()
     serializer_class = PrepareOrderSerializer
 
+    @staticmethod
+    def insufficient_stock_message(variant_ids):
+        """:return: Error message naming the short variants (by id when a variant does not exist)"""
+        names = dict(ProductVariant.objects.filter(id__in=variant_ids).values_list("id", "name"))
+        return f"Insufficient stock for {', '.join(names.get(pk, f'variant {pk}') for pk in sorted(variant_ids))}"
+
+    @staticmethod
+    def stock_error(quantities):
+        """
+        Cheap pre-check before holding the stock; reserve_stock in hold_stock is the authoritative check.
+        :return: Error message, or None when every variant has the stock
+        """
+        variants = list(ProductVariant.objects.filter(id__in=quantities))
+        available = get_available_stock(variants)
+        short = [pk for pk in quantities if available.get(pk, 0) < quantities[pk]]
+        if short:
+            return CreateOrderView.insufficient_stock_message(short)
+        return None
+
+    @staticmethod
+    def hold_stock(user, amount, currency, order_data, quantities):
+        """
+        Holds the stock before the Razorpay order is created, so a checkout that cannot be filled leaves no payment
+        order behind. The holds belong to a provisional PrepareOrder until save_prepare_order moves them to the
+        Razorpay order.
+        :return: Provisional PrepareOrder, or None when nothing is held
+        :raise InsufficientStock: When a variant is short
+        """
+        if not quantities:
+            return None
+        with transaction.atomic():
+            hold = PrepareOrder.objects.create(
+                id=f"{HOLD_ORDER_PREFIX}{uuid.uuid4().hex}",
+                user=user,
+                amount=amount,
+                currency=currency,
+                receipt=order_data["receipt"],
+                notes=order_data["notes"],
+            )
+            reserve_stock(hold, quantities)
+        return hold
+
+    @staticmethod
+    def release_hold(hold):
+        """Gives the held stock back when the Razorpay order could not be created."""
+        if hold is not None:
+            with transaction.atomic():
+                release_reservations(hold)
+                hold.delete()
+
+    @staticmethod
+    def save_prepare_order(user, amount, currency, order_data, razorpay_order, hold):
+        """Saves the order in our database and moves the held stock to it."""
+        with transaction.atomic():
+            prepare_order = PrepareOrder.objects.create(
+                user=user,
+                amount=amount,
+                currency=currency,
+                receipt=order_data["receipt"],
+                notes=order_data["notes"],
+                id=razorpay_order["id"],
+                partial_payment=False,  # Default to false
+            )
+            if hold is not None:
+                move_reservations(hold, prepare_order)
+                hold.delete()
+
     def create(self, request, *args, **kwargs):
         """
         Create a Razorpay order.
@@ -29,6 +132,7 @@ class CreateOrderView(viewsets.GenericViewSet, mixins.DestroyModelMixin):
         user_id = get_body_data(request, "user_id", "").strip()
         amount = get_body_data(request, "amount", "") # Amount in paise (₹1 = 100 paise)
         currency = get_body_data(request, "currency", "INR").strip()
+        items = get_body_data(request, "items", [])  # Optional cart lines, held until save_order
         receipt = f"receipt_{user_id}"  # Generate a unique receipt ID
 
         # Validate user
@@ -37,6 +141,15 @@ class CreateOrderView(viewsets.GenericViewSet, mixins.DestroyModelMixin):
         except User.DoesNotExist:
             return api_failed("User not found", headers={"code": 1004}).secure().rest()
 
+        try:
+            quantities = parse_variant_quantities(items)
+        except (KeyError, TypeError, ValueError):
+            return api_failed("Invalid items", headers={"code": 1008}).secure().rest()
+        if quantities:
+            stock_error = self.stock_error(quantities)
+            if stock_error:
+                return api_failed(stock_error, headers={"code": 1007}).secure().rest()
+
         # Razorpay order data
         order_data = {
             "amount": int(amount)*100,  # Razorpay requires amount in paise
@@ -48,35 +161,90 @@ class CreateOrderView(viewsets.GenericViewSet, mixins.DestroyModelMixin):
             },
         }
         print(order_data)
+        try:
+            hold = self.hold_stock(user, amount, currency, order_data, quantities)
+        except InsufficientStock as e:
+            return api_failed(self.insufficient_stock_message(e.ids), headers={"code": 1007}).secure().rest()
+
         try:
             # Create order in Razorpay
             razorpay_order = client.order.create(data=order_data)  # 🔹 FIXED: `order.create()`
             print("razorpay_order", razorpay_order["id"])
-            # Save the order in our database
-            prepare_order = PrepareOrder.objects.create(
-                user=user,
-                amount=amount,
-                currency=currency,
-                receipt=receipt,
-                notes=order_data["notes"],
-                id=razorpay_order["id"],
-                partial_payment=False,  # Default to false
-            )
+            self.save_prepare_order(user, amount, currency, order_data, razorpay_order, hold)
 
             return api_success(
                 "Order created successfully",
-                body={"order": razorpay_order},
+                body={"order": razorpay_order, "reservation_ttl": RESERVATION_TTL if quantities else 0},
             ).secure().rest()
 
         except Exception as e:
+            self.release_hold(hold)
             return api_failed(f"Razorpay Error: {str(e)}", headers={"code": 1005}).secure().rest()
         except Exception as e:
             return api_failed(f"Unexpected Error: {str(e)}", headers={"code": 1006}).secure().rest()
 
+
+class AsyncCreateOrderView(AsyncAPIView):
+    """CreateOrderView for ASGI: waits on Razorpay without holding a thread."""
+    basename = 'prepare_order'
+
+    async def handle(self, request, *args, **kwargs):
+        user_id = get_body_data(request, "user_id", "").strip()
+        amount = get_body_data(request, "amount", "")
+        currency = get_body_data(request, "currency", "INR").strip()
+        items = get_body_data(request, "items", [])
+        receipt = f"receipt_{user_id}"
+
+        try:
+            user = await User.objects.aget(user_id=user_id)
+        except User.DoesNotExist:
+            return api_failed("User not found", headers={"code": 1004}).secure().rest()
+
+        try:
+            quantities = parse_variant_quantities(items)
+        except (KeyError, TypeError, ValueError):
+            return api_failed("Invalid items", headers={"code": 1008}).secure().rest()
+        if quantities:
+            stock_error = await sync_to_async(CreateOrderView.stock_error)(quantities)
+            if stock_error:
+                return api_failed(stock_error, headers={"code": 1007}).secure().rest()
+
+        order_data = {
+            "amount": int(amount)*100,  # Razorpay requires amount in paise
+            "currency": currency,
+            "receipt": receipt,
+            "notes": {
+                "user_id": user_id,
+                "platform": "ELeve",
+            },
+        }
+        try:
+            hold = await sync_to_async(CreateOrderView.hold_stock)(user, amount, currency, order_data, quantities)
+        except InsufficientStock as e:
+            message = await sync_to_async(CreateOrderView.insufficient_stock_message)(e.ids)
+            return api_failed(message, headers={"code": 1007}).secure().rest()
+
+        try:
+            razorpay_order = await create_razorpay_order(order_data)
+            await sync_to_async(CreateOrderView.save_prepare_order)(
+                user, amount, currency, order_data, razorpay_order, hold)
+        except Exception as e:
+            await sync_to_async(CreateOrderView.release_hold)(hold)
+            return api_failed(f"Razorpay Error: {str(e)}", headers={"code": 1005}).secure().rest()
+        except BaseException:
+            # Cancelled (client gone, server shutting down): give the stock back before the cancellation propagates
+            await sync_to_async(CreateOrderView.release_hold)(hold)
+            raise
+        return api_success(
+            "Order created successfully",
+            body={"order": razorpay_order, "reservation_ttl": RESERVATION_TTL if quantities else 0},
+        ).secure().rest()
+
 class VerifyOrderView(viewsets.GenericViewSet, mixins.DestroyModelMixin):
     queryset = PrepareOrder.objects.all()
     serializer_class = PrepareOrderSerializer
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         """
         Create a Razorpay order.
@@ -111,6 +279,66 @@ class SaveOrdersView(viewsets.GenericViewSet, mixins.DestroyModelMixin):
     queryset = Orders.objects.all()
     serializer_class = SaveOrderSerializer
 
+    @staticmethod
+    def build_order_items(order, items):
+        """
+        Validates the cart, takes the ordered quantities out of stock and returns the unsaved OrderItem rows.
+        Runs a fixed number of queries whatever the cart size: one read each for products and variants, a locked
+        availability check against other orders' holds, and one conditional UPDATE each for variant and product
+        stock. Must be called inside transaction.atomic().
+        :param order: The order being saved
+        :param items: [{"product_id", "variant_id" (optional), "quantity"}]
+        :return: OrderItem objects for bulk_create
+        """
+        lines = []
+        for item in items:
+            try:
+                product_id = int(item["product_id"])
+                variant_id = int(item["variant_id"]) if item.get("variant_id") else None
+            except (KeyError, TypeError, ValueError):
+                raise IntegrityError(f"Product with ID {item.get('product_id')} not found")
+            try:
+                quantity = int(item["quantity"])
+            except (KeyError, TypeError, ValueError):
+                quantity = 0
+            if quantity <= 0:
+                raise IntegrityError(f"Invalid quantity for product {product_id}")
+            lines.append((product_id, variant_id, quantity))
+
+        products = Product.objects.in_bulk({product_id for product_id, _, _ in lines})
+        variants = ProductVariant.objects.in_bulk({variant_id for _, variant_id, _ in lines if variant_id})
+
+        variant_quantities = {}
+        product_quantities = {}
+        order_items = []
+        for product_id, variant_id, quantity in lines:
+            product = products.get(product_id)
+            if product is None:
+                raise IntegrityError(f"Product with ID {product_id} not found")
+            if variant_id:
+                variant = variants.get(variant_id)
+                if variant is None or variant.product_id != product.id:
+                    raise IntegrityError(f"Variant with ID {variant_id} not found for product {product.name}")
+                variant_quantities[variant.id] = variant_quantities.get(variant.id, 0) + quantity
+                order_items.append(OrderItem(order=order, product=product, variant=variant, quantity=quantity,
+                                             price=variant.price))
+            else:
+                # Fallback to product-level (not ideal anymore)
+                product_quantities[product.id] = product_quantities.get(product.id, 0) + quantity
+                order_items.append(OrderItem(order=order, product=product, quantity=quantity, price=product.price))
+
+        try:
+            # Turns the holds placed by prepare_order into the sale
+            consume_reservations(order.order_ref, variant_quantities)
+        except InsufficientStock as e:
+            raise IntegrityError(f"Insufficient stock for {', '.join(variants[pk].name for pk in e.ids)}")
+        try:
+            decrement_stock(Product, product_quantities)
+        except InsufficientStock as e:
+            raise IntegrityError(f"Insufficient stock for {', '.join(products[pk].name for pk in e.ids)}")
+        return order_items
+
+    @idempotent
     def create(self, request, *args, **kwargs):
         try:
             user_id = get_body_data(request, "user_id", "").strip()
@@ -146,51 +374,7 @@ class SaveOrdersView(viewsets.GenericViewSet, mixins.DestroyModelMixin):
                     status="processing",
                     address=address
                 )
-                # print("orders", order)
-                # Save Order Items
-                for item in items:
-                    try:
-                        product = Product.objects.get(id=item["product_id"])
-                        variant_id = item.get("variant_id")
-                        if variant_id:
-                            try:
-                                variant = ProductVariant.objects.get(id=variant_id, product=product)
-                            except ProductVariant.DoesNotExist:
-                                raise IntegrityError(
-                                    f"Variant with ID {variant_id} not found for product {product.name}")
-
-                            if variant.stock < item["quantity"]:
-                                raise IntegrityError(f"Insufficient stock for {variant.name}")
-
-                            # Deduct variant stock
-                            variant.stock -= item["quantity"]
-                            variant.save()
-
-                            price_at_time = variant.price  # Use variant price
-                            OrderItem.objects.create(
-                                order=order,
-                                product=product,
-                                variant=variant,
-                                quantity=item["quantity"],
-                                price=price_at_time,
-                            )
-                        else:
-                            # Fallback to product-level (not ideal anymore)
-                            if product.stock < item["quantity"]:
-                                raise IntegrityError(f"Insufficient stock for {product.name}")
-
-                            product.stock -= item["quantity"]
-                            product.save()
-
-                            OrderItem.objects.create(
-                                order=order,
-                                product=product,
-                                quantity=item["quantity"],
-                                price=product.price,
-                            )
-
-                    except Product.DoesNotExist:
-                        raise IntegrityError(f"Product with ID {item['product_id']} not found")
+                OrderItem.objects.bulk_create(self.build_order_items(order, items))
 
             return api_success("Order saved successfully!", headers={"success": True}).secure().rest()
 
@@ -206,6 +390,56 @@ class SaveOrdersView(viewsets.GenericViewSet, mixins.DestroyModelMixin):
 class PaypalCreateOrderView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     serializer_class = PaypalCreateOrderSerializer
 
+    @staticmethod
+    def save_order(user, amount, intent, purchase_units, experience_context, order_data):
+        """Stores the PayPal order and its PrepareOrder (created, or updated when it exists)."""
+        with transaction.atomic():  # ✅ wrap entire logic here
+            try:
+                # Check if the object exists
+                PaypalOrder.objects.get(order_id=order_data['id'])
+                # If it exists, you can either skip or choose to update it manually
+                # For example:
+                # existing_order = PaypalOrder.objects.get(order_id=order_data['id'])
+                # existing_order.purchase_units = purchase_units
+                # existing_order.save()
+            except PaypalOrder.DoesNotExist:
+                # Object doesn't exist, safe to create
+                PaypalOrder.objects.create(
+                    order_id=order_data['id'],
+                    purchase_units=purchase_units,
+                    intent=intent,
+                    experience_context=experience_context,
+                    status=order_data.get('status'),
+                    raw_response=order_data
+                )
+
+            try:
+                # Check if a PrepareOrder with this ID already exists
+                prepare_order = PrepareOrder.objects.get(id=order_data['id'])
+                exists = True
+            except PrepareOrder.DoesNotExist:
+                # Create a new PrepareOrder if it doesn't exist
+                prepare_order = PrepareOrder.objects.create(
+                    id=order_data['id'],
+                    user=user,
+                    amount=amount,
+                    currency="INR",
+                    receipt=intent,
+                    notes=order_data,
+                    partial_payment=False
+                )
+                exists = False
+
+            # If you need to update even if it exists, add this:
+            if exists:
+                prepare_order.user = user
+                prepare_order.amount = amount
+                prepare_order.currency = "INR"
+                prepare_order.receipt = intent
+                prepare_order.notes = order_data
+                prepare_order.partial_payment = False
+                prepare_order.save()
+
     def create(self, request, *args, **kwargs):
         # 입력값 검증
         serializer = self.get_serializer(data=request.data)
@@ -221,37 +455,24 @@ class PaypalCreateOrderView(viewsets.GenericViewSet, mixins.CreateModelMixin):
             user = User.objects.get(user_id=user_id)
         except User.DoesNotExist:
             return api_failed("User not found", headers={"code": 1004}).secure().rest()
-        # 1) PayPal OAuth 토큰 발급
-        token_res = requests.post(
-            "https://api-m.sandbox.paypal.com/v1/oauth2/token",
-            data={"grant_type": "client_credentials"},
-            auth=HTTPBasicAuth(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_SECRET_KEY),
-        )
-        if token_res.status_code != 200:
-            return (
-                api_failed("Failed to obtain PayPal access token.", headers={"code": 1002})
-                .secure()
-                .rest()
-            )
-        access_token = token_res.json().get('access_token')
-
-        # 2) PayPal 주문 생성
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
+        # 1) PayPal 주문 생성 (OAuth 토큰은 캐시된 값을 사용)
         body = {
             "intent": intent,
             "purchase_units": purchase_units,
             "payment_source": {"paypal": {"experience_context": experience_context}},
         }
-        order_res = requests.post(
-            "https://api-m.sandbox.paypal.com/v2/checkout/orders",
-            json=body,
-            headers=headers,
-        )
+        try:
+            order_res = paypal.post("/v2/checkout/orders", json=body)
+        except paypal.PaypalTokenError:
+            return (
+                api_failed("Failed to obtain PayPal access token.", headers={"code": 1002})
+                .secure()
+                .rest()
+            )
+        except requests.RequestException:
+            order_res = None
 
-        if order_res.status_code not in (200, 201):
+        if order_res is None or order_res.status_code not in (200, 201):
             return (
                 api_failed("Failed to capture PayPal order", headers={"code": 1003})
                 .secure()
@@ -261,52 +482,7 @@ class PaypalCreateOrderView(viewsets.GenericViewSet, mixins.CreateModelMixin):
 
         # 3) DB에 주문 정보 저장
         try:
-            with transaction.atomic():  # ✅ wrap entire logic here
-                try:
-                    # Check if the object exists
-                    PaypalOrder.objects.get(order_id=order_data['id'])
-                    # If it exists, you can either skip or choose to update it manually
-                    # For example:
-                    # existing_order = PaypalOrder.objects.get(order_id=order_data['id'])
-                    # existing_order.purchase_units = purchase_units
-                    # existing_order.save()
-                except PaypalOrder.DoesNotExist:
-                    # Object doesn't exist, safe to create
-                    PaypalOrder.objects.create(
-                        order_id=order_data['id'],
-                        purchase_units=purchase_units,
-                        intent=intent,
-                        experience_context=experience_context,
-                        status=order_data.get('status'),
-                        raw_response=order_data
-                    )
-
-                try:
-                    # Check if a PrepareOrder with this ID already exists
-                    prepare_order = PrepareOrder.objects.get(id=order_data['id'])
-                    exists = True
-                except PrepareOrder.DoesNotExist:
-                    # Create a new PrepareOrder if it doesn't exist
-                    prepare_order = PrepareOrder.objects.create(
-                        id=order_data['id'],
-                        user=user,
-                        amount=amount,
-                        currency="INR",
-                        receipt=intent,
-                        notes=order_data,
-                        partial_payment=False
-                    )
-                    exists = False
-
-                # If you need to update even if it exists, add this:
-                if exists:
-                    prepare_order.user = user
-                    prepare_order.amount = amount
-                    prepare_order.currency = "INR"
-                    prepare_order.receipt = intent
-                    prepare_order.notes = order_data
-                    prepare_order.partial_payment = False
-                    prepare_order.save()
+            self.save_order(user, amount, intent, purchase_units, experience_context, order_data)
         except Exception as e:
             print("DB Error:", e)
             return api_failed("Failed to save order to DB", headers={"code": 1009}).secure().rest()
@@ -322,6 +498,7 @@ class PaypalCreateOrderView(viewsets.GenericViewSet, mixins.CreateModelMixin):
 class PaypalCaptureOrderView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     serializer_class = PaypalCaptureOrderSerializer
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         # 입력값 검증
         order_id = get_body_data(request, 'orderID', '').strip()
@@ -342,29 +519,18 @@ class PaypalCaptureOrderView(viewsets.GenericViewSet, mixins.CreateModelMixin):
                 .rest()
             )
 
-        # PayPal OAuth 토큰 재발급
-        token_res = requests.post(
-            "https://api-m.sandbox.paypal.com/v1/oauth2/token",
-            data={"grant_type": "client_credentials"},
-            auth=HTTPBasicAuth(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_SECRET_KEY),
-        )
-        if token_res.status_code != 200:
+        # 주문 캡처 API 호출 (OAuth 토큰은 캐시된 값을 사용)
+        try:
+            cap_res = paypal.post(f"/v2/checkout/orders/{order_id}/capture")
+        except paypal.PaypalTokenError:
             return (
                 api_failed("Failed to obtain PayPal access token.", headers={"code": 1006})
                 .secure()
                 .rest()
             )
-        access_token = token_res.json().get('access_token')
-
-        # 주문 캡처 API 호출
-        cap_res = requests.post(
-            f"https://api-m.sandbox.paypal.com/v2/checkout/orders/{order_id}/capture",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}",
-            }
-        )
-        if cap_res.status_code not in (200, 201):
+        except requests.RequestException:
+            cap_res = None
+        if cap_res is None or cap_res.status_code not in (200, 201):
             return (
                 api_failed("Failed to capture PayPal order", headers={"code": 1007})
                 .secure()
@@ -394,4 +560,86 @@ class PaypalCaptureOrderView(viewsets.GenericViewSet, mixins.CreateModelMixin):
             api_success(body=cap_data)
             .secure()
             .rest()
-        )
\ No newline at end of file
+        )
+
+
+class AsyncPaypalCreateOrderView(AsyncAPIView):
+    """PaypalCreateOrderView for ASGI: waits on PayPal without holding a thread."""
+    basename = 'create_paypal_order'
+
+    async def handle(self, request, *args, **kwargs):
+        serializer = PaypalCreateOrderSerializer(data=request.data)
+        if not serializer.is_valid():
+            # What DRF's exception handler answers for raise_exception=True
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        purchase_units = data['purchase_units']
+        intent = data.get('intent', 'CAPTURE')
+        experience_context = data.get('experience_context', {})
+        amount = data.get("amount")
+        try:
+            user = await User.objects.aget(user_id=data.get('user'))
+        except User.DoesNotExist:
+            return api_failed("User not found", headers={"code": 1004}).secure().rest()
+
+        body = {
+            "intent": intent,
+            "purchase_units": purchase_units,
+            "payment_source": {"paypal": {"experience_context": experience_context}},
+        }
+        try:
+            order_res = await paypal.apost("/v2/checkout/orders", json=body)
+        except paypal.PaypalTokenError:
+            return api_failed("Failed to obtain PayPal access token.", headers={"code": 1002}).secure().rest()
+        except requests.RequestException:
+            order_res = None
+        if order_res is None or order_res.status_code not in (200, 201):
+            return api_failed("Failed to capture PayPal order", headers={"code": 1003}).secure().rest()
+        order_data = order_res.json()
+
+        try:
+            await sync_to_async(PaypalCreateOrderView.save_order)(
+                user, amount, intent, purchase_units, experience_context, order_data)
+        except Exception as e:
+            logger.warning(f"Saving PayPal order {order_data.get('id')} failed: {e}")
+            return api_failed("Failed to save order to DB", headers={"code": 1009}).secure().rest()
+        return api_success(api_msg='Success', body=order_data).secure().rest()
+
+
+class AsyncPaypalCaptureOrderView(AsyncAPIView):
+    """PaypalCaptureOrderView for ASGI: waits on PayPal without holding a thread."""
+    basename = 'paypal_capture_order'
+
+    @async_idempotent
+    async def handle(self, request, *args, **kwargs):
+        order_id = get_body_data(request, 'orderID', '').strip()
+        if not order_id:
+            return api_failed("orderID is required.", headers={"code": 1004}).secure().rest()
+        try:
+            paypal_order = await PaypalOrder.objects.aget(order_id=order_id)
+        except PaypalOrder.DoesNotExist:
+            return api_failed("Order not found.", headers={"code": 1005}).secure().rest()
+
+        try:
+            cap_res = await paypal.apost(f"/v2/checkout/orders/{order_id}/capture")
+        except paypal.PaypalTokenError:
+            return api_failed("Failed to obtain PayPal access token.", headers={"code": 1006}).secure().rest()
+        except requests.RequestException:
+            cap_res = None
+        if cap_res is None or cap_res.status_code not in (200, 201):
+            return api_failed("Failed to capture PayPal order", headers={"code": 1007}).secure().rest()
+        cap_data = cap_res.json()
+
+        paypal_order.status = cap_data.get('status', paypal_order.status)
+        paypal_order.raw_response = cap_data
+        await paypal_order.asave()
+        first_capture = cap_data["purchase_units"][0]["payments"]["captures"][0]
+        await PrepareOrder.objects.aupdate_or_create(
+            id=cap_data.get('id'),
+            defaults={
+                "notes": cap_data,
+                "amount": first_capture["amount"]["value"],
+                "currency": first_capture["amount"]["currency_code"],
+            }
+        )
+        return api_success(body=cap_data).secure().rest()
@@ -1,17 +1,65 @@
 from rest_framework import mixins, viewsets, status
 from api.models import *
-from api.serializers_files.serializers import ProductSerializer, ReviewSerializer, WishlistSerializer, BrandSerializer, \
-    AddressSerializer, OrderHistorySerializer, CouponSerializer, UserCouponSerializer, CancelRefundSerializer
+from api.serializers_files.serializers import ProductSerializer, WishlistSerializer, BrandSerializer, \
+    AddressSerializer, OrderHistorySerializer, CouponSerializer, UserCouponSerializer, CancelRefundSerializer, \
+    BrandSummarySerializer, ProductPreviewSerializer
+from api.serializers_files.fast_serializers import product_rows, product_rows_by_ids, review_rows, serialize_products, \
+    serialize_reviews
 from api.utility_files.api_call import get_body_data, api_failed, api_success
+from api.utility_files.catalog_cache import get_cached_listing, set_cached_listing
+from api.utility_files.category_tree import category_tree
+from api.utility_files.pagination import PaginationError, is_paginated_request, get_page_params, paginate_keyset, \
+    paginate_ranked
+from api.utility_files.product_filters import FilterError, apply_base_filters, apply_facet_filters, cache_key_parts, \
+    facet_counts, get_filters
+from api.utility_files.search_index import search_product_ids
+from api.utility_files.stock import get_available_stock
+from api.utility_files.suggest import suggestion_index, DEFAULT_SUGGEST_LIMIT, MAX_SUGGEST_LIMIT
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
-from django.db.models import Count, Q
+from django.db.models import Count, Q, F, Window
+from django.db.models.functions import RowNumber
 from dateutil.relativedelta import relativedelta
 from django.db.models import Prefetch
+
+# Fields clients may pass as "sort" (prefix with "-" for descending) when paging
+PRODUCT_SORT_FIELDS = ("created_at", "updated_at", "price", "sold_count", "name", "rating_avg")
+REVIEW_SORT_FIELDS = ("created_at", "helpful_count")
+ORDER_HISTORY_SORT_FIELDS = ("created_at",)
+SEARCH_SORT_FIELDS = ("relevance",) + PRODUCT_SORT_FIELDS
+# Preview products per brand in the brand summary listing
+DEFAULT_BRAND_PREVIEW_SIZE = 4
+MAX_BRAND_PREVIEW_SIZE = 12
+
+
+def wants_reviews(request) -> bool:
+    """
+    Full listings attach every review of the listed products unless the client sends "include_reviews": false;
+    products carry rating_avg, rating_count and rating_histogram, so most clients no longer need the dump.
+    """
+    return get_body_data(request, "include_reviews", True) not in (False, 0, "false", "0")
+
+
+def get_listing_params(request):
+    """
+    Paging and sort parameters of a product listing.
+    :return: (page params or None for the full listing, sort field); the full listing keeps the table order
+             unless the client sends "sort"
+    :raise PaginationError: On an invalid sort, limit or cursor
+    """
+    if is_paginated_request(request):
+        page_params = get_page_params(request, PRODUCT_SORT_FIELDS)
+        return page_params, page_params["sort"]
+    if get_body_data(request, "sort", ""):
+        return None, get_page_params(request, PRODUCT_SORT_FIELDS)["sort"]
+    return None, None
+
 #Product list
 class GetProductListView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     queryset = Product.objects.all()
+    # Reads go to the replica, see api.utility_files.db_routing
+    read_only = True
 
     def create(self, request, *args, **kwargs):
         category_name = get_body_data(request, "category", "").strip()
@@ -19,33 +67,66 @@ class GetProductListView(viewsets.GenericViewSet, mixins.CreateModelMixin):
         print("category:", category_name, "| subcategory:", subcategory_name)
 
         try:
-            # Find the parent category
-            parent_category = Category.objects.filter(name=category_name, parent=None).first()
-            if not parent_category:
-                return api_failed("Invalid category", headers={"code": 1001}).secure().rest()
-
-            # Get all subcategories under the parent
-            subcategories = Category.objects.filter(parent=parent_category)
+            page_params, sort = get_listing_params(request)
+            filters = get_filters(request)
+        except PaginationError as e:
+            return api_failed(str(e), headers={"code": 1005}).secure().rest()
+        except FilterError as e:
+            return api_failed(str(e), headers={"code": 1006}).secure().rest()
+
+        # Serve from the catalog cache; absolute media URLs depend on the host, so it is part of the key
+        include_reviews = page_params is None and wants_reviews(request)
+        cache_parts = (request.build_absolute_uri('/'), category_name, subcategory_name.lower() or "all", page_params,
+                       sort, include_reviews, *cache_key_parts(filters))
+        cached_body = get_cached_listing("products", *cache_parts)
+        if cached_body is not None:
+            response = api_success("Products fetched successfully", body=cached_body).secure()
+            return response.rest() if page_params is not None else response.stream()
 
-            # If subcategory is empty or "all", return products from all subcategories
-            if not subcategory_name or subcategory_name.lower() == "all":
-                products = Product.objects.prefetch_related("reviews__user", "variants").filter(category__in=[parent_category, *subcategories])
+        try:
+            # Find the parent category (in-memory tree, no query)
+            tree = category_tree.current()
+            parent_category = tree.by_name(category_name)
+            if parent_category is None or parent_category.parent_id is not None:
+                return api_failed("Invalid category", headers={"code": 1001}).secure().rest()
 
-            else:
-                # Find the exact subcategory
-                subcategory = subcategories.filter(name=subcategory_name).first()
-                if not subcategory:
+            # If subcategory is empty or "all", return products from the whole tree under the parent
+            subcategory_ids = None
+            if subcategory_name and subcategory_name.lower() != "all":
+                # Find the subcategory, at any depth under the parent
+                subcategory = tree.by_name(subcategory_name)
+                if subcategory is None or parent_category.id not in subcategory.path:
                     return api_failed("Invalid subcategory", headers={"code": 1002}).secure().rest()
-                products = Product.objects.prefetch_related("reviews__user", "variants").filter(category=subcategory)
+                subcategory_ids = subcategory.descendant_ids
 
-            # Fetch reviews for these products
-            reviews = Review.objects.filter(product__in=products)
+            base = apply_base_filters(Product.objects.filter(category__in=parent_category.descendant_ids), filters)
+            products = apply_facet_filters(base, filters, subcategory_ids)
 
-            # Serialize products and reviews
-            serialized_products = ProductSerializer(products, many=True, context={"request": request}).data
-            serialized_reviews = ReviewSerializer(reviews, many=True, context={"request": request}).data
-
-            return api_success("Products fetched successfully", body={"products": serialized_products, "reviews": serialized_reviews}).secure().rest()
+            if page_params is not None:
+                # Paged listing: reviews are not bulk-attached, clients page them through get_product_reviews
+                page, next_cursor = paginate_keyset(product_rows(products), **page_params)
+                serialized_products = serialize_products(page, request)
+                body = {"products": serialized_products, "next_cursor": next_cursor}
+            else:
+                if sort:
+                    products = products.order_by(sort, "pk")
+                # Serialize products and reviews (plain-dict fast path, same JSON as ProductSerializer/ReviewSerializer)
+                body = {"products": serialize_products(product_rows(products), request)}
+                if include_reviews:
+                    # Fetch reviews for these products
+                    reviews = Review.objects.filter(product__in=products)
+                    body["reviews"] = serialize_reviews(review_rows(reviews), request)
+            if page_params is None or not page_params["cursor"]:
+                # Facets for the filter UI, sent with the first page only
+                body["facets"] = facet_counts(base, filters, parent_category.children, subcategory_ids)
+
+            set_cached_listing(body, "products", *cache_parts)
+            response = api_success("Products fetched successfully", body=body).secure()
+            # Full listings carry every product and review, stream them instead of building one large string
+            return response.rest() if page_params is not None else response.stream()
+
+        except PaginationError as e:
+            return api_failed(str(e), headers={"code": 1005}).secure().rest()
 
         except Exception as e:
             import traceback
@@ -55,6 +136,9 @@ class GetProductListView(viewsets.GenericViewSet, mixins.CreateModelMixin):
 #Product detail view
 class GetProductDetailView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     queryset = Product.objects.all()
+    read_only = True
+    # product, variants, images, stock holds, reviews (with users), review images
+    query_budget = 6
 
     def create(self, request, *args, **kwargs):
         product_id = get_body_data(request, "product_id", "").strip()
@@ -62,29 +146,43 @@ class GetProductDetailView(viewsets.GenericViewSet, mixins.CreateModelMixin):
 
         try:
             # Fetch the product using the given ID
-            product = Product.objects.prefetch_related("reviews__images", "reviews__user", "additional_images").get(id=product_id)
+            product = Product.objects.prefetch_related("additional_images", "variants").get(id=product_id)
 
-            # Fetch all reviews and prefetch related images
-            reviews = product.reviews.all()
+            if is_paginated_request(request):
+                # First page of the review feed ("sort" and "limit" apply to it), later pages come from
+                # get_product_reviews
+                page, next_cursor = paginate_keyset(review_rows(product.reviews.all()),
+                                                    **get_page_params(request, REVIEW_SORT_FIELDS))
+            else:
+                # Clients that send neither limit nor cursor still get every review
+                page, next_cursor = review_rows(product.reviews.all()), None
 
             print("product:", product)
-            print("reviews:", reviews)
 
             # Serialize the product
             serialized_product = ProductSerializer(product, context={"request": request}).data
-            serialized_reviews = ReviewSerializer(reviews, many=True, context={"request": request}).data
+            serialized_reviews = serialize_reviews(page, request)
+
+            # Stock minus live checkout holds
+            available = get_available_stock(product.variants.all())
+            for variant in serialized_product["variants"]:
+                variant["available_stock"] = available[variant["id"]]
 
             return api_success(
                 "Product fetched successfully",
                 body={
                     "product_details": serialized_product,
-                    "product_reviews": serialized_reviews
+                    "product_reviews": serialized_reviews,
+                    "reviews_next_cursor": next_cursor
                 }
             ).secure().rest()
 
         except ObjectDoesNotExist:
             return api_failed("Product not found", headers={"code": 1004}).secure().rest()
 
+        except PaginationError as e:
+            return api_failed(str(e), headers={"code": 1005}).secure().rest()
+
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -127,13 +225,17 @@ class AddRemoveWishlistView(viewsets.GenericViewSet, mixins.CreateModelMixin):
 class GetWishListView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     queryset = Wishlist.objects.all()
     serializer_class = WishlistSerializer
+    # user, wishlist rows with products and brands, variants, additional images
+    query_budget = 4
 
     def create(self, request, *args, **kwargs):
         """Fetch all wishlist items of the authenticated user."""
         user_id = request.data.get("user_id", "")
         try:
             user = User.objects.get(user_id=user_id)
-            wishlist_items = Wishlist.objects.filter(user=user).select_related("product")
+            wishlist_items = Wishlist.objects.filter(user=user).select_related("product__brand").prefetch_related(
+                "product__variants", "product__additional_images"
+            )
             serialized_wishlist = WishlistSerializer(wishlist_items, many=True, context={"request": request}).data
             if len(serialized_wishlist)>0:
                 return api_success("Wishlist fetched successfully", body={"wishlist": serialized_wishlist}).secure().rest()
@@ -146,13 +248,34 @@ class GetWishListView(viewsets.GenericViewSet, mixins.CreateModelMixin):
 
 class GetBrandListView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     queryset = Brand.objects.all()
+    read_only = True
     serializer_class = BrandSerializer
+    # full mode: brands, products with brands, variants, additional images (summary mode needs 2)
+    query_budget = 4
 
     def create(self, request, *args, **kwargs):
         """Fetch all brands"""
+        mode = get_body_data(request, "mode", "full")
         try:
-            brands = Brand.objects.annotate(product_count=Count("products")).order_by("brand_name")
-            print("brands", brands)
+            # Summary cards count and preview only the products customers can see
+            brands = Brand.objects.annotate(
+                product_count=Count("products", filter=Q(products__is_active=True))
+            ).order_by("brand_name")
+            if mode == "summary":
+                try:
+                    preview_size = int(get_body_data(request, "preview_size", DEFAULT_BRAND_PREVIEW_SIZE))
+                except (TypeError, ValueError):
+                    preview_size = DEFAULT_BRAND_PREVIEW_SIZE
+                preview_size = max(0, min(preview_size, MAX_BRAND_PREVIEW_SIZE))
+                brands = self.attach_preview_products(list(brands), preview_size)
+                serialized_brands = BrandSummarySerializer(brands, many=True, context={"request": request}).data
+                return api_success("Brand list fetched successfully", body={"brands": serialized_brands}).secure().rest()
+
+            # Full listing: every product of every brand, loaded in one query per relation
+            brands = brands.prefetch_related(Prefetch(
+                "products",
+                queryset=Product.objects.select_related("brand").prefetch_related("variants", "additional_images"),
+            ))
             serialized_brands = BrandSerializer(brands, many=True, context={"request": request}).data
 
             return api_success("Brand list fetched successfully", body={"brands": serialized_brands}).secure().rest()
@@ -160,8 +283,32 @@ class GetBrandListView(viewsets.GenericViewSet, mixins.CreateModelMixin):
             print(e)
             return api_failed("Error occurred while fetching brands").secure().rest()
 
+    @staticmethod
+    def attach_preview_products(brands, preview_size):
+        """
+        Sets brand.preview_products to the brand's best selling active products, using one query for all brands.
+        :param brands: Brand objects
+        :param preview_size: Products per brand
+        :return: The same brands
+        """
+        previews = {brand.id: [] for brand in brands}
+        if preview_size and previews:
+            ranked = Product.objects.filter(brand_id__in=previews, is_active=True).annotate(
+                preview_rank=Window(
+                    expression=RowNumber(),
+                    partition_by=[F("brand_id")],
+                    order_by=[F("sold_count").desc(), F("id").desc()],
+                )
+            ).filter(preview_rank__lte=preview_size).order_by("brand_id", "preview_rank")
+            for product in ranked:
+                previews[product.brand_id].append(product)
+        for brand in brands:
+            brand.preview_products = previews[brand.id]
+        return brands
+
 class GetBrandProductsView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     queryset = Product.objects.all()
+    read_only = True
 
     def create(self, request, *args, **kwargs):
         """Fetch products by brand and subcategory."""
@@ -170,44 +317,58 @@ class GetBrandProductsView(viewsets.GenericViewSet, mixins.CreateModelMixin):
         print("Brand:", brand_name, "| Subcategory:", subcategory_name)
 
         try:
+            page_params, sort = get_listing_params(request)
+            filters = get_filters(request)
+
             # Find the brand
             brand = get_object_or_404(Brand, brand_name__iexact=brand_name)  # Case insensitive match
             print("brand", brand)
             # Base query: Get products of this brand
-            products_query = Product.objects.filter(brand=brand).prefetch_related("reviews__images", "reviews__user", "additional_images", "variants")
+            products_query = Product.objects.filter(brand=brand)
             # print("products_query", products_query)
+            facet_nodes = category_tree.current().roots
             # Filter by subcategory if it's not "all"
             if subcategory_name.lower() != "all":
-                parent_category = Category.objects.filter(name=subcategory_name).first()
+                parent_category = category_tree.current().by_name(subcategory_name)
                 # print("parent_category>>>>>>", parent_category)
-                if not parent_category:
+                if parent_category is None:
                     return api_failed("Sub category not found", headers={"code": 1002}).secure().rest()
-                if parent_category:
-                    child_subcategories = Category.objects.filter(parent=parent_category)
-                    # print("parent_category", parent_category)
-                    if not child_subcategories:
-                        return api_failed("Invalid subcategory", headers={"code": 1004}).secure().rest()
-                    products_query = Product.objects.filter(Q(brand=brand) &
-                                                            (Q(category=parent_category) | Q(category__in=child_subcategories))
-                    ).prefetch_related("reviews__images", "reviews__user", "additional_images","variants")
-
-                # print("products_query in if", products_query)
-            # Fetch reviews for these products
-            reviews = Review.objects.filter(product__in=products_query)
+                if not parent_category.children:
+                    return api_failed("Invalid subcategory", headers={"code": 1004}).secure().rest()
+                # The category and every category below it
+                products_query = Product.objects.filter(brand=brand, category__in=parent_category.descendant_ids)
+                facet_nodes = parent_category.children
+
+            base = apply_base_filters(products_query, filters)
+            products_query = apply_facet_filters(base, filters)
+            body = {"brand": brand.brand_name, "subcategory": subcategory_name}
+            if page_params is None or not page_params["cursor"]:
+                # Facets for the filter UI, sent with the first page only
+                body["facets"] = facet_counts(base, filters, facet_nodes)
+
+            if page_params is not None:
+                # Paged listing: reviews are not bulk-attached, clients page them through get_product_reviews
+                page, next_cursor = paginate_keyset(product_rows(products_query), **page_params)
+                body["products"] = serialize_products(page, request)
+                body["next_cursor"] = next_cursor
+                return api_success("Products fetched successfully", body=body).secure().rest()
 
             # Serialize products and reviews
-            serialized_products = ProductSerializer(products_query, many=True, context={"request": request}).data
-            serialized_reviews = ReviewSerializer(reviews, many=True, context={"request": request}).data
+            if sort:
+                products_query = products_query.order_by(sort, "pk")
+            body["products"] = serialize_products(product_rows(products_query), request)
+            if wants_reviews(request):
+                # Fetch reviews for these products
+                reviews = Review.objects.filter(product__in=products_query)
+                body["reviews"] = serialize_reviews(review_rows(reviews), request)
 
-            return api_success(
-                "Products fetched successfully",
-                body={
-                    "brand": brand.brand_name,
-                    "subcategory": subcategory_name,
-                    "products": serialized_products,
-                    "reviews": serialized_reviews
-                },
-            ).secure().rest()
+            return api_success("Products fetched successfully", body=body).secure().stream()
+
+        except PaginationError as e:
+            return api_failed(str(e), headers={"code": 1005}).secure().rest()
+
+        except FilterError as e:
+            return api_failed(str(e), headers={"code": 1006}).secure().rest()
 
         except Exception as e:
             import traceback
@@ -357,6 +518,7 @@ from rest_framework import mixins, viewsets
 
 class SearchProductsView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     queryset = Product.objects.all()
+    read_only = True
 
     def create(self, request, *args, **kwargs):
         query = get_body_data(request, "query", "").strip()
@@ -365,38 +527,108 @@ class SearchProductsView(viewsets.GenericViewSet, mixins.CreateModelMixin):
             return api_success("No search term provided", body={"products": [], "reviews": []}).secure().rest()
 
         try:
-            # Filter products by name, description, or brand name (case-insensitive)
-            products = Product.objects.prefetch_related("reviews__user").filter(
-                Q(name__icontains=query)
-                | Q(description__icontains=query)
-                | Q(brand__brand_name__icontains=query)
-            )
+            # Ranked product ids from the search index (name, brand, ingredients, how_to_use, description)
+            ranked_ids = search_product_ids(query)
+
+            if is_paginated_request(request):
+                # Paged results: reviews are not bulk-attached, clients page them through get_product_reviews
+                page_params = get_page_params(request, SEARCH_SORT_FIELDS, default_sort="relevance")
+                if page_params["sort"].lstrip("-") == "relevance":
+                    page_ids, next_cursor = paginate_ranked(ranked_ids, page_params["cursor"], page_params["limit"],
+                                                            sort=page_params["sort"])
+                    page = product_rows_by_ids(page_ids)
+                else:
+                    page, next_cursor = paginate_keyset(
+                        product_rows(Product.objects.filter(id__in=ranked_ids)), **page_params
+                    )
+                serialized_products = serialize_products(page, request)
+                return api_success("Search results", body={
+                    "products": serialized_products,
+                    "next_cursor": next_cursor
+                }).secure().rest()
 
-            # Fetch all reviews for the filtered products
-            reviews = Review.objects.filter(product__in=products)
+            products = product_rows_by_ids(ranked_ids)
 
             # Serialize products and reviews
-            serialized_products = ProductSerializer(products, many=True, context={"request": request}).data
-            serialized_reviews = ReviewSerializer(reviews, many=True, context={"request": request}).data
+            body = {"products": serialize_products(products, request)}
+            if wants_reviews(request):
+                # Fetch all reviews for the filtered products
+                reviews = Review.objects.filter(product_id__in=[product["id"] for product in products])
+                body["reviews"] = serialize_reviews(review_rows(reviews), request)
 
-            return api_success("Search results", body={
-                "products": serialized_products,
-                "reviews": serialized_reviews
-            }).secure().rest()
+            return api_success("Search results", body=body).secure().rest()
+
+        except PaginationError as e:
+            return api_failed(str(e), headers={"code": 1005}).secure().rest()
 
         except Exception as e:
             import traceback
             traceback.print_exc()
             return api_failed("Error occurred while searching products", headers={"code": 1003}).secure().rest()
 
+
+class SuggestView(viewsets.GenericViewSet, mixins.CreateModelMixin):
+    queryset = Product.objects.none()
+    read_only = True
+
+    def create(self, request, *args, **kwargs):
+        """Typeahead suggestions for product, brand and category names, served from memory."""
+        query = get_body_data(request, "query", "")
+        try:
+            limit = int(get_body_data(request, "limit", DEFAULT_SUGGEST_LIMIT) or DEFAULT_SUGGEST_LIMIT)
+        except (TypeError, ValueError):
+            return api_failed("limit must be an integer", headers={"code": 1001}).secure().rest()
+
+        suggestions = suggestion_index.suggest(str(query), max(1, min(limit, MAX_SUGGEST_LIMIT)))
+        return api_success("Suggestions fetched successfully", body=suggestions).secure().rest()
+
+
+class GetProductReviewsView(viewsets.GenericViewSet, mixins.CreateModelMixin):
+    queryset = Review.objects.all()
+    read_only = True
+    # reviews (with users), images of the page
+    query_budget = 2
+
+    def create(self, request, *args, **kwargs):
+        """
+        Fetch one page of a product's reviews, newest first by default.
+        "sort" may be created_at or helpful_count (prefix with "-" for descending).
+        """
+        product_id = get_body_data(request, "product_id", "")
+        if not product_id:
+            return api_failed("Product ID is required", headers={"code": 1001}).secure().rest()
+
+        try:
+            page_params = get_page_params(request, REVIEW_SORT_FIELDS)
+            reviews = review_rows(Review.objects.filter(product_id=product_id))
+            page, next_cursor = paginate_keyset(reviews, **page_params)
+            serialized_reviews = serialize_reviews(page, request)
+
+            return api_success(
+                "Reviews fetched successfully",
+                body={"reviews": serialized_reviews, "next_cursor": next_cursor}
+            ).secure().rest()
+
+        except PaginationError as e:
+            return api_failed(str(e), headers={"code": 1005}).secure().rest()
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return api_failed("Error occurred while fetching reviews", headers={"code": 1003}).secure().rest()
+
 class GetUserOrderHistoryView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     queryset = Orders.objects.all()
     serializer_class = OrderHistorySerializer
+    # full mode: user, orders (with order_ref and address), items (with variant, product and brand), product
+    # variants, product images (compact mode needs 3)
+    query_budget = 5
 
     def create(self, request, *args, **kwargs):
         # 1. Extract user_id and range from the request body
         user_id = get_body_data(request, "user_id", "").strip()
         range_value = get_body_data(request, "range", "").strip().lower()  # e.g., "3m", "6m", "1y", "3y"
+        mode = get_body_data(request, "mode", "full")  # "compact": item snapshots, one page at a time
 
         if not user_id:
             return api_failed("User ID is required", headers={"code": 1001}).secure().rest()
@@ -425,18 +657,68 @@ class GetUserOrderHistoryView(viewsets.GenericViewSet, mixins.CreateModelMixin):
             if filter_date:
                 orders_qs = orders_qs.filter(created_at__gte=filter_date)
 
-            # 5. Prefetch order_items and the related product (for product details)
-            orders_qs = orders_qs.prefetch_related("order_items__product").order_by("-created_at")
+            if mode == "compact":
+                page_params = get_page_params(request, ORDER_HISTORY_SORT_FIELDS)
+                page, next_cursor = paginate_keyset(
+                    orders_qs.only("id", "order_ref_id", "total_price", "status", "created_at"), **page_params
+                )
+                return api_success(
+                    "Order history fetched successfully",
+                    body={"orders": self.build_compact_orders(page, request), "next_cursor": next_cursor}
+                ).secure().rest()
+
+            # 5. Load every relation the nested serializers read, one query per relation
+            orders_qs = orders_qs.select_related("order_ref", "address").prefetch_related(Prefetch(
+                "order_items",
+                queryset=OrderItem.objects.select_related("variant", "product__brand")
+                .prefetch_related("product__variants", "product__additional_images"),
+            )).order_by("-created_at")
 
             # 6. Serialize and return the order history
             serialized_orders = self.get_serializer(orders_qs, many=True, context={"request": request}).data
             return api_success("Order history fetched successfully", body={"orders": serialized_orders}).secure().rest()
 
+        except PaginationError as e:
+            return api_failed(str(e), headers={"code": 1005}).secure().rest()
         except Exception as e:
             import traceback
             traceback.print_exc()
             return api_failed("Error occurred while fetching order history", headers={"code": 1003}).secure().rest()
 
+    @staticmethod
+    def build_compact_orders(orders, request):
+        """
+        Order history rows with a snapshot of each line item (name, thumbnail, variant, price, quantity), read with
+        one query for all items of the page.
+        :param orders: Orders of the page
+        :param request: DRF request, used for absolute image URLs
+        :return: List of order dicts
+        """
+        items = {order.id: [] for order in orders}
+        if items:
+            image_storage = Product._meta.get_field("main_image").storage
+            rows = OrderItem.objects.filter(order_id__in=items).order_by("id").values(
+                "order_id", "product_id", "product__name", "product__main_image", "variant__name", "price", "quantity",
+            )
+            for row in rows:
+                image = row["product__main_image"]
+                items[row["order_id"]].append({
+                    "product_id": row["product_id"],
+                    "name": row["product__name"],
+                    "thumbnail": request.build_absolute_uri(image_storage.url(image)) if image else None,
+                    "variant_name": row["variant__name"],
+                    "price": int(row["price"]),
+                    "quantity": row["quantity"],
+                })
+        return [{
+            "id": order.id,
+            "order_id": order.order_ref_id,
+            "total_price": int(order.total_price),
+            "status": order.status,
+            "created_at": order.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "items": items[order.id],
+        } for order in orders]
+
 class RegisterCouponView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     queryset = Coupon.objects.all()
     serializer_class = CouponSerializer
@@ -0,0 +1,36 @@
+from rest_framework import mixins, viewsets, status
+from api.utility_files.api_call import api_success, api_failed
+from api.utility_files.payment_events import InvalidWebhook, ingest_paypal, ingest_razorpay
+
+
+class RazorpayWebhookView(viewsets.GenericViewSet, mixins.CreateModelMixin):
+    """
+    Razorpay webhook. Verifies X-Razorpay-Signature over the raw body, stores the event and acknowledges;
+    reconcile_payment_events applies it later.
+    """
+    queryset = []
+    query_budget = 1
+
+    def create(self, request, *args, **kwargs):
+        try:
+            ingest_razorpay(request.body, request.headers.get("X-Razorpay-Signature", ""),
+                            request.headers.get("X-Razorpay-Event-Id"))
+        except InvalidWebhook as e:
+            return api_failed(str(e), headers={"code": 1001}).http(status.HTTP_400_BAD_REQUEST)
+        return api_success("Event received").http()
+
+
+class PaypalWebhookView(viewsets.GenericViewSet, mixins.CreateModelMixin):
+    """
+    PayPal webhook. Stores the event with its transmission headers and acknowledges; the reconciler verifies the
+    delivery with PayPal before applying it.
+    """
+    queryset = []
+    query_budget = 1
+
+    def create(self, request, *args, **kwargs):
+        try:
+            ingest_paypal(request.body, request.headers)
+        except InvalidWebhook as e:
+            return api_failed(str(e), headers={"code": 1001}).http(status.HTTP_400_BAD_REQUEST)
+        return api_success("Event received").http()
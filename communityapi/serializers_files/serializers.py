@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from django.db.models import Count, Exists, IntegerField, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
 
 from api.utility_files.api_call import get_body_data
 from communityapi.models import *
@@ -40,12 +42,55 @@ class StorySerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('user', 'created_at')
 
+    @staticmethod
+    def _through_count(through, user_field):
+        return Coalesce(
+            Subquery(
+                through.objects.filter(story=OuterRef("pk")).order_by().values("story")
+                .annotate(total=Count(user_field)).values("total"),
+                output_field=IntegerField(),
+            ),
+            Value(0),
+        )
+
+    @classmethod
+    def setup_queryset(cls, queryset, user=None):
+        """
+        Computes the counts and the per-user flags in the story query itself, so serializing a list of stories costs
+        a fixed number of queries (stories, viewer ids, liker ids) however many stories there are.
+        :param queryset: Story queryset
+        :param user: Requesting user, or None
+        :return: Annotated queryset
+        """
+        viewers, likes = Story.viewers.through, Story.likes.through
+        queryset = queryset.select_related("user").prefetch_related(
+            Prefetch("viewers", queryset=User.objects.only("user_id")),
+            Prefetch("likes", queryset=User.objects.only("user_id")),
+        ).annotate(
+            views_count_value=cls._through_count(viewers, "user"),
+            likes_count_value=cls._through_count(likes, "user"),
+        )
+        if user is None:
+            return queryset.annotate(is_viewed_value=Value(False), is_liked_value=Value(False))
+        return queryset.annotate(
+            is_viewed_value=Exists(viewers.objects.filter(story=OuterRef("pk"), user=user)),
+            is_liked_value=Exists(likes.objects.filter(story=OuterRef("pk"), user=user)),
+        )
+
     def _get_request_user(self):
         """
         Helper function to obtain the user from request context.
-        First, it attempts to use request.user if available and authenticated.
-        Otherwise, it falls back to reading 'user_id' from the request data.
+        A "user" passed in the serializer context is used as is; otherwise request.user if authenticated,
+        falling back to reading 'user_id' from the request data. The result is looked up once per serialization.
         """
+        if "user" in self.context:
+            return self.context["user"]
+        root = self.root
+        if not hasattr(root, "_request_user"):
+            root._request_user = self._resolve_request_user()
+        return root._request_user
+
+    def _resolve_request_user(self):
         request = self.context.get("request")
         user = None
         if request:
@@ -61,28 +106,36 @@ class StorySerializer(serializers.ModelSerializer):
                         user = None
         return user
 
+    # Stories loaded through setup_queryset carry the *_value annotations; single stories are queried directly
     def get_is_viewed(self, obj):
+        if hasattr(obj, "is_viewed_value"):
+            return obj.is_viewed_value
         user = self._get_request_user()
         if user:
             return obj.viewers.filter(pk=user.pk).exists()
         return False
 
     def get_views_count(self, obj):
+        if hasattr(obj, "views_count_value"):
+            return obj.views_count_value
         return obj.viewers.count()
 
     def get_is_liked(self, obj):
+        if hasattr(obj, "is_liked_value"):
+            return obj.is_liked_value
         user = self._get_request_user()
         if user:
             return obj.likes.filter(pk=user.pk).exists()
         return False
 
     def get_likes_count(self, obj):
+        if hasattr(obj, "likes_count_value"):
+            return obj.likes_count_value
         return obj.likes.count()
 
     def get_media(self, obj):
         request = self.context.get('request')
         if request and obj.media:
-            print("obj.media", obj.media)
             return request.build_absolute_uri(obj.media.url)
         return None
 
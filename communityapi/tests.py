@@ -1,3 +1,64 @@
+import json
+
+from datetime import timedelta
+
+from django.conf import settings
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from api.models import User
+from api.utility_files import crypto
+from api.utility_files.query_metrics import query_budget
+from communityapi.models import LiveStream, Story
+from communityapi.views_files import GetActiveStoriesView, GetLiveStreamListView
+
+
+def call_view(view_class, data):
+    """Calls a POST view directly (no SecureRequestMiddleware) and returns the decrypted response."""
+    request = APIRequestFactory().post('/api/community/', data, format='json')
+    response = view_class.as_view({'post': 'create'})(request)
+    return json.loads(crypto.decrypt_data(settings.ECOM_SECRET, response.data['enc_data']))
+
+
+class LiveStreamQueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email='live@test.com', name='Live', user_id='U_LIVE', password='x')
+        for index in range(5):
+            LiveStream.objects.create(user=user, title=f'Stream {index}', stream_id=f'stream-{index}')
+
+    def test_live_stream_list_within_budget(self):
+        with query_budget(GetLiveStreamListView.query_budget):
+            result = call_view(GetLiveStreamListView, {'live_only': 'true'})
+        self.assertEqual(len(result['body']['livestreams']), 5)
+
+
+class ActiveStoriesQueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create_user(email=f'story{index}@test.com', name='Story', user_id=f'U_STORY{index}',
+                                          password='x') for index in range(4)]
+        expires_at = timezone.now() + timedelta(days=1)
+        for index in range(6):
+            story = Story.objects.create(user=users[0], media='media/stories/s.mp4', expires_at=expires_at)
+            story.viewers.add(*users[:index % 4])
+            story.likes.add(*users[1:index % 3 + 1])
+        cls.viewer = users[1]
+
+    def test_stories_cost_a_fixed_number_of_queries(self):
+        with query_budget(GetActiveStoriesView.query_budget, max_duplicates=0):
+            result = call_view(GetActiveStoriesView, {'user_id': self.viewer.user_id})
+        stories = result['body']['stories']
+        self.assertEqual(len(stories), 6)
 
-# Create your tests here.
+        for story in stories:
+            db_story = Story.objects.get(id=story['id'])
+            self.assertEqual(story['views_count'], db_story.viewers.count())
+            self.assertEqual(story['likes_count'], db_story.likes.count())
+            self.assertEqual(story['is_viewed'], db_story.viewers.filter(pk=self.viewer.pk).exists())
+            self.assertEqual(story['is_liked'], db_story.likes.filter(pk=self.viewer.pk).exists())
+            self.assertEqual(sorted(story['viewers']), sorted(db_story.viewers.values_list('pk', flat=True)))
+        # Unseen stories come first
+        seen = [story['is_viewed'] for story in stories]
+        self.assertEqual(seen, sorted(seen))
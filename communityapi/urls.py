@@ -16,7 +16,13 @@ router.register('get_live_stream', views_files.GetLiveStreamListView, basename='
 router.register('start_live_streaming', views_files.CreateLiveStreamView, basename='start_live_streaming')
 router.register('create_live_room_id', views_files.CreateStreamIdView, basename='create_live_stream_id')
 
-urlpatterns = [
+# Async variants take the same URLs when serving ASGI, see settings.ASYNC_VIEWS
+async_urlpatterns = [
+    path('start_live_streaming/', views_files.AsyncCreateLiveStreamView.as_view(), name='start_live_streaming-list'),
+    path('create_live_room_id/', views_files.AsyncCreateStreamIdView.as_view(), name='create_live_stream_id-list'),
+]
+
+urlpatterns = (async_urlpatterns if settings.ASYNC_VIEWS else []) + [
     # auth api
     path('', include(router.urls))
 ]
@@ -6,7 +6,9 @@ MarkStoryLikedView,
 CreateStoryView,
 GetLiveStreamListView,
 CreateLiveStreamView,
-CreateStreamIdView
+CreateStreamIdView,
+AsyncCreateLiveStreamView,
+AsyncCreateStreamIdView
 )
 
 __all__=[
@@ -17,5 +19,7 @@ __all__=[
 "CreateStoryView",
 "GetLiveStreamListView",
 "CreateLiveStreamView",
-"CreateStreamIdView"
+"CreateStreamIdView",
+"AsyncCreateLiveStreamView",
+"AsyncCreateStreamIdView"
 ]
\ No newline at end of file
@@ -1,5 +1,7 @@
 import traceback
-import requests
+from asgiref.sync import sync_to_async
+from api.utility_files import resilience
+from api.utility_files.async_view import AsyncAPIView
 from rest_framework import mixins, viewsets, status
 from django.middleware.csrf import get_token
 from rest_framework.response import Response
@@ -16,10 +18,11 @@ from communityapi.serializers_files.serializers import (
 )
 from api.utility_files.api_call import get_body_data, api_success, api_failed
 from django.contrib.auth import get_user_model
-from django.db.models import Case, When, BooleanField, Value
 
 from ecombackend import settings
 
+VIDEOSDK_ROOMS_URL = "https://api.videosdk.live/v2/rooms"
+
 
 class GetCsrfView(viewsets.GenericViewSet, mixins.ListModelMixin):
     queryset = []
@@ -41,12 +44,12 @@ class CreateLiveStreamView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     serializer_class = LiveStreamSerializer
     def createStreamid(self):
         try:
-            url = "https://api.videosdk.live/v2/rooms"
+            url = VIDEOSDK_ROOMS_URL
             headers = {
                 "authorization": settings.STREAM_TOKEN,
                 "Content-Type": "application/json",
             }
-            response = requests.post(url, headers=headers, json={})
+            response = resilience.post('videosdk', url, headers=headers, json={})
             response.raise_for_status()  # Raises an error for bad responses.
             data = response.json()
             print("data", data)
@@ -57,6 +60,14 @@ class CreateLiveStreamView(viewsets.GenericViewSet, mixins.CreateModelMixin):
         except Exception as e:
             return str(e)
     def create(self, request, *args, **kwargs):
+        _stream_url = self.createStreamid()
+        if not _stream_url:
+            return api_failed("Stream ID is failed", headers={"code": 1001}).secure().rest()
+        return self.start_stream(request, _stream_url)
+
+    @staticmethod
+    def start_stream(request, _stream_url):
+        """Saves the live stream once videosdk gave it a room id."""
         user_id = get_body_data(request, "user_id", "").strip()
         title = get_body_data(request, "title", "").strip()
         description = get_body_data(request, "description", "").strip()
@@ -64,10 +75,6 @@ class CreateLiveStreamView(viewsets.GenericViewSet, mixins.CreateModelMixin):
         recording = get_body_data(request, "recording", "").strip()
         is_live = get_body_data(request, "is_live", False)
 
-        _stream_url = self.createStreamid()
-        if not _stream_url:
-            return api_failed("Stream ID is failed", headers={"code": 1001}).secure().rest()
-
         try:
             user = User.objects.get(user_id=user_id)
         except User.DoesNotExist:
@@ -94,7 +101,7 @@ class CreateLiveStreamView(viewsets.GenericViewSet, mixins.CreateModelMixin):
                     thumbnail_path = save_image(thumbnail, image_directory='thumbnail')
                     livestream.thumbnail = thumbnail_path
                     livestream.save()
-                serialized = self.get_serializer(livestream, context={"request": request}).data
+                serialized = LiveStreamSerializer(livestream, context={"request": request}).data
                 return api_success("Live stream created successfully.", body={"livestream": serialized}).secure().rest()
             except Exception as e:
                 import traceback
@@ -103,12 +110,42 @@ class CreateLiveStreamView(viewsets.GenericViewSet, mixins.CreateModelMixin):
         else:
             return api_success("Live stream created successfully.", body={"livestream": ""}).secure().rest()
 
+
+async def create_room(token):
+    """
+    Creates a videosdk room without blocking the event loop.
+    :return: The room as videosdk returns it (roomId, links, ...)
+    :raise requests.RequestException: On connection errors, timeouts and error responses
+    """
+    response = await resilience.apost('videosdk', VIDEOSDK_ROOMS_URL, json={},
+                                      headers={"authorization": token, "Content-Type": "application/json"})
+    response.raise_for_status()
+    return response.json()
+
+
+class AsyncCreateLiveStreamView(AsyncAPIView):
+    """
+    CreateLiveStreamView for ASGI: waits on videosdk without holding a thread.
+    """
+
+    async def handle(self, request, *args, **kwargs):
+        try:
+            _stream_url = (await create_room(settings.STREAM_TOKEN)).get("roomId")
+        except Exception:
+            _stream_url = None
+        if not _stream_url:
+            return api_failed("Stream ID is failed", headers={"code": 1001}).secure().rest()
+        # Saving the thumbnail and the row is local work, done on the request's thread
+        return await sync_to_async(CreateLiveStreamView.start_stream)(request, _stream_url)
+
+
 class GetLiveStreamListView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     """
     Fetch a list of live streams (can be filtered by live/recorded status).
     """
     queryset = LiveStream.objects.all()
     serializer_class = LiveStreamSerializer
+    query_budget = 1
 
     def create(self, request, *args, **kwargs):
         # Parameter: live_only = "true" or "false"
@@ -197,7 +234,10 @@ class GetActiveStoriesView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     sorted so that unseen and new stories come first.
     """
     queryset = Story.objects.all()
+    read_only = True
     serializer_class = StorySerializer
+    # user lookup, stories with counts and flags, viewer ids, liker ids
+    query_budget = 4
 
     def create(self, request, *args, **kwargs):
         try:
@@ -209,20 +249,22 @@ class GetActiveStoriesView(viewsets.GenericViewSet, mixins.CreateModelMixin):
             qs = Story.objects.filter(expires_at__gt=current_time)
             # Optionally, use filter_flag here if needed (currently "active" is assumed)
 
-            # If the user is authenticated, annotate and order by unseen status and creation time.
+            # Resolve the requesting user once (session user, else user_id from the body)
             if request.user and request.user.is_authenticated:
-                qs = qs.annotate(
-                    is_unseen=Case(
-                        When(viewers__pk=request.user.pk, then=Value(False)),
-                        default=Value(True),
-                        output_field=BooleanField()
-                    )
-                ).order_by("-is_unseen", "-created_at")
+                user = request.user
+            else:
+                user_id = get_body_data(request, "user_id", "")
+                user = User.objects.filter(user_id=user_id).first() if user_id else None
+
+            qs = StorySerializer.setup_queryset(qs, user)
+            # Unseen stories first (False sorts before True), then the newest
+            if user is not None:
+                qs = qs.order_by("is_viewed_value", "-created_at")
             else:
                 qs = qs.order_by("-created_at")
 
             serialized_stories = self.get_serializer(
-                qs, many=True, context={"request": request}
+                qs, many=True, context={"request": request, "user": user}
             ).data
 
             return api_success("Active stories fetched successfully.",
@@ -387,12 +429,12 @@ class CreateStreamIdView(viewsets.GenericViewSet, mixins.CreateModelMixin):
         user_id = get_body_data(request, 'user_id', default='').strip()
         token = get_body_data(request, "token", "").strip()
         try:
-            url = "https://api.videosdk.live/v2/rooms"
+            url = VIDEOSDK_ROOMS_URL
             headers = {
                 "authorization": token,
                 "Content-Type": "application/json",
             }
-            response = requests.post(url, headers=headers, json={})
+            response = resilience.post('videosdk', url, headers=headers, json={})
             response.raise_for_status()  # Raises an error for bad responses.
             data = response.json()
             print("data", data)
@@ -410,4 +452,23 @@ class CreateStreamIdView(viewsets.GenericViewSet, mixins.CreateModelMixin):
         except Exception as e:
             import traceback
             traceback.print_exc()
-            return api_failed("Error occurred while processing follow request.", headers={"code": 1002}).secure().rest()
\ No newline at end of file
+            return api_failed("Error occurred while processing follow request.", headers={"code": 1002}).secure().rest()
+
+
+class AsyncCreateStreamIdView(AsyncAPIView):
+    """
+    CreateStreamIdView for ASGI: waits on videosdk without holding a thread.
+    """
+
+    async def handle(self, request, *args, **kwargs):
+        token = get_body_data(request, "token", "").strip()
+        try:
+            data = await create_room(token)
+            stream_id = data.get("roomId")
+            get_room = data.get('links').get('get_room')
+            if not stream_id:
+                raise ValueError("Stream ID not found in response")
+            return api_success("Got the Meeting id.", body={"roomId": stream_id, "get_room": get_room}).secure().rest()
+        except Exception as e:
+            traceback.print_exc()
+            return api_failed("Error occurred while processing follow request.", headers={"code": 1002}).secure().rest()
@@ -32,7 +32,9 @@ class CourseSerializer(serializers.ModelSerializer):
         ]
 
     def get_learners(self, obj):
-        # Calculate the number of learners by counting related enrollments
+        # Listings annotate learners_count; count the related enrollments otherwise
+        if hasattr(obj, "learners_count"):
+            return obj.learners_count
         return obj.enrollments.count()
 
     def get_duration(self, obj):
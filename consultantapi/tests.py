@@ -1,3 +1,35 @@
+import json
+
+from django.conf import settings
 from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+
+from api.utility_files import crypto
+from api.utility_files.query_metrics import query_budget
+from consultantapi.models import Course, CourseUser, Enrollment
+from consultantapi.views_files import CourseListView
+
+
+def call_view(view_class, data):
+    """Calls a POST view directly (no SecureRequestMiddleware) and returns the decrypted response."""
+    request = APIRequestFactory().post('/api/consultant/', data, format='json')
+    response = view_class.as_view({'post': 'create'})(request)
+    return json.loads(crypto.decrypt_data(settings.ECOM_SECRET, response.data['enc_data']))
+
+
+class CourseListQueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = [CourseUser.objects.create_user(email=f'learner{index}@test.com', name='Learner',
+                                                user_id=f'C_{index}', password='x') for index in range(3)]
+        for index in range(4):
+            course = Course.objects.create(title=f'Course {index}', description='Korean', image='courses/c.jpg',
+                                           course_type='free')
+            for user in users[:index]:
+                Enrollment.objects.create(user=user, course=course)
 
-# Create your tests here.
+    def test_course_list_within_budget(self):
+        with query_budget(CourseListView.query_budget, max_duplicates=0):
+            result = call_view(CourseListView, {'course_type': 'free'})
+        learners = sorted(course['learners'] for course in result['body']['data'])
+        self.assertEqual(learners, [0, 1, 2, 3])
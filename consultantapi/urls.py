@@ -30,7 +30,12 @@ router.register('book_visa_package', views_files.BookVisaPackageView, basename="
 router.register('get_visa_services_list', views_files.GetVisaServiceListView, basename="get_visa_services_list")
 
 router.register('get_visa_package_details', views_files.GetVisaPackageDetailsView, basename="get_visa_package_details")
-urlpatterns = [
+# Async variants take the same URLs when serving ASGI, see settings.ASYNC_VIEWS
+async_urlpatterns = [
+    path('course_send_otp/', views_files.AsyncCourseSendOtpView.as_view(), name='course_send_otp-list'),
+]
+
+urlpatterns = (async_urlpatterns if settings.ASYNC_VIEWS else []) + [
     path('', include(router.urls))
 ]
 if settings.DEBUG:
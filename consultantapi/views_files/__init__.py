@@ -11,6 +11,7 @@ CourseVideoListView,
 CourseRegisterView,
 CourseLoginView,
 CourseSendOtpView,
+AsyncCourseSendOtpView,
 CourseVerifyOtpView,
 CourseGoogleLoginView,
 CheckEnrollCourseView,
@@ -33,6 +34,7 @@ __all__=[
 "CourseRegisterView",
 "CourseLoginView",
 "CourseSendOtpView",
+"AsyncCourseSendOtpView",
 "CourseVerifyOtpView",
 "CourseGoogleLoginView",
 "CheckEnrollCourseView",
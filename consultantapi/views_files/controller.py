@@ -1,3 +1,4 @@
+import logging
 import traceback
 from django.db import IntegrityError
 from django.db.models import Count
@@ -10,11 +11,14 @@ from api.utility_files.api_call import api_success, api_failed
 from api.utility_files.utils import generate_user_id
 from ..models import *
 from django.core.mail import send_mail
-import requests
+from api.utility_files import async_mail, http_client
+from api.utility_files.async_view import AsyncAPIView
 from django.conf import settings
 from django.contrib.auth import authenticate
 from ..serializers_files.serializers import *
 from django.shortcuts import get_object_or_404
+
+logger = logging.getLogger('apicall')
 MAX_GENERATE_ATTEMPT = 10
 class GetCsrfView(viewsets.GenericViewSet, mixins.ListModelMixin):
     queryset = []
@@ -104,14 +108,9 @@ class CourseSendOtpView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     """
     queryset = EmailOTP.objects.all()
 
-    def create(self, request, *args, **kwargs):
-        email = get_body_data(request, "email", "").strip()
-        if not email:
-            return api_failed("Email is required", headers={"code": 1010}).secure().rest()
-        # Generate a 6-digit OTP
-        otp = str(random.randint(100000, 999999))
-        # Create an OTP entry (make sure your EmailOTP model has fields: email, otp, verified, created_at, etc.)
-        otp_entry = EmailOTP.objects.create(email=email, otp=otp)
+    @staticmethod
+    def otp_mail(otp):
+        """:return: (subject, message, from_email) of the OTP email"""
         subject = "Your Course OTP Verification Code"
         message = (
             f"Hello,\n\n"
@@ -122,6 +121,17 @@ class CourseSendOtpView(viewsets.GenericViewSet, mixins.CreateModelMixin):
             f"The Course Team"
         )
         from_email = "your_email@example.com"  # Replace with your sender email
+        return subject, message, from_email
+
+    def create(self, request, *args, **kwargs):
+        email = get_body_data(request, "email", "").strip()
+        if not email:
+            return api_failed("Email is required", headers={"code": 1010}).secure().rest()
+        # Generate a 6-digit OTP
+        otp = str(random.randint(100000, 999999))
+        # Create an OTP entry (make sure your EmailOTP model has fields: email, otp, verified, created_at, etc.)
+        otp_entry = EmailOTP.objects.create(email=email, otp=otp)
+        subject, message, from_email = self.otp_mail(otp)
         recipient_list = [email]
         try:
             send_mail(subject, message, from_email, recipient_list)
@@ -131,6 +141,26 @@ class CourseSendOtpView(viewsets.GenericViewSet, mixins.CreateModelMixin):
         return api_success("OTP sent successfully", body={"otp_sent": True}).secure().rest()
 
 
+class AsyncCourseSendOtpView(AsyncAPIView):
+    """
+    CourseSendOtpView for ASGI: waits on the SMTP server without holding a thread.
+    """
+
+    async def handle(self, request, *args, **kwargs):
+        email = get_body_data(request, "email", "").strip()
+        if not email:
+            return api_failed("Email is required", headers={"code": 1010}).secure().rest()
+        otp = str(random.randint(100000, 999999))
+        await EmailOTP.objects.acreate(email=email, otp=otp)
+        subject, message, from_email = CourseSendOtpView.otp_mail(otp)
+        try:
+            await async_mail.send_mail(subject, message, from_email, [email])
+        except Exception as e:
+            logger.warning(f"Sending the OTP email failed: {e}")
+            return api_failed("Error sending email", headers={"code": 1011}).secure().rest()
+        return api_success("OTP sent successfully", body={"otp_sent": True}).secure().rest()
+
+
 class CourseVerifyOtpView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     """
     Verify the OTP for the courses user.
@@ -194,12 +224,16 @@ class CourseGoogleLoginView(viewsets.GenericViewSet, mixins.CreateModelMixin):
 
 class CourseListView(viewsets.GenericViewSet, mixins.CreateModelMixin):
     serializer_class = CourseSerializer
+    read_only = True
+    query_budget = 1
     # permission_classes = [permissions.AllowAny]  # adjust as needed
 
     def create(self, request, *args, **kwargs):
         try:
             course_type = get_body_data(request, "course_type", '').strip()
-            queryset = Course.objects.all().filter(course_type=course_type).order_by('-created_at')
+            queryset = Course.objects.all().filter(course_type=course_type).annotate(
+                learners_count=Count('enrollments')
+            ).order_by('-created_at')
             serializer = self.get_serializer(queryset, many=True)
             return api_success("Courses retrieved successfully", body={"data": serializer.data}).secure().rest()
         except Exception as e:
@@ -208,6 +242,7 @@ class CourseListView(viewsets.GenericViewSet, mixins.CreateModelMixin):
 
 class CourseDetailView(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
     queryset = Course.objects.all()
+    read_only = True
     serializer_class = CourseSerializer
     # permission_classes = [permissions.AllowAny]  # adjust as needed
 
@@ -351,7 +386,7 @@ class CreateContactMessageView(viewsets.GenericViewSet, mixins.CreateModelMixin)
                 "email": data["email"],
                 "message": data["message"]
             }
-            response = requests.post(url, headers=headers, json=payload)
+            response = http_client.post(url, headers=headers, json=payload)
             response.raise_for_status()
         except Exception as e:
             print("Error notifying external service:", e)
@@ -0,0 +1,75 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: MySQL backend whose connections come from a process-wide ConnectionPool.
+Django still opens and closes its connection per request (CONN_MAX_AGE = 0), but opening takes a live connection
+from the pool and closing returns it, so the TCP and auth handshake with the database host only happens when the pool
+grows or recycles a connection. The same code path serves WSGI workers and ASGI workers, whose sync views and ORM
+calls run on executor threads.
+A returned connection gets a full session reset (COM_CHANGE_USER through mysqlclient's change_user): the open
+transaction is rolled back, temporary tables are dropped, LOCK TABLES and GET_LOCK locks are released and user and
+session variables go back to their defaults, so nothing a request left behind reaches the next one. The reset costs
+one round trip with re-authentication, still far cheaper than a new TCP connection; init_connection_state then runs
+on every checkout. A connection whose reset fails is closed.
+Pool settings come from the "POOL" key of the database settings: MIN_SIZE, MAX_SIZE, MAX_LIFETIME (seconds) and
+TIMEOUT (seconds to wait for a free connection).
+Opt in with DB_ENGINE=ecombackend.db_backends.mysql_pool; the stock backend with persistent connections is the default.
+"""
+from django.db.backends.mysql import base as mysql_base
+from django.utils.asyncio import async_unsafe
+from ecombackend.db_backends.mysql_pool.pool import get_pool
+
+DEFAULT_POOL_OPTIONS = {'MIN_SIZE': 0, 'MAX_SIZE': 10, 'MAX_LIFETIME': 1800, 'TIMEOUT': 10}
+
+
+def _ping_connection(raw):
+    raw.ping()
+    return True
+
+
+def _session_reset(conn_params):
+    """:return: reset callable that gives a connection a fresh session of the same user and database"""
+    def reset(raw):
+        raw.change_user(conn_params.get("user", ""), conn_params.get("password", ""), conn_params.get("database"))
+    return reset
+
+
+def _close_connection(raw):
+    raw.close()
+
+
+class DatabaseWrapper(mysql_base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = None
+        self._pooled = None
+
+    def _get_pool(self, conn_params):
+        options = {**DEFAULT_POOL_OPTIONS, **self.settings_dict.get("POOL", {})}
+        # Test setup connects to other database names under the same alias; every name gets its own pool
+        key = (self.alias, tuple(sorted((name, repr(value)) for name, value in conn_params.items())))
+        return get_pool(
+            key,
+            lambda: mysql_base.DatabaseWrapper.get_new_connection(self, conn_params),
+            name=f"{self.alias}:{conn_params.get('database', '')}",
+            min_size=options['MIN_SIZE'],
+            max_size=options['MAX_SIZE'],
+            max_lifetime=options['MAX_LIFETIME'],
+            timeout=options['TIMEOUT'],
+            check=_ping_connection,
+            reset=_session_reset(conn_params),
+            close=_close_connection,
+        )
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        self._pool = self._get_pool(conn_params)
+        self._pooled = self._pool.acquire()
+        return self._pooled.raw
+
+    def _close(self):
+        pooled, self._pooled = self._pooled, None
+        if pooled is None or self.connection is not pooled.raw:
+            return super()._close()
+        # The pool owns the connection; releasing it resets the session the request used
+        self._pool.release(pooled)
@@ -0,0 +1,236 @@
+"""
+Author: Saurav
+Date: 2026-10-18
+Description: Thread-safe pool of raw database connections, shared by every thread (WSGI) or executor thread (ASGI)
+of a worker process.
+A checkout takes the most recently returned idle connection, pings it first (check) and replaces it when it is dead
+or older than max_lifetime, so the remote host never sees more than max_size connections from this process and a
+request pays the connect and auth handshake only when no live connection is idle. When all max_size connections are
+in use a checkout waits up to timeout seconds and then raises PoolTimeout. Returned connections are reset before
+they go back to the idle list; a connection whose reset fails is closed instead.
+Knows nothing about MySQL: the backend (ecombackend.db_backends.mysql_pool.base) passes the callables.
+"""
+from collections import deque
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('apicall')
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free within the pool timeout."""
+
+
+class PooledConnection:
+    __slots__ = ('raw', 'created_at')
+
+    def __init__(self, raw, created_at):
+        self.raw = raw
+        self.created_at = created_at
+
+
+class ConnectionPool:
+    def __init__(self, factory, name='default', min_size=0, max_size=10, max_lifetime=1800.0, timeout=10.0,
+                 check=None, reset=None, close=None, clock=time.monotonic):
+        """
+        :param factory: Opens a new raw connection
+        :param min_size: Connections opened on the first checkout and kept open
+        :param max_size: Most connections open at once (idle and in use)
+        :param max_lifetime: Seconds after which a connection is closed instead of reused (None for no limit)
+        :param timeout: Seconds a checkout waits for a free connection
+        :param check: check(raw) is falsy or raises when the connection is dead; called before every reuse
+        :param reset: reset(raw) is called on every return; a connection whose reset raises is closed
+        :param close: close(raw) closes a connection for good
+        """
+        if max_size < 1 or not 0 <= min_size <= max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self.factory = factory
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.check = check
+        self.reset = reset
+        self.close = close
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._init_process()
+
+    def _init_process(self):
+        # Sockets inherited from a parent process (e.g. gunicorn --preload) are the parent's; start empty
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._filled = False
+        self._stats = {'checkouts': 0, 'created': 0, 'reused': 0, 'recycled': 0, 'failed_checks': 0,
+                       'timeouts': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+
+    def _expired(self, entry) -> bool:
+        return self.max_lifetime is not None and self.clock() - entry.created_at >= self.max_lifetime
+
+    def _alive(self, entry) -> bool:
+        if self.check is None:
+            return True
+        try:
+            return bool(self.check(entry.raw))
+        except Exception:
+            return False
+
+    def _discard(self, entry) -> None:
+        """Closes a connection that is already counted out of _idle and _in_use."""
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        if self.close is not None:
+            try:
+                self.close(entry.raw)
+            except Exception:
+                logger.warning(f"Closing a pooled {self.name} connection failed", exc_info=True)
+
+    def _open(self):
+        try:
+            raw = self.factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+        return PooledConnection(raw, self.clock())
+
+    def fill(self) -> None:
+        """Opens connections until min_size are open."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            entry = self._open()
+            with self._cond:
+                self._idle.appendleft(entry)
+                self._cond.notify()
+
+    def acquire(self) -> PooledConnection:
+        """
+        :return: A live connection; give it back with release()
+        :raise PoolTimeout: When max_size connections stayed in use for timeout seconds
+        """
+        with self._cond:
+            if self._pid != os.getpid():
+                self._init_process()
+            fill, self._filled = not self._filled, True
+        if fill and self.min_size:
+            self.fill()
+
+        started = self.clock()
+        deadline = started + self.timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f"No {self.name} connection became free within {self.timeout}s "
+                                          f"({self.max_size} in use)")
+                    self._cond.wait(remaining)
+                # Most recently returned first, so surplus connections age out through max_lifetime
+                entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    self._size += 1
+            if entry is None:
+                entry = self._open()
+            elif self._expired(entry):
+                with self._cond:
+                    self._stats['recycled'] += 1
+                self._discard(entry)
+                continue
+            elif not self._alive(entry):
+                with self._cond:
+                    self._stats['failed_checks'] += 1
+                self._discard(entry)
+                continue
+            else:
+                with self._cond:
+                    self._stats['reused'] += 1
+
+            waited = self.clock() - started
+            with self._cond:
+                self._in_use += 1
+                self._stats['checkouts'] += 1
+                self._stats['wait_total'] += waited
+                self._stats['wait_max'] = max(self._stats['wait_max'], waited)
+            return entry
+
+    def release(self, entry: PooledConnection) -> None:
+        """Gives a connection from acquire() back to the pool."""
+        with self._cond:
+            if self._pid != os.getpid():
+                return  # checked out before a fork; the new process never counted it
+            self._in_use -= 1
+        if self.reset is not None:
+            try:
+                self.reset(entry.raw)
+            except Exception:
+                self._discard(entry)
+                return
+        if self._expired(entry):
+            with self._cond:
+                self._stats['recycled'] += 1
+            self._discard(entry)
+            return
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def close_all(self) -> None:
+        """Closes the idle connections; connections in use are closed when they are released."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for entry in idle:
+            self._discard(entry)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            in_use, idle = self._in_use, len(self._idle)
+        checkouts = stats.pop('checkouts')
+        wait_total = stats.pop('wait_total')
+        return {
+            'in_use': in_use,
+            'idle': idle,
+            'max_size': self.max_size,
+            'checkouts': checkouts,
+            'wait_avg_ms': round(wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+            'wait_max_ms': round(stats.pop('wait_max') * 1000, 3),
+            **stats,
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, factory, **options) -> ConnectionPool:
+    """
+    :param key: Identifies the pool; connections opened with different parameters need different keys
+    :param factory: Used only when the pool is created
+    :param options: ConnectionPool keyword arguments, used only when the pool is created
+    :return: The process-wide pool for key
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(factory, **options)
+        return pool
+
+
+def pool_stats() -> dict:
+    """:return: {pool name: snapshot} for every pool of this worker process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.name: pool.snapshot() for pool in pools}
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 from corsheaders.defaults import default_headers
@@ -58,9 +59,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryMetricsMiddleware',
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     'api.middleware.SecureRequestMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -75,6 +78,15 @@ AUTHENTICATION_BACKENDS = [
 ]
 ROOT_URLCONF = "ecombackend.urls"
 
+REST_FRAMEWORK = {
+    # SecureJSONParser reuses the body SecureRequestMiddleware already decrypted and parsed
+    "DEFAULT_PARSER_CLASSES": [
+        "api.parsers.SecureJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+}
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -93,19 +105,37 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "ecombackend.wsgi.application"
+# Routes the endpoints that mostly wait on Razorpay, PayPal, videosdk or SMTP to their async variants
+# (api.utility_files.async_view). Turn on when serving ecombackend.asgi; under WSGI every async view needs its own
+# event loop round trip, so the sync views stay the default.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False").lower() in ("1", "true", "yes")
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# DB_ENGINE=ecombackend.db_backends.mysql_pool opts in to the process-wide connection pool
+DB_ENGINE = os.getenv("DB_ENGINE", 'django.db.backends.mysql')
+DB_POOLED = DB_ENGINE == 'ecombackend.db_backends.mysql_pool'
+
 DATABASES = {
     "default": {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': DB_ENGINE,
         'NAME': os.getenv("DB_DEFAULT_NAME"),
         'USER': os.getenv("DB_DEFAULT_USER"),
         'PASSWORD': os.getenv("DB_DEFAULT_PASS"),
         "HOST": os.getenv("DB_DEFAULT_HOST", "13.209.221.76"),
         'PORT': os.getenv("DB_DEFAULT_PORT"),
+        # Stock backend: each thread keeps its connection for DB_CONN_MAX_AGE seconds and checks it before reusing it.
+        # Pooled: Django closes the connection after every request, which hands it back to the pool.
+        "CONN_MAX_AGE": 0 if DB_POOLED else int(os.getenv("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": not DB_POOLED,
+        "POOL": {
+            "MIN_SIZE": int(os.getenv("DB_POOL_MIN_SIZE", 0)),
+            "MAX_SIZE": int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+            "MAX_LIFETIME": int(os.getenv("DB_POOL_MAX_LIFETIME", 1800)),  # seconds
+            "TIMEOUT": float(os.getenv("DB_POOL_TIMEOUT", 10)),  # seconds to wait for a free connection
+        },
     },
     # "sqlite": {
     #     "ENGINE": "django.db.backends.sqlite3",
@@ -116,6 +146,65 @@ DATABASES = {
     # }
 }
 
+# Read replica (api.utility_files.db_routing): views with read_only = True read from it when DB_REPLICA_HOST is set
+if os.getenv("DB_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": os.getenv("DB_REPLICA_HOST"),
+        "PORT": os.getenv("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "USER": os.getenv("DB_REPLICA_USER", DATABASES["default"]["USER"]),
+        "PASSWORD": os.getenv("DB_REPLICA_PASS", DATABASES["default"]["PASSWORD"]),
+        # Tests read the replica alias from the default test database
+        "TEST": {"MIRROR": "default"},
+    }
+elif sys.argv[1:2] == ["test"]:
+    # Without a replica host, test runs still get a replica alias so the routing tests query a real second connection
+    DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+DATABASE_ROUTERS = ["api.utility_files.db_routing.ReplicaRouter"]
+# Seconds a user keeps reading from the primary after a request that wrote
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv("DATABASE_REPLICA_STICKY_SECONDS", 10))
+
+
+# Cache
+# Set CACHE_BACKEND/CACHE_LOCATION to a shared backend (e.g. redis) when running several workers,
+# otherwise every worker keeps its own catalog cache and only expires it through the timeout.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "ecombackend"),
+    }
+}
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 300))  # seconds
+# Upper bounds of the listing price facet buckets (api.utility_files.product_filters)
+CATALOG_PRICE_BUCKETS = (500, 1000, 2000, 5000)
+
+# Seconds a prepare_order stock hold stays valid (api.utility_files.stock)
+STOCK_RESERVATION_TTL = int(os.getenv("STOCK_RESERVATION_TTL", 15 * 60))
+
+# Seconds a response stored for an Idempotency-Key is replayed to retries (api.utility_files.idempotency)
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+
+# Per-request query metrics (api.middleware.QueryMetricsMiddleware)
+QUERY_METRICS_HEADERS = os.getenv("QUERY_METRICS_HEADERS", str(DEBUG)).lower() in ("1", "true", "yes")
+QUERY_METRICS_DUPLICATE_THRESHOLD = int(os.getenv("QUERY_METRICS_DUPLICATE_THRESHOLD", 3))
+# api/web/query_metrics/ and api/web/dependency_health/ answer staff users and callers sending X-Monitoring-Token
+MONITORING_TOKEN = os.getenv("MONITORING_TOKEN")
+
+# Outbound HTTP (api.utility_files.http_client): keep-alive connections per upstream host, (connect, read) timeouts
+OUTBOUND_HTTP_POOL_SIZE = int(os.getenv("OUTBOUND_HTTP_POOL_SIZE", 10))
+OUTBOUND_HTTP_TIMEOUT = (
+    float(os.getenv("OUTBOUND_HTTP_CONNECT_TIMEOUT", 3.05)),
+    float(os.getenv("OUTBOUND_HTTP_READ_TIMEOUT", 15)),
+)
+# Per-provider timeouts, retries and circuit breakers (api.utility_files.resilience); unset keys use its DEFAULT_POLICY
+OUTBOUND_DEPENDENCIES = {
+    "razorpay": {"timeout": (3.05, 10), "retries": 1},
+    # PayPal de-duplicates retried POSTs by PayPal-Request-Id
+    "paypal": {"timeout": (3.05, 15), "retry_unsafe": True},
+    # A retried room creation at worst leaves an unused room
+    "videosdk": {"timeout": (3.05, 10), "retry_unsafe": True},
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -150,6 +239,14 @@ CORS_ALLOWED_ORIGINS = [
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_HEADERS = list(default_headers) + [
     'x-signature',
+    'x-enc-accept-encoding',
+    'x-enc-encoding',
+    'idempotency-key',
+]
+# Lets browser clients see which compression was applied inside enc_data
+CORS_EXPOSE_HEADERS = [
+    'x-enc-encoding',
+    'idempotent-replayed',
 ]
 
 LANGUAGE_CODE = 'ko-KR'
@@ -182,6 +279,10 @@ TEST_KEY_ID = os.getenv('TEST_KEY_ID')
 TEST_KEY_SECRET = os.getenv('TEST_KEY_SECRET')
 PAYPAL_CLIENT_ID = os.getenv('PAYPAL_CLIENT_ID')
 PAYPAL_SECRET_KEY = os.getenv('PAYPAL_SECRET_KEY')
+PAYPAL_API_BASE = os.getenv('PAYPAL_API_BASE', 'https://api-m.sandbox.paypal.com')
+# Payment webhooks (api.utility_files.payment_events)
+RAZORPAY_WEBHOOK_SECRET = os.getenv('RAZORPAY_WEBHOOK_SECRET')
+PAYPAL_WEBHOOK_ID = os.getenv('PAYPAL_WEBHOOK_ID')
 STREAM_TOKEN = os.getenv('STREAM_TOKEN')
 AUTH_USER_MODEL = 'api.User'
 